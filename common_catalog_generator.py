@@ -0,0 +1,125 @@
+"""Generated catalog with the same shape as the Assets query output, for benchmarks and the stub server"""
+import json
+import random
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+from substance_material_list_scraper import SCRAPE_FULL, SCRAPE_HEADER
+
+ASSET_TYPES = ["SubstanceMaterial", "SubstanceModel", "SubstanceIBL", "SubstanceDecal"]
+CATEGORIES = ["Wood", "Metal", "Stone", "Fabric", "Ground", "Plastic", "Ceramic"]
+EXTRA_DATA_KEYS = ["author", "physicalSize", "type", "style", "quality"]
+CREATED_AT_START = datetime(2022, 1, 1)
+
+
+def make_png() -> bytes:
+    """
+    :return: valid 1x1 pixel PNG image, for folder icons
+    """
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\x80\x80\x80"))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_asset(index, rnd, previews, tags, revisions) -> {}:
+    """
+    Generates one asset item with the same shape as items of the Assets query
+    :param int index: number of the asset
+    :param random.Random rnd: random generator
+    :param int previews: number of preview attachments
+    :param int tags: number of asset tags
+    :param int revisions: number of revisions of the downloadable file
+    :return: asset item
+    """
+    attachments = []
+    for p in range(previews):
+        attachments.append(
+            {
+                "id": f"preview-{index}-{p}",
+                "tags": ["far"] if p % 3 == 1 else ["close"],
+                "label": "",
+                "kind": "thumbnail" if p == 0 else "image",
+                "url": f"https://cdn.example.com/{index}/{p}.png",
+                "__typename": "PreviewAttachment",
+            }
+        )
+    attachments.append(
+        {
+            "id": f"download-{index}",
+            "tags": ["default", "sbsar"],
+            "label": "sbsar",
+            "url": f"https://cdn.example.com/{index}/asset_{index}.sbsar",
+            "revisions": [
+                {
+                    "filename": f"asset_{index}.sbsar",
+                    "size": 1000 + index * 10 + r,
+                    "revision": r,
+                    "createdAt": f"2022-{r % 12 + 1:02d}-01T00:00:00.000Z",
+                    "__typename": "Revision",
+                }
+                for r in range(revisions)
+            ],
+            "__typename": "DownloadAttachment",
+        }
+    )
+    return {
+        "id": f"asset-{index}",
+        "title": f"Asset {index}",
+        "tags": [f"tag{rnd.randrange(tags * 20)}" for _ in range(tags)],
+        "type": "substance",
+        "status": "published",
+        "categories": [CATEGORIES[rnd.randrange(len(CATEGORIES))]],
+        "cost": 1,
+        "new": rnd.random() < 0.1,
+        "free": False,
+        "licenses": [],
+        "downloadsRecentlyUpdated": False,
+        "extraData": [
+            {"key": key, "value": f"{key}-{rnd.randrange(50)}", "__typename": "KV"}
+            for key in EXTRA_DATA_KEYS
+        ],
+        "thumbnail": {
+            "id": f"preview-{index}-0",
+            "url": f"https://cdn.example.com/{index}/0.png",
+            "tags": ["close"],
+            "__typename": "PreviewAttachment",
+        },
+        "attachments": attachments,
+        # later assets are newer, like publication dates of the real catalog
+        "createdAt": (CREATED_AT_START + timedelta(minutes=index)).strftime(
+            "%Y-%m-%dT%H:%M:%S.000Z"
+        ),
+        "__typename": ASSET_TYPES[index % len(ASSET_TYPES)],
+    }
+
+
+def generate_online_data(data_path, assets, previews, tags, revisions, seed) -> None:
+    """
+    Writes generated catalog in the same format as scrap_online_data, one asset per line
+    :param str data_path: path of the online data file
+    :param int assets: number of assets
+    :param int previews: number of preview attachments per asset
+    :param int tags: number of tags per asset
+    :param int revisions: number of file revisions per asset
+    :param int seed: seed of the random generator, same seed gives same catalog
+    """
+    rnd = random.Random(seed)
+    with open(data_path, "w", encoding="utf-8") as data_file:
+        header = {"mode": SCRAPE_FULL, "scraped_at": datetime.now().isoformat()}
+        data_file.write(json.dumps({SCRAPE_HEADER: header}) + "\n")
+        for index in range(assets):
+            asset = make_asset(index, rnd, previews, tags, revisions)
+            data_file.write(json.dumps(asset) + "\n")
@@ -1,10 +1,17 @@
 """Access to SQLite database class"""
 import sqlite3
+import time
 
+from contextlib import contextmanager
 from os import path
 from sqlite3 import Error
+from rich.console import Console
 from rich.pretty import pprint
 
+from common_sql_stats import TracedConnection
+
+console = Console()
+
 
 class DatabaseFileDoesNotExist(Exception):
     """Raised when the input value is too small
@@ -18,18 +25,42 @@ class DatabaseFileDoesNotExist(Exception):
         super().__init__(message.format(db_path))
 
 
+STORAGE_FILE = "file"
+STORAGE_MEMORY = "memory"
+STORAGE_MODES = [STORAGE_FILE, STORAGE_MEMORY]
+
+
 class CommonDatabaseAccess:
     """Class to access SQLite database"""
 
-    def __init__(self, db_path, force):
+    def __init__(
+        self,
+        db_path,
+        force,
+        storage_mode=STORAGE_FILE,
+        backup_interval=300,
+        checkpoint_interval=60,
+        sql_stats=None,
+    ):
         """
         Checking if we have our db file
         :param str db_path: path to the database file
         :param bool force: if database file do not exist and force is True, it will be created
+        :param str storage_mode: STORAGE_FILE works directly on the file in WAL mode (default),
+            STORAGE_MEMORY works on the in-memory copy and writes it back to the file every backup_interval
+        :param int backup_interval: seconds between backups of the in-memory copy to the file
+        :param int checkpoint_interval: seconds between WAL checkpoints when working on the file
+        :param SqlStats sql_stats: collects statistics of all executed statements, None for no statistics
         """
 
         self.conn = None
         self.backup = None
+        self.transaction_depth = 0
+        self.storage_mode = storage_mode
+        self.backup_interval = backup_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.sql_stats = sql_stats
+        self.last_save = time.monotonic()
         if not path.exists(db_path):
             if force:
                 self.connect_to_database(db_path)
@@ -38,26 +69,53 @@ class CommonDatabaseAccess:
                 raise DatabaseFileDoesNotExist(db_path)
         else:
             self.connect_to_database(db_path)
+        self.migrate_database()
 
     def __del__(self) -> None:
         """ "Need to close database connection when we are fully done"""
-        self.conn.backup(self.backup)
+        self.close()
+
+    def close(self) -> None:
+        """Saves all changes to the database file and closes connections"""
         if self.conn:
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self.save(final=True)
             self.conn.close()
+            self.conn = None
         if self.backup:
             self.backup.close()
+            self.backup = None
 
     def connect_to_database(self, db_path) -> None:
         """Creates connection to the database"""
+        factory = sqlite3.Connection if self.sql_stats is None else TracedConnection
         try:
-            self.backup = sqlite3.connect(
-                db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
-            )
-            self.conn = sqlite3.connect(
-                ":memory:",
-                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-            )
-            self.backup.backup(self.conn)
+            if self.storage_mode == STORAGE_MEMORY:
+                self.backup = sqlite3.connect(
+                    db_path,
+                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                )
+                self.conn = sqlite3.connect(
+                    ":memory:",
+                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                    factory=factory,
+                )
+                self.attach_sql_stats()
+                self.backup.backup(self.conn)
+            else:
+                self.conn = sqlite3.connect(
+                    db_path,
+                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                    factory=factory,
+                )
+                self.attach_sql_stats()
+                # WAL keeps readers and the writer apart and survives crashes with at most last transaction lost
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+                self.conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+                self.conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+                self.conn.execute("PRAGMA temp_store=MEMORY")
             self.conn.row_factory = sqlite3.Row
         except Error as _e:
             pprint(_e)
@@ -65,6 +123,89 @@ class CommonDatabaseAccess:
         #     if self.conn:
         #         self.conn.close()
 
+    def attach_sql_stats(self) -> None:
+        """Starts collecting statement statistics on the new connection, if they are wanted"""
+        if self.sql_stats is not None:
+            self.sql_stats.attach(self.conn)
+
+    def print_sql_stats(self, console, title="SQL statements") -> None:
+        """
+        Prints statements with the longest total time since the last print and starts counting again
+        :param Console console: console to print to
+        :param str title: title of the table, usually the finished action
+        """
+        if self.sql_stats is None:
+            return
+        console.print(self.sql_stats.table(title))
+        self.sql_stats.reset()
+
+    def save(self, final=False) -> None:
+        """
+        Makes sure that committed changes are in the database file.
+        In memory mode copies in-memory database to the file, in file mode checkpoints WAL into the main file.
+        :param bool final: True when called on close, then WAL file is truncated as well
+        """
+        if self.conn is None or self.conn.in_transaction:
+            return
+        try:
+            if self.storage_mode == STORAGE_MEMORY:
+                # copying in steps, so backup do not hold the file lock for the whole copy
+                self.conn.backup(self.backup, pages=1024)
+            elif final:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            else:
+                self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except Error as _e:
+            pprint(_e)
+        self.last_save = time.monotonic()
+
+    def save_if_needed(self) -> None:
+        """Calls save when backup (memory mode) or checkpoint (file mode) interval has passed"""
+        interval = (
+            self.backup_interval
+            if self.storage_mode == STORAGE_MEMORY
+            else self.checkpoint_interval
+        )
+        if time.monotonic() - self.last_save >= interval:
+            self.save()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work. All changes made inside the with block are committed once at the end,
+        or rolled back together if exception is raised. Nested blocks join the outer transaction.
+
+            with database.transaction():
+                database.set_new_tag("wood")
+                database.set_asset_tags([(1, 2), (1, 3)])
+        """
+        if self.transaction_depth > 0:
+            self.transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self.transaction_depth -= 1
+            return
+
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self.transaction_depth = 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth = 0
+            self.conn.rollback()
+            raise
+        self.transaction_depth = 0
+        self.conn.commit()
+        self.save_if_needed()
+
+    def commit(self) -> None:
+        """Commits changes, unless we are inside transaction block, then it is done at the end of the block"""
+        if self.transaction_depth == 0:
+            self.conn.commit()
+            self.save_if_needed()
+
     def create_table(self, create_table_sql) -> None:
         """create a table from the create_table_sql statement
         Attributes:
@@ -233,6 +374,321 @@ class CommonDatabaseAccess:
         self.create_table(sql_create_revision_table)
         self.create_table(sql_create_asset_download_table)
 
+    def get_schema_version(self) -> int:
+        """
+        Schema version stored in the database file
+        :return: schema version, 0 for databases created before migrations
+        """
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate_database(self) -> None:
+        """
+        Brings database schema to the latest version. Every migration runs in its own transaction
+        and stores its number as PRAGMA user_version, so it is applied only once.
+        New migrations are added to the end of the list, existing ones are never changed.
+        """
+        migrations = [
+            self.migration_1_indexes,
+            self.migration_2_scrape_state,
+            self.migration_3_asset_fingerprint,
+            self.migration_4_downloaded_file,
+            self.migration_5_downloaded_file_last_modified,
+            self.migration_6_latest_asset_revision_view,
+            self.migration_7_file_hash,
+            self.migration_8_current_asset_category_view,
+            self.migration_9_icon_cache,
+        ]
+        version = self.get_schema_version()
+        for number, migration in enumerate(migrations, start=1):
+            if version < number:
+                with self.transaction():
+                    migration()
+                    self.conn.execute(f"PRAGMA user_version = {number}")
+
+    def create_unique_index(self, index_name, table, columns) -> None:
+        """
+        Creates unique index. If table already have duplicated values, creates normal index instead,
+        so old databases still get fast lookups
+        :param str index_name: name of the index
+        :param str table: table name
+        :param str columns: comma separated column names
+        """
+        _c = self.conn.cursor()
+        _c.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} GROUP BY {columns} HAVING COUNT(*) > 1)"
+        )
+        doubles = _c.fetchone()[0]
+        if doubles > 0:
+            console.print(
+                f"[yellow]Table {table} have {doubles} duplicated values for ({columns}), unique index is not created"
+            )
+            _c.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"
+            )
+        else:
+            _c.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"
+            )
+
+    def remove_duplicated_links(self, table, id_column, first_column, second_column):
+        """
+        Removes duplicated rows from link table, keeping the first one
+        :param str table: link table name
+        :param str id_column: primary key column
+        :param str first_column: first foreign key column
+        :param str second_column: second foreign key column
+        """
+        _c = self.conn.cursor()
+        _c.execute(
+            f"""DELETE FROM {table} WHERE {id_column} NOT IN 
+                (SELECT MIN({id_column}) FROM {table} GROUP BY {first_column}, {second_column})"""
+        )
+
+    def migration_1_indexes(self) -> None:
+        """Indexes for all lookups by original ID, name and foreign keys. Unique constraints for link tables"""
+        _c = self.conn.cursor()
+        # asset_category keeps active state of the duplicated rows in the row which stays
+        _c.execute(
+            """UPDATE asset_category SET is_active = 1 WHERE asset_category_id IN 
+               (SELECT MIN(asset_category_id) FROM asset_category GROUP BY asset_id, category_id 
+                HAVING COUNT(*) > 1 AND MAX(is_active))"""
+        )
+        links = [
+            ("asset_tag", "asset_tag_id", "asset_id", "tag_id"),
+            ("asset_category", "asset_category_id", "asset_id", "category_id"),
+            ("asset_preview", "asset_preview_id", "asset_id", "preview_id"),
+            ("asset_download", "asset_download_id", "asset_id", "download_id"),
+            (
+                "preview_preview_tag",
+                "preview_preview_tag_id",
+                "preview_id",
+                "preview_tag_id",
+            ),
+            (
+                "download_download_tag",
+                "download_download_tag_id",
+                "download_id",
+                "download_tag_id",
+            ),
+        ]
+        for table, id_column, first_column, second_column in links:
+            self.remove_duplicated_links(table, id_column, first_column, second_column)
+            _c.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_{first_column}_{second_column} "
+                f"ON {table} ({first_column}, {second_column})"
+            )
+            _c.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{second_column} ON {table} ({second_column})"
+            )
+
+        for table in [
+            "tag",
+            "category",
+            "type",
+            "preview_kind",
+            "preview_tag",
+            "download_tag",
+        ]:
+            self.create_unique_index(f"idx_{table}_name", table, "name")
+        for table in ["asset", "preview", "download"]:
+            self.create_unique_index(f"idx_{table}_original_id", table, "original_id")
+
+        _c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_asset_revision_asset_id ON asset_revision (asset_id, asset_revision)"
+        )
+        _c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_asset_revision_name ON asset_revision (name)"
+        )
+        _c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_asset_revision_type_id ON asset_revision (type_id)"
+        )
+        _c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_revision_download_id ON revision (download_id, revision)"
+        )
+        _c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_revision_filename ON revision (filename)"
+        )
+
+    def migration_2_scrape_state(self) -> None:
+        """Key value table for scraping cursor (newest asset date, last seen IDs, last full scrape)"""
+        self.create_table(
+            """ CREATE TABLE IF NOT EXISTS scrape_state (
+                    key text PRIMARY KEY,
+                    value text
+                    );"""
+        )
+
+    def migration_3_asset_fingerprint(self) -> None:
+        """Hash of the last processed online data for each asset, to skip unchanged assets"""
+        self.conn.execute("ALTER TABLE asset ADD COLUMN fingerprint text")
+
+    def migration_4_downloaded_file(self) -> None:
+        """Record of completely downloaded files, so finished downloads are not repeated after restart"""
+        self.create_table(
+            """ CREATE TABLE IF NOT EXISTS downloaded_file (
+                    downloaded_file_id integer PRIMARY KEY,
+                    file_path text NOT NULL UNIQUE,
+                    url text NOT NULL,
+                    size integer,
+                    etag text,
+                    fetched_at text
+                    );"""
+        )
+
+    def migration_5_downloaded_file_last_modified(self) -> None:
+        """Last-Modified header of downloaded files, used for conditional requests together with ETag"""
+        self.conn.execute("ALTER TABLE downloaded_file ADD COLUMN last_modified text")
+
+    def migration_6_latest_asset_revision_view(self) -> None:
+        """View with only the latest revision of every asset"""
+        self.conn.execute(
+            """ CREATE VIEW IF NOT EXISTS latest_asset_revision AS
+                    SELECT * FROM asset_revision WHERE asset_revision_id IN (
+                        SELECT asset_revision_id FROM (
+                            SELECT asset_revision_id, ROW_NUMBER() OVER (
+                                PARTITION BY asset_id ORDER BY asset_revision DESC, asset_revision_id
+                            ) AS position FROM asset_revision
+                        ) WHERE position = 1
+                    );"""
+        )
+
+    def migration_7_file_hash(self) -> None:
+        """Content hash of local asset files, with cache of already hashed files by their size and modification time"""
+        self.create_table(
+            """ CREATE TABLE IF NOT EXISTS file_hash (
+                    file_path text PRIMARY KEY,
+                    size integer NOT NULL,
+                    mtime integer NOT NULL,
+                    hash text NOT NULL
+                    );"""
+        )
+        self.conn.execute("ALTER TABLE revision ADD COLUMN file_hash text")
+
+    def migration_8_current_asset_category_view(self) -> None:
+        """View with one category for every asset, the active one or the first linked if none is active"""
+        self.conn.execute(
+            """ CREATE VIEW IF NOT EXISTS current_asset_category AS
+                    SELECT asset_id, category_id FROM (
+                        SELECT asset_id, category_id, ROW_NUMBER() OVER (
+                            PARTITION BY asset_id ORDER BY is_active DESC, asset_category_id
+                        ) AS position FROM asset_category
+                    ) WHERE position = 1;"""
+        )
+
+    def migration_9_icon_cache(self) -> None:
+        """Size and modification time of preview images at the time their folder icon was created"""
+        self.create_table(
+            """ CREATE TABLE IF NOT EXISTS icon_cache (
+                    preview_path text PRIMARY KEY,
+                    size integer NOT NULL,
+                    mtime integer NOT NULL
+                    );"""
+        )
+
+    def get_scrape_state(self, key):
+        """
+        Database query for saved scraping state value
+        :param str key: name of the value
+        :return: value or None if it is not saved yet
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT value FROM scrape_state WHERE key=?", (key,))
+
+        row = _c.fetchone()
+
+        return row["value"] if row else None
+
+    def set_scrape_state(self, key, value) -> None:
+        """
+        Saves scraping state value
+        :param str key: name of the value
+        :param str value: value
+        """
+        sql = """INSERT INTO scrape_state (key, value) VALUES (?, ?) 
+                 ON CONFLICT(key) DO UPDATE SET value = excluded.value"""
+        _c = self.conn.cursor()
+        _c.execute(sql, (key, value))
+        self.commit()
+
+    def get_all_downloaded_files(self) -> []:
+        """
+        Database query for the all completely downloaded files
+        :return:
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT * FROM downloaded_file")
+
+        rows = _c.fetchall()
+
+        return [dict(row) for row in rows]
+
+    def set_downloaded_file(
+        self, file_path, url, size, etag, last_modified=None
+    ) -> None:
+        """
+        Records completely downloaded file, replacing previous record for the same path
+        :param str file_path: path of the downloaded file
+        :param str url: url the file was downloaded from
+        :param int size: size of the file in bytes
+        :param str etag: ETag header of the file, or None
+        :param str last_modified: Last-Modified header of the file, or None
+        """
+        sql = """INSERT INTO downloaded_file (file_path, url, size, etag, last_modified, fetched_at) 
+                 VALUES (?, ?, ?, ?, ?, datetime('now'))
+                 ON CONFLICT(file_path) DO UPDATE SET url = excluded.url, size = excluded.size,
+                 etag = excluded.etag, last_modified = excluded.last_modified,
+                 fetched_at = excluded.fetched_at"""
+        _c = self.conn.cursor()
+        _c.execute(sql, (file_path, url, size, etag, last_modified))
+        self.commit()
+
+    def get_all_file_hashes(self) -> {}:
+        """
+        Database query for the all cached file hashes
+        :return: file hash data by file path
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT * FROM file_hash")
+
+        rows = _c.fetchall()
+
+        return {row["file_path"]: dict(row) for row in rows}
+
+    def set_file_hashes(self, file_hashes) -> None:
+        """
+        Saves hashes of the files with one statement, replacing previous hashes of the same paths
+        :param [] file_hashes: list of (file_path, size, mtime, hash)
+        """
+        sql = """INSERT INTO file_hash (file_path, size, mtime, hash) VALUES (?, ?, ?, ?)
+                 ON CONFLICT(file_path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime,
+                 hash = excluded.hash"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, file_hashes)
+        self.commit()
+
+    def get_all_icon_cache(self) -> {}:
+        """
+        Database query for the all previews with created icons
+        :return: preview size and modification time by preview path
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT * FROM icon_cache")
+
+        rows = _c.fetchall()
+
+        return {row["preview_path"]: dict(row) for row in rows}
+
+    def set_icon_cache(self, icons) -> None:
+        """
+        Saves previews of the created icons with one statement, replacing previous records of the same paths
+        :param [] icons: list of (preview_path, size, mtime)
+        """
+        sql = """INSERT INTO icon_cache (preview_path, size, mtime) VALUES (?, ?, ?)
+                 ON CONFLICT(preview_path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, icons)
+        self.commit()
+
     def get_all_tags(self) -> []:
         """
         Database query for the all saved tags
@@ -254,7 +710,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO tag (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_all_preview_kinds(self) -> []:
@@ -278,7 +734,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO preview_kind (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_all_categories(self) -> []:
@@ -333,7 +789,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO category (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_all_preview_tags(self) -> []:
@@ -369,7 +825,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO preview_tag (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_all_download_tags(self) -> []:
@@ -407,7 +863,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO download_tag (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_all_types(self) -> []:
@@ -443,7 +899,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO type (name) VALUES(?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (name,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_asset_by_original_id(self, original_id) -> []:
@@ -459,6 +915,50 @@ class CommonDatabaseAccess:
 
         return [dict(row) for row in rows]
 
+    def get_all_asset_fingerprints(self) -> {}:
+        """
+        Database query for fingerprints of all processed assets
+        :return: fingerprints by original ID of the asset
+        """
+        _c = self.conn.cursor()
+        _c.execute(
+            "SELECT original_id, fingerprint FROM asset WHERE fingerprint IS NOT NULL"
+        )
+
+        rows = _c.fetchall()
+
+        return {row["original_id"]: row["fingerprint"] for row in rows}
+
+    def set_asset_fingerprints(self, fingerprints) -> None:
+        """
+            Saves fingerprints of processed assets with one statement
+        :param [] fingerprints: list of (fingerprint, original_id)
+        """
+        sql = """UPDATE asset SET fingerprint = ? WHERE original_id = ?"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, fingerprints)
+        self.commit()
+
+    def get_catalog_signature(self) -> str:
+        """
+        Database query for the summary of the catalog tables, it changes whenever ingest adds or moves something
+        :return: row counts, largest IDs and active categories of the catalog tables as text
+        """
+        _c = self.conn.cursor()
+        _c.execute(
+            """SELECT
+                (SELECT COUNT(*) || ':' || IFNULL(MAX(asset_revision_id), 0) FROM asset_revision),
+                (SELECT COUNT(*) || ':' || IFNULL(SUM(asset_category_id * is_active), 0) FROM asset_category),
+                (SELECT COUNT(*) FROM category),
+                (SELECT COUNT(*) || ':' || IFNULL(MAX(preview_id), 0) FROM preview),
+                (SELECT COUNT(*) FROM asset_preview),
+                (SELECT COUNT(*) || ':' || IFNULL(MAX(revision_id), 0) FROM revision)"""
+        )
+
+        row = _c.fetchone()
+
+        return "/".join(str(value) for value in row)
+
     def get_asset_by_asset_id(self, asset_id) -> []:
         """
         Database query for the asset by its asset ID
@@ -478,30 +978,16 @@ class CommonDatabaseAccess:
         :param string original_id: original ID of the asset
         :return: asset data
         """
-        _c = self.conn.cursor()
-
-        sql = """SELECT * FROM asset WHERE original_id=?"""
+        sql = """SELECT asset_revision.* FROM asset_revision 
+                 JOIN asset ON asset.asset_id = asset_revision.asset_id
+                 WHERE asset.original_id=? 
+                 ORDER BY asset_revision.asset_revision DESC, asset_revision.asset_revision_id LIMIT 1"""
         _c = self.conn.cursor()
         _c.execute(sql, (original_id,))
-        rows = _c.fetchall()
-        res = [dict(row) for row in rows]
-
-        if len(res) > 0:
-            sql = """SELECT * FROM asset_revision WHERE asset_id=?"""
-            _c.execute(sql, (res[0]["asset_id"],))
-
-            rows = _c.fetchall()
-
-            res = [dict(row) for row in rows]
 
-        result = []
-        for r in res:
-            if len(result) == 0:
-                result.append(r)
-            elif result[0]["asset_revision"] < r["asset_revision"]:
-                result[0] = r
+        rows = _c.fetchall()
 
-        return result
+        return [dict(row) for row in rows]
 
     def get_asset_revision_by_name(self, name) -> []:
         """
@@ -509,23 +995,14 @@ class CommonDatabaseAccess:
         :param string name: name of the asset
         :return: asset data
         """
-
+        sql = """SELECT * FROM asset_revision WHERE name=? 
+                 ORDER BY asset_revision DESC, asset_revision_id LIMIT 1"""
         _c = self.conn.cursor()
-        sql = """SELECT * FROM asset_revision WHERE name=?"""
         _c.execute(sql, (name,))
 
         rows = _c.fetchall()
 
-        res = [dict(row) for row in rows]
-
-        result = []
-        for r in res:
-            if len(result) == 0:
-                result.append(r)
-            elif result[0]["asset_revision"] < r["asset_revision"]:
-                result[0] = r
-
-        return result
+        return [dict(row) for row in rows]
 
     def get_all_assets_revisions_by_type_id(self, type_id) -> []:
         """
@@ -541,6 +1018,57 @@ class CommonDatabaseAccess:
 
         return [dict(row) for row in rows]
 
+    def get_latest_assets_with_category(self, type_ids=None, original_ids=None):
+        """
+        Database query for the latest revision of every asset with its type name and active category
+        (first linked category if none is active). Rows are read one by one, ordered by type.
+        :param [] type_ids: IDs of the asset types to read, all types if None
+        :param [] original_ids: original IDs of the assets to read, all assets if None
+        :return: generator of asset revision data with type_name, category_id, category_name and original_id
+        """
+        sql = """SELECT asset_revision.*, type.name AS type_name, category.category_id, 
+                        category.name AS category_name, asset.original_id
+                 FROM latest_asset_revision AS asset_revision
+                 JOIN asset ON asset.asset_id = asset_revision.asset_id
+                 JOIN type ON type.type_id = asset_revision.type_id
+                 JOIN current_asset_category ON current_asset_category.asset_id = asset_revision.asset_id
+                 JOIN category ON category.category_id = current_asset_category.category_id"""
+        conditions = []
+        parameters = ()
+        if type_ids is not None:
+            conditions.append(
+                f"""asset_revision.type_id IN ({", ".join("?" * len(type_ids))})"""
+            )
+            parameters += tuple(type_ids)
+        if original_ids is not None:
+            conditions.append(
+                f"""asset.original_id IN ({", ".join("?" * len(original_ids))})"""
+            )
+            parameters += tuple(original_ids)
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += """ ORDER BY asset_revision.type_id, asset_revision.asset_revision_id"""
+        _c = self.conn.cursor()
+        _c.execute(sql, parameters)
+
+        for row in _c:
+            yield dict(row)
+
+    def get_latest_assets_count_by_type(self) -> {}:
+        """
+        Database query for number of assets of every type, counting only the latest revisions
+        :return: number of assets by type ID
+        """
+        sql = """SELECT type_id, COUNT(*) AS asset_count FROM latest_asset_revision
+                 WHERE asset_id IN (SELECT asset_id FROM asset_category)
+                 GROUP BY type_id"""
+        _c = self.conn.cursor()
+        _c.execute(sql)
+
+        rows = _c.fetchall()
+
+        return {row["type_id"]: row["asset_count"] for row in rows}
+
     def set_new_asset(self, original_id) -> int:
         """
             Create new asset by Original id
@@ -550,7 +1078,7 @@ class CommonDatabaseAccess:
         sql = """INSERT INTO asset (original_id) VALUES (?)"""
         _c = self.conn.cursor()
         _c.execute(sql, (original_id,))
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def set_new_asset_revision(self, asset_data) -> int:
@@ -586,7 +1114,7 @@ class CommonDatabaseAccess:
                 asset_data["extra_data_preview_disp"],
             ),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def update_asset_revision(self, asset_data) -> None:
@@ -624,7 +1152,7 @@ class CommonDatabaseAccess:
                 asset_data["asset_revision_id"],
             ),
         )
-        self.conn.commit()
+        self.commit()
 
     def update_asset_revision_revision(self, asset_data) -> None:
         """
@@ -632,22 +1160,14 @@ class CommonDatabaseAccess:
         :param asset_data: asset revision data
         """
         # First find last revision
-        sql = """SELECT * FROM asset_revision WHERE asset_id=?"""
+        sql = """SELECT MAX(asset_revision) AS last_revision FROM asset_revision WHERE asset_id=?"""
         _c = self.conn.cursor()
         _c.execute(sql, (asset_data["asset_id"],))
-        rows = _c.fetchall()
-
-        res = [dict(row) for row in rows]
-        last_data = []
-        for r in res:
-            if len(last_data) == 0:
-                last_data.append(r)
-            elif last_data[0]["revision"] < r["revision"]:
-                last_data[0] = r
+        last_revision = _c.fetchone()["last_revision"]
 
         new_revision = 0
-        if len(last_data) > 0 and "asset_revision" in last_data[0]:
-            new_revision = last_data[0]["asset_revision"] + 1
+        if last_revision is not None:
+            new_revision = last_revision + 1
         # then create new entry
         sql = """INSERT INTO asset_revision (asset_id, name,type_id, is_new, is_update, created_at, thumbnail_id, 
                  extra_data_author, extra_data_physical_size, extra_data_ref, extra_data_type, extra_data_style, 
@@ -678,7 +1198,7 @@ class CommonDatabaseAccess:
                 new_revision,
             ),
         )
-        self.conn.commit()
+        self.commit()
 
     def get_all_previews(self) -> []:
         """
@@ -735,7 +1255,7 @@ class CommonDatabaseAccess:
                 preview_data["preview_kind_id"],
             ),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_preview_preview_tag_by_preview_id(self, preview_id) -> []:
@@ -797,9 +1317,19 @@ class CommonDatabaseAccess:
             sql,
             (preview_id, tag_id),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
+    def set_preview_preview_tags(self, pairs) -> None:
+        """
+            Create new preview preview tags with one statement.
+        :param [] pairs: list of (preview_id, preview_tag_id)
+        """
+        sql = """INSERT INTO preview_preview_tag (preview_id, preview_tag_id) VALUES (?, ?)"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, pairs)
+        self.commit()
+
     def get_asset_preview_by_asset_id(self, asset_id) -> []:
         """
             Database query for asset preview gy asset id
@@ -855,9 +1385,19 @@ class CommonDatabaseAccess:
             sql,
             (asset_id, preview_id),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
+    def set_asset_previews(self, pairs) -> None:
+        """
+            Creates new asset previews with one statement.
+        :param [] pairs: list of (asset_id, preview_id)
+        """
+        sql = """INSERT INTO asset_preview (asset_id, preview_id) VALUES (?, ?)"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, pairs)
+        self.commit()
+
     def get_asset_category_by_asset_id(self, asset_id) -> []:
         """
             Database query for all asset categories by asset id
@@ -900,7 +1440,7 @@ class CommonDatabaseAccess:
             sql,
             (asset_id, category_id, is_active),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def update_asset_category(self, asset_category_data) -> None:
@@ -920,7 +1460,7 @@ class CommonDatabaseAccess:
                 asset_category_data["asset_category_id"],
             ),
         )
-        self.conn.commit()
+        self.commit()
 
     def get_asset_tag_by_asset_id(self, asset_id) -> []:
         """
@@ -976,9 +1516,19 @@ class CommonDatabaseAccess:
             sql,
             (asset_id, tag_id),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
+    def set_asset_tags(self, pairs) -> None:
+        """
+            Create asset tags with one statement.
+        :param [] pairs: list of (asset_id, tag_id)
+        """
+        sql = """INSERT INTO asset_tag (asset_id, tag_id) VALUES (?, ?)"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, pairs)
+        self.commit()
+
     def get_asset_download_by_asset_id(self, asset_id) -> []:
         """
             Database query for asset download by asset id
@@ -1005,6 +1555,18 @@ class CommonDatabaseAccess:
 
         return [dict(row) for row in rows]
 
+    def get_all_asset_downloads(self) -> []:
+        """
+        Database query for all asset_download
+        :return: asset downloads
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT * FROM asset_download")
+
+        rows = _c.fetchall()
+
+        return [dict(row) for row in rows]
+
     def get_asset_download_by_asset_id_and_download_id(
         self, asset_id, download_id
     ) -> []:
@@ -1037,9 +1599,19 @@ class CommonDatabaseAccess:
             sql,
             (asset_id, download_id),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
+    def set_asset_downloads(self, pairs) -> None:
+        """
+            Create asset downloads with one statement.
+        :param [] pairs: list of (asset_id, download_id)
+        """
+        sql = """INSERT INTO asset_download (asset_id, download_id) VALUES (?, ?)"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, pairs)
+        self.commit()
+
     def get_download_download_tag_by_download_id(self, download_id) -> []:
         """
             Database query for download download tag by download id
@@ -1055,6 +1627,18 @@ class CommonDatabaseAccess:
 
         return [dict(row) for row in rows]
 
+    def get_all_download_download_tags(self) -> []:
+        """
+        Database query for all download_download_tag
+        :return: download tags
+        """
+        _c = self.conn.cursor()
+        _c.execute("SELECT * FROM download_download_tag")
+
+        rows = _c.fetchall()
+
+        return [dict(row) for row in rows]
+
     def get_download_download_tag_by_download_id_and_download_tag_id(
         self, download_id, download_tag_id
     ) -> []:
@@ -1087,9 +1671,19 @@ class CommonDatabaseAccess:
             sql,
             (download_id, download_tag_id),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
+    def set_download_download_tags(self, pairs) -> None:
+        """
+            Create download download tags with one statement.
+        :param [] pairs: list of (download_id, download_tag_id)
+        """
+        sql = """INSERT INTO download_download_tag (download_id, download_tag_id) VALUES (?, ?)"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, pairs)
+        self.commit()
+
     def get_download_by_original_id(self, original_id) -> []:
         """
         Database query for the download by its original ID
@@ -1132,7 +1726,7 @@ class CommonDatabaseAccess:
                 download_data["label"],
             ),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def get_revision_by_download_id(self, download_id) -> []:
@@ -1161,6 +1755,47 @@ class CommonDatabaseAccess:
 
         return [dict(row) for row in rows]
 
+    def get_revision_destinations(self) -> {}:
+        """
+        Database query for the asset folder of every revision file name, with one joined query.
+        Folder is taken from the first revision with the file name, using latest asset revision and its
+        current category.
+        :return: by file name, dictionary with type_name, category_name, asset_name and
+                 revisions (all revisions with the file name)
+        """
+        sql = """SELECT revision.*, asset_revision.name AS asset_name, type.name AS type_name, 
+                        category.name AS category_name
+                 FROM revision
+                 LEFT JOIN asset_download ON asset_download.asset_download_id = (
+                     SELECT MIN(asset_download_id) FROM asset_download 
+                     WHERE asset_download.download_id = revision.download_id
+                 )
+                 LEFT JOIN latest_asset_revision AS asset_revision 
+                      ON asset_revision.asset_id = asset_download.asset_id
+                 LEFT JOIN type ON type.type_id = asset_revision.type_id
+                 LEFT JOIN current_asset_category 
+                      ON current_asset_category.asset_id = asset_revision.asset_id
+                 LEFT JOIN category ON category.category_id = current_asset_category.category_id
+                 ORDER BY revision.revision_id"""
+        _c = self.conn.cursor()
+        _c.execute(sql)
+
+        destinations = {}
+        for row in _c:
+            revision = dict(row)
+            if revision["filename"] not in destinations:
+                destinations[revision["filename"]] = {
+                    "type_name": revision["type_name"],
+                    "category_name": revision["category_name"],
+                    "asset_name": revision["asset_name"],
+                    "revisions": [],
+                }
+            for key in ("asset_name", "type_name", "category_name"):
+                del revision[key]
+            destinations[revision["filename"]]["revisions"].append(revision)
+
+        return destinations
+
     def get_revisions_by_download_id_and_revision(self, download_id, revision) -> []:
         """
         Database query for the revisions by download_id and revision
@@ -1198,7 +1833,7 @@ class CommonDatabaseAccess:
                 revision_data["have_file"],
             ),
         )
-        self.conn.commit()
+        self.commit()
         return _c.lastrowid
 
     def update_revision(self, revision_data) -> None:
@@ -1221,27 +1856,65 @@ class CommonDatabaseAccess:
                 revision_data["revision_id"],
             ),
         )
-        self.conn.commit()
+        self.commit()
+
+    def update_revisions_have_file(self, scanned_revisions) -> (int, int):
+        """
+            Reconciles have_file of the scanned revisions with one statement.
+            Revisions which were not scanned (folder of their type or category is missing) keep their have_file
+        :param dict scanned_revisions: True for revisions with local file, False for revisions without it, by revision ID
+        :return: number of revisions newly marked as present and number of revisions newly marked as missing
+        """
+        with self.transaction():
+            _c = self.conn.cursor()
+            _c.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS scanned_revision (revision_id integer PRIMARY KEY, present bool)"
+            )
+            _c.execute("DELETE FROM scanned_revision")
+            _c.executemany(
+                "INSERT INTO scanned_revision (revision_id, present) VALUES (?, ?)",
+                scanned_revisions.items(),
+            )
+            _c.execute(
+                """SELECT COUNT(*) AS added FROM revision 
+                   JOIN scanned_revision ON scanned_revision.revision_id = revision.revision_id
+                   WHERE scanned_revision.present AND NOT coalesce(revision.have_file, 0)"""
+            )
+            added = _c.fetchone()["added"]
+            _c.execute(
+                """UPDATE revision SET have_file = (
+                       SELECT present FROM scanned_revision WHERE scanned_revision.revision_id = revision.revision_id
+                   )
+                   WHERE EXISTS (
+                       SELECT 1 FROM scanned_revision WHERE scanned_revision.revision_id = revision.revision_id
+                       AND scanned_revision.present != coalesce(revision.have_file, 0)
+                   )"""
+            )
+            changed = _c.rowcount
+            _c.execute("DELETE FROM scanned_revision")
+        return added, changed - added
+
+    def set_revision_file_hashes(self, file_hashes) -> None:
+        """
+            Saves content hash of the local files of revisions with one statement
+        :param [] file_hashes: list of (file_hash, revision_id)
+        """
+        sql = """UPDATE revision SET file_hash = ? WHERE revision_id = ?"""
+        _c = self.conn.cursor()
+        _c.executemany(sql, file_hashes)
+        self.commit()
 
     def get_latest_revision_by_download_id(self, download_id) -> []:
         """
-        Database query for the latest revision of the download id. Can have doubles
+        Database query for the latest revision of the download id
         :param integer download_id: download ID of the revision
         :return: revision data
         """
+        sql = """SELECT * FROM revision WHERE download_id=? 
+                 ORDER BY revision DESC, revision_id LIMIT 1"""
         _c = self.conn.cursor()
-
-        sql = """SELECT * FROM revision WHERE download_id=?"""
         _c.execute(sql, (download_id,))
 
         rows = _c.fetchall()
 
-        res = [dict(row) for row in rows]
-        result = []
-        for r in res:
-            if len(result) == 0:
-                result.append(r)
-            elif result[0]["revision"] < r["revision"]:
-                result[0] = r
-
-        return result
+        return [dict(row) for row in rows]
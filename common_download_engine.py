@@ -0,0 +1,436 @@
+"""Parallel file downloads with shared HTTP session, per host limits, retries and progress display"""
+import filecmp
+import json
+import os
+import threading
+import time
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+from rich.console import Group
+from rich.live import Live
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    MofNCompleteColumn,
+    Progress,
+    TextColumn,
+    TimeElapsedColumn,
+    TransferSpeedColumn,
+)
+
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+
+
+class DownloadResult:
+    """Outcome of one download"""
+
+    def __init__(
+        self,
+        url,
+        file_path,
+        ok,
+        size=0,
+        error=None,
+        etag=None,
+        last_modified=None,
+        not_modified=False,
+    ):
+        """
+        :param str url: url of the file
+        :param str file_path: destination path
+        :param bool ok: True if file was downloaded or is up to date
+        :param int size: size of the downloaded file
+        :param str error: error description if download failed
+        :param str etag: ETag header of the downloaded file
+        :param str last_modified: Last-Modified header of the downloaded file
+        :param bool not_modified: True if existing file was kept, because server has the same file
+        """
+        self.url = url
+        self.file_path = file_path
+        self.ok = ok
+        self.size = size
+        self.error = error
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+class DownloadEngine:
+    """
+    Downloads files in a bounded pool of worker threads.
+    Files are written to "<file>.part" and renamed when complete and verified,
+    interrupted downloads are resumed from the partial file on the next run.
+    Completion callbacks are called from the thread which submits jobs,
+    so they can safely use database and update shared data.
+
+        with DownloadEngine() as engine:
+            engine.submit(url, file_path, on_done)
+            engine.wait()
+    """
+
+    def __init__(
+        self,
+        workers=8,
+        per_host=4,
+        retries=3,
+        backoff=0.5,
+        timeout=60,
+        show_progress=True,
+    ):
+        """
+        :param int workers: maximum number of parallel downloads
+        :param int per_host: maximum number of parallel downloads from one host
+        :param int retries: number of attempts for failed downloads
+        :param float backoff: seconds to wait before first retry, doubled for every next retry
+        :param int timeout: seconds to wait for the server response
+        :param bool show_progress: False when engine runs next to other progress display,
+            only one live display can be active
+        """
+        self.workers = workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.show_progress = show_progress
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=workers, pool_maxsize=workers
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.host_limits = defaultdict(lambda: threading.Semaphore(self.per_host))
+        self.host_limits_lock = threading.Lock()
+        self.executor = None
+        self.pending = []
+        self.results = []
+        self.progress = Progress(
+            TextColumn("{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+        )
+        self.transfer = Progress(
+            TextColumn("{task.description}"),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+        )
+        self.live = Live(Group(self.progress, self.transfer), refresh_per_second=10)
+        self.files_task = None
+        self.bytes_task = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        """Starts worker threads and progress display"""
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.files_task = self.progress.add_task("Downloaded files", total=0)
+        self.bytes_task = self.transfer.add_task("Downloaded data", total=None)
+        if self.show_progress:
+            self.live.start()
+
+    def stop(self) -> None:
+        """Waits for all downloads and stops worker threads and progress display"""
+        self.wait()
+        self.executor.shutdown()
+        if self.show_progress:
+            self.live.stop()
+
+    def track(self, sequence, description, total=None):
+        """
+        Same as rich.progress.track, but shown together with the download progress
+        :param sequence: values to iterate
+        :param str description: description of the task
+        :param int total: number of values, if sequence do not have len
+        :return: generator of sequence values
+        """
+        if total is None:
+            total = len(sequence)
+        task = self.progress.add_task(description, total=total)
+        for value in sequence:
+            yield value
+            self.progress.advance(task)
+            self.process_finished()
+
+    def submit(
+        self, url, file_path, on_done=None, validators=None, backup_path=None
+    ) -> None:
+        """
+        Adds file to the download queue
+        :param str url: url of the file
+        :param str file_path: destination path
+        :param on_done: function called with DownloadResult when download finishes
+        :param dict validators: etag and last_modified of the existing file, to request it only if it changed
+        :param str backup_path: existing file is renamed to this path when server sends different file
+        """
+        future = self.executor.submit(
+            self.download, url, file_path, validators, backup_path
+        )
+        self.pending.append((future, on_done))
+        self.progress.update(
+            self.files_task, total=len(self.pending) + len(self.results)
+        )
+        self.process_finished()
+
+    def process_finished(self) -> None:
+        """Calls callbacks of finished downloads"""
+        still_pending = []
+        for future, on_done in self.pending:
+            if future.done():
+                self.finish(future, on_done)
+            else:
+                still_pending.append((future, on_done))
+        self.pending = still_pending
+
+    def wait(self) -> []:
+        """
+        Waits for all queued downloads and calls their callbacks
+        :return: results of all downloads
+        """
+        for future, on_done in self.pending:
+            future.result()
+            self.finish(future, on_done)
+        self.pending = []
+        return self.results
+
+    def finish(self, future, on_done) -> None:
+        result = future.result()
+        self.results.append(result)
+        self.progress.advance(self.files_task)
+        if on_done is not None:
+            on_done(result)
+
+    def host_limit(self, url) -> threading.Semaphore:
+        with self.host_limits_lock:
+            return self.host_limits[urlparse(url).netloc]
+
+    def download(
+        self, url, file_path, validators=None, backup_path=None
+    ) -> DownloadResult:
+        """
+        Downloads one file, retrying on connection errors, throttling and server errors.
+        Runs in worker thread.
+        :param str url: url of the file
+        :param str file_path: destination path
+        :param dict validators: etag and last_modified of the existing file, to request it only if it changed
+        :param str backup_path: existing file is renamed to this path when server sends different file
+        :return: download result
+        """
+        error = None
+        retry_after = 0
+        for attempt in range(self.retries):
+            if attempt > 0:
+                # waiting is done without the host slot, so other downloads from the host can go on
+                time.sleep(max(retry_after, self.backoff * 2 ** (attempt - 1)))
+            retry_after = 0
+            with self.host_limit(url):
+                try:
+                    return self.fetch(url, file_path, validators, backup_path)
+                except RetryableError as _e:
+                    error = str(_e)
+                    retry_after = _e.retry_after or 0
+                except requests.HTTPError as _e:
+                    # missing file or access denied, retrying will not help
+                    return DownloadResult(url, file_path, False, error=str(_e))
+                except requests.RequestException as _e:
+                    error = str(_e)
+                except OSError as _e:
+                    # local file problem, retrying will not help
+                    return DownloadResult(url, file_path, False, error=str(_e))
+        return DownloadResult(url, file_path, False, error=error)
+
+    def fetch(
+        self, url, file_path, validators=None, backup_path=None
+    ) -> DownloadResult:
+        """
+        One download attempt. Data is written to the partial file, which is kept on
+        connection errors so next attempt can continue with HTTP Range request.
+        :param str url: url of the file
+        :param str file_path: destination path
+        :param dict validators: etag and last_modified of the existing file, to request it only if it changed
+        :param str backup_path: existing file is renamed to this path when server sends different file
+        :return: download result
+        """
+        part_path = file_path + PART_SUFFIX
+        offset, validator = resume_point(url, part_path)
+        headers = {}
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        elif validators and os.path.exists(file_path):
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        with self.session.get(
+            url, stream=True, timeout=self.timeout, headers=headers
+        ) as r:
+            if r.status_code == 304:
+                validators = validators or {}
+                return DownloadResult(
+                    url,
+                    file_path,
+                    True,
+                    os.path.getsize(file_path),
+                    etag=r.headers.get("ETag", validators.get("etag")),
+                    last_modified=r.headers.get(
+                        "Last-Modified", validators.get("last_modified")
+                    ),
+                    not_modified=True,
+                )
+            if r.status_code == 416:
+                # partial file do not match the server file anymore
+                remove_part(part_path)
+                raise RetryableError(r.status_code)
+            if r.status_code == 429 or r.status_code >= 500:
+                raise RetryableError(r.status_code, r.headers.get("Retry-After"))
+            r.raise_for_status()
+            meta = {
+                "url": url,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+            if r.status_code == 206:
+                start, expected_size = parse_content_range(
+                    r.headers.get("Content-Range")
+                )
+                if start != offset:
+                    remove_part(part_path)
+                    raise RetryableError(r.status_code)
+                mode = "ab"
+                saved_meta = load_part_meta(part_path)
+                meta["etag"] = meta["etag"] or saved_meta.get("etag")
+                meta["last_modified"] = meta["last_modified"] or saved_meta.get(
+                    "last_modified"
+                )
+            else:
+                expected_size = None
+                if r.headers.get("Content-Encoding", "identity") == "identity":
+                    if r.headers.get("Content-Length", "").isnumeric():
+                        expected_size = int(r.headers["Content-Length"])
+                mode = "wb"
+                save_part_meta(part_path, meta)
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    if self.bytes_task is not None:
+                        self.transfer.advance(self.bytes_task, len(chunk))
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size != expected_size:
+            if size > expected_size:
+                remove_part(part_path)
+            raise IncompleteDownloadError(
+                f"Received {size} of {expected_size} bytes for {url}"
+            )
+        not_modified = False
+        if os.path.exists(file_path):
+            if filecmp.cmp(part_path, file_path, shallow=False):
+                # server do not support validators, but sent the same file
+                not_modified = True
+            elif backup_path:
+                os.rename(file_path, backup_path)
+        if not_modified:
+            remove_part(part_path)
+        else:
+            os.replace(part_path, file_path)
+            remove_part_meta(part_path)
+        return DownloadResult(
+            url,
+            file_path,
+            True,
+            size,
+            etag=meta["etag"],
+            last_modified=meta["last_modified"],
+            not_modified=not_modified,
+        )
+
+
+def resume_point(url, part_path) -> (int, str):
+    """
+    Checks if partial file can be continued
+    :param str url: url of the file
+    :param str part_path: path of the partial file
+    :return: size of the partial file and validator for If-Range header, or 0 and None
+    """
+    if not os.path.exists(part_path):
+        return 0, None
+    meta = load_part_meta(part_path)
+    validator = None
+    if meta.get("url") == url:
+        etag = meta.get("etag")
+        # If-Range accepts only strong validators
+        if etag and not etag.startswith("W/"):
+            validator = etag
+        else:
+            validator = meta.get("last_modified")
+    offset = os.path.getsize(part_path)
+    if validator is None or offset == 0:
+        remove_part(part_path)
+        return 0, None
+    return offset, validator
+
+
+def parse_content_range(content_range) -> (int, int):
+    """
+    Parses Content-Range header (bytes 100-199/200)
+    :param str content_range: header value
+    :return: first byte position and full size of the file, or None if it is unknown
+    """
+    if not content_range:
+        return None, None
+    byte_range, _, total = content_range.replace("bytes ", "").partition("/")
+    start = byte_range.partition("-")[0]
+    return (
+        int(start) if start.isnumeric() else None,
+        int(total) if total.isnumeric() else None,
+    )
+
+
+def load_part_meta(part_path) -> {}:
+    try:
+        with open(part_path + ".json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_part_meta(part_path, meta) -> None:
+    with open(part_path + ".json", "w") as f:
+        json.dump(meta, f)
+
+
+def remove_part_meta(part_path) -> None:
+    if os.path.exists(part_path + ".json"):
+        os.remove(part_path + ".json")
+
+
+def remove_part(part_path) -> None:
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    remove_part_meta(part_path)
+
+
+class RetryableError(requests.RequestException):
+    """Server is throttling, have temporary problem or partial file could not be continued"""
+
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.retry_after = None
+        if retry_after and retry_after.isnumeric():
+            self.retry_after = min(float(retry_after), 60.0)
+        super().__init__(f"Server responded with {status_code}")
+
+
+class IncompleteDownloadError(requests.RequestException):
+    """Connection was closed before whole file was received"""
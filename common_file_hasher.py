@@ -0,0 +1,32 @@
+"""Content hashing of local files in a pool of worker processes"""
+import hashlib
+
+from common_worker_pool import run_in_pool
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path) -> (str, str):
+    """
+    Calculates SHA-256 of the file. Runs in worker process.
+    :param str file_path: path of the file
+    :return: file path and hex digest, or None as digest if file could not be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return file_path, None
+    return file_path, digest.hexdigest()
+
+
+def hash_files(file_paths, workers=None):
+    """
+    Hashes files in parallel
+    :param [] file_paths: paths of the files
+    :param int workers: number of worker processes, None for number of processors
+    :return: generator of (file path, hex digest) in order of completion
+    """
+    return run_in_pool(hash_file, file_paths, workers)
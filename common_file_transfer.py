@@ -0,0 +1,197 @@
+"""Moving files in worker threads, with copy fallback between volumes and journal for resuming interrupted transfers"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+COPY_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+
+
+class TransferResult:
+    """Outcome of one move"""
+
+    def __init__(self, source, destination, ok, copied=False, error=None):
+        """
+        :param str source: path of the moved file
+        :param str destination: new path of the file
+        :param bool ok: True if file was moved
+        :param bool copied: True if file was copied and deleted, because rename was not possible
+        :param str error: error description if move failed
+        """
+        self.source = source
+        self.destination = destination
+        self.ok = ok
+        self.copied = copied
+        self.error = error
+
+
+class FileTransferEngine:
+    """
+    Moves files in a pool of worker threads. Moves are given as chains, moves of one chain are done
+    one after another (for example renaming old file before putting new one in its place),
+    different chains run in parallel.
+    Plan and every finished move are written to the journal, so interrupted transfer can be finished later.
+
+        engine = FileTransferEngine(journal_path)
+        engine.run(engine.unfinished())
+        engine.run([[(source, destination)], [(old, old_backup), (new, old)]])
+    """
+
+    def __init__(self, journal_path, workers=4):
+        """
+        :param str journal_path: path of the journal file
+        :param int workers: number of parallel moves
+        """
+        self.journal_path = journal_path
+        self.workers = workers
+        self.journal_lock = threading.Lock()
+        self.journal = None
+
+    def unfinished(self) -> []:
+        """
+        Reads journal of the interrupted transfer
+        :return: chains of moves which were not done yet, empty if there is no interrupted transfer
+        """
+        if not os.path.exists(self.journal_path):
+            return []
+        plan = []
+        done = set()
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line can be cut by the interruption
+                    continue
+                if "plan" in entry:
+                    plan = entry["plan"]
+                else:
+                    done.add((entry["chain"], entry["step"]))
+        chains = []
+        for chain_index, chain in enumerate(plan):
+            remaining = []
+            for step, (source, destination) in enumerate(chain):
+                if (chain_index, step) in done:
+                    continue
+                if os.path.exists(destination + PART_SUFFIX):
+                    os.remove(destination + PART_SUFFIX)
+                if len(remaining) == 0 and (
+                    not os.path.exists(source) and os.path.exists(destination)
+                ):
+                    # moved, but interrupted before it was written to the journal
+                    continue
+                remaining.append((source, destination))
+            if len(remaining) > 0:
+                chains.append(remaining)
+        if len(chains) == 0:
+            os.remove(self.journal_path)
+        return chains
+
+    def run(self, chains, progress=None) -> []:
+        """
+        Moves files and removes the journal when all moves were attempted
+        :param [] chains: list of chains, each chain is list of (source, destination)
+        :param progress: progress function like rich.progress.track, or None
+        :return: list of TransferResult for every attempted move
+        """
+        results = []
+        if len(chains) == 0:
+            return results
+        with open(self.journal_path, "w", encoding="utf-8") as journal:
+            self.journal = journal
+            self.write_journal({"plan": chains})
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(self.run_chain, chain_index, chain)
+                    for chain_index, chain in enumerate(chains)
+                ]
+                finished = as_completed(futures)
+                if progress is not None:
+                    finished = progress(
+                        finished, description="Moving files.", total=len(futures)
+                    )
+                for future in finished:
+                    results.extend(future.result())
+            self.journal = None
+        # failed moves are reported in results, journal is kept only when run is interrupted
+        os.remove(self.journal_path)
+        return results
+
+    def write_journal(self, entry) -> None:
+        with self.journal_lock:
+            self.journal.write(json.dumps(entry) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def run_chain(self, chain_index, chain) -> []:
+        """
+        Moves files of one chain in order, stops on the first failed move. Runs in worker thread.
+        :param int chain_index: position of the chain in the plan
+        :param [] chain: list of (source, destination)
+        :return: list of TransferResult
+        """
+        results = []
+        for step, (source, destination) in enumerate(chain):
+            result = self.move(source, destination)
+            results.append(result)
+            if not result.ok:
+                break
+            self.write_journal({"chain": chain_index, "step": step})
+        return results
+
+    def move(self, source, destination) -> TransferResult:
+        """
+        Moves one file with rename, or with copy and delete when source and destination are on different volumes
+        :param str source: path of the file
+        :param str destination: new path of the file
+        :return: result of the move
+        """
+        try:
+            if os.path.exists(destination):
+                raise FileExistsError(errno.EEXIST, "Destination exists", destination)
+            try:
+                os.rename(source, destination)
+                return TransferResult(source, destination, True)
+            except OSError as _e:
+                if _e.errno != errno.EXDEV:
+                    raise
+            copy_verified(source, destination)
+            os.remove(source)
+            return TransferResult(source, destination, True, copied=True)
+        except OSError as _e:
+            return TransferResult(source, destination, False, error=str(_e))
+
+
+def copy_verified(source, destination) -> None:
+    """
+    Copies file in chunks to the partial file, checks that copy has the same content
+    and then renames it to the destination
+    :param str source: path of the file
+    :param str destination: path of the copy
+    """
+    part_path = destination + PART_SUFFIX
+    source_digest = hashlib.sha256()
+    try:
+        with open(source, "rb") as src, open(part_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+                source_digest.update(chunk)
+                dst.write(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        copy_digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                copy_digest.update(chunk)
+        if copy_digest.digest() != source_digest.digest():
+            raise OSError(errno.EIO, "Copy do not match the source", destination)
+        shutil.copystat(source, part_path)
+        os.replace(part_path, destination)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
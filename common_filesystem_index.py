@@ -0,0 +1,287 @@
+"""Snapshot of the asset library folder tree, read with one os.scandir walk and cached on disk"""
+import json
+import os
+import time
+
+INDEX_FILE_NAME = ".filesystem-index.json"
+INDEX_VERSION = 1
+# directories changed this recently are read again next time, mtime resolution can be coarse
+MTIME_SAFETY_NS = 2 * 1000 * 1000 * 1000
+
+
+class FilesystemIndex:
+    """
+    Directory listings, file sizes and modification times of the whole library tree.
+    Listing of the directory is reused from the cache while the directory modification time is the same,
+    so refresh of unchanged library costs one stat call per directory.
+    File rewritten in place, or replaced by file with the same name, do not change the directory modification time,
+    so sizes and modification times from get_size and get_mtime can be stale. Use file_stat to detect changed files.
+    Paths outside of the root are checked directly on the disk.
+
+        fs = FilesystemIndex(library_path)
+        fs.refresh()
+        if fs.exists(library_path + os.sep + "Materials"):
+            ...
+    """
+
+    def __init__(self, root, cache_path=None):
+        """
+        :param str root: library folder
+        :param str cache_path: path of the cache file, None to save it in the library folder
+        """
+        self.root = root
+        self.cache_path = cache_path
+        if self.cache_path is None:
+            self.cache_path = root + os.sep + INDEX_FILE_NAME
+        self.dirs = {}
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+
+    def refresh(self) -> None:
+        """Walks the library tree, reading only directories changed since the last walk, and saves the cache"""
+        cached = self.dirs or self.load_cache()
+        self.dirs = {}
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+        stack = [self.root]
+        while len(stack) > 0:
+            dir_path = stack.pop()
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            entry = cached.get(dir_path)
+            if entry is None or entry["mtime"] is None or entry["mtime"] != mtime:
+                entry = self.read_dir(dir_path, mtime)
+                self.scanned_dirs += 1
+            else:
+                self.reused_dirs += 1
+            self.dirs[dir_path] = entry
+            stack.extend(dir_path + os.sep + name for name in entry["dirs"])
+        self.save_cache()
+
+    @staticmethod
+    def read_dir(dir_path, mtime) -> {}:
+        """
+        Reads one directory
+        :param str dir_path: path of the directory
+        :param int mtime: modification time of the directory in nanoseconds
+        :return: directory entry with subdirectory names and file sizes and modification times
+        """
+        entry = {"mtime": mtime, "dirs": [], "files": {}}
+        if time.time_ns() - mtime < MTIME_SAFETY_NS:
+            entry["mtime"] = None
+        try:
+            with os.scandir(dir_path) as it:
+                for e in it:
+                    try:
+                        if e.is_dir():
+                            entry["dirs"].append(e.name)
+                        elif e.is_file():
+                            file_stats = e.stat()
+                            entry["files"][e.name] = [
+                                file_stats.st_size,
+                                file_stats.st_mtime_ns,
+                            ]
+                    except OSError:
+                        continue
+        except OSError:
+            entry["mtime"] = None
+        return entry
+
+    def load_cache(self) -> {}:
+        """
+        Loads directory entries saved by the previous walk
+        :return: directory entries by path, empty if cache is missing or made for other folder
+        """
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return {}
+        return data["dirs"]
+
+    def save_cache(self) -> None:
+        """Saves directory entries for the next walk"""
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(
+                    {"version": INDEX_VERSION, "root": self.root, "dirs": self.dirs}, f
+                )
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def is_indexed(self, path) -> bool:
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def split(self, path) -> (str, str):
+        parent, _, name = path.rstrip(os.sep).rpartition(os.sep)
+        return parent, name
+
+    def is_dir(self, path) -> bool:
+        """
+        :param str path: path to check
+        :return: True if path is existing directory
+        """
+        if not self.is_indexed(path):
+            return os.path.isdir(path)
+        return path.rstrip(os.sep) in self.dirs
+
+    def is_file(self, path) -> bool:
+        """
+        :param str path: path to check
+        :return: True if path is existing file
+        """
+        if not self.is_indexed(path):
+            return os.path.isfile(path)
+        parent, name = self.split(path)
+        return parent in self.dirs and name in self.dirs[parent]["files"]
+
+    def exists(self, path) -> bool:
+        """
+        :param str path: path to check
+        :return: True if path is existing file or directory
+        """
+        return self.is_dir(path) or self.is_file(path)
+
+    def get_size(self, path) -> int:
+        """
+        :param str path: path of the file
+        :return: size of the file in bytes, as it was when its directory was read
+        """
+        if not self.is_indexed(path):
+            return os.stat(path).st_size
+        parent, name = self.split(path)
+        return self.dirs[parent]["files"][name][0]
+
+    def get_mtime(self, path) -> int:
+        """
+        :param str path: path of the file
+        :return: modification time of the file in nanoseconds, as it was when its directory was read
+        """
+        if not self.is_indexed(path):
+            return os.stat(path).st_mtime_ns
+        parent, name = self.split(path)
+        return self.dirs[parent]["files"][name][1]
+
+    def file_stat(self, path) -> (int, int):
+        """
+        Size and modification time read from the disk, for detecting changed files.
+        Index entry of the file is updated with them.
+        :param str path: path of the file
+        :return: size in bytes and modification time in nanoseconds, None if file does not exist
+        """
+        try:
+            file_stats = os.stat(path)
+        except OSError:
+            return None
+        if self.is_indexed(path):
+            parent, name = self.split(path)
+            if parent in self.dirs:
+                self.dirs[parent]["files"][name] = [
+                    file_stats.st_size,
+                    file_stats.st_mtime_ns,
+                ]
+        return file_stats.st_size, file_stats.st_mtime_ns
+
+    def list_dir(self, path) -> []:
+        """
+        :param str path: path of the directory
+        :return: names of subdirectories and files
+        """
+        if not self.is_indexed(path):
+            return os.listdir(path)
+        entry = self.dirs[path.rstrip(os.sep)]
+        return entry["dirs"] + list(entry["files"])
+
+    def list_dirs(self, path) -> []:
+        """
+        :param str path: path of the directory
+        :return: names of subdirectories, empty if directory does not exist
+        """
+        entry = self.dirs.get(path.rstrip(os.sep))
+        if entry is None:
+            return []
+        return list(entry["dirs"])
+
+    def list_files(self, path) -> []:
+        """
+        :param str path: path of the directory
+        :return: names of files in directory, empty if directory does not exist
+        """
+        entry = self.dirs.get(path.rstrip(os.sep))
+        if entry is None:
+            return []
+        return list(entry["files"])
+
+    def iter_dirs(self, include_root=True):
+        """
+        :param bool include_root: False to leave out the library folder itself
+        :return: generator of paths of all indexed directories, in sorted order
+        """
+        for dir_path in sorted(self.dirs):
+            if include_root or dir_path != self.root:
+                yield dir_path
+
+    def iter_files(self, include_root=True):
+        """
+        :param bool include_root: False to leave out files in the library folder itself
+        :return: generator of paths of all indexed files, sorted by directory and name
+        """
+        for dir_path in self.iter_dirs(include_root):
+            for name in sorted(self.dirs[dir_path]["files"]):
+                yield dir_path + os.sep + name
+
+    def add_dir(self, path) -> None:
+        """
+        Adds created directory and its missing parents to the index
+        :param str path: path of the directory
+        """
+        path = path.rstrip(os.sep)
+        if not self.is_indexed(path) or path in self.dirs:
+            return
+        self.dirs[path] = {"mtime": None, "dirs": [], "files": {}}
+        parent, name = self.split(path)
+        if parent != path:
+            self.add_dir(parent)
+            if name not in self.dirs[parent]["dirs"]:
+                self.dirs[parent]["dirs"].append(name)
+            self.dirs[parent]["mtime"] = None
+
+    def add_file(self, path) -> None:
+        """
+        Adds created or changed file to the index
+        :param str path: path of the file
+        """
+        if not self.is_indexed(path):
+            return
+        parent, name = self.split(path)
+        self.add_dir(parent)
+        file_stats = os.stat(path)
+        self.dirs[parent]["files"][name] = [file_stats.st_size, file_stats.st_mtime_ns]
+        self.dirs[parent]["mtime"] = None
+
+    def remove(self, path) -> None:
+        """
+        Removes deleted or moved file or directory from the index
+        :param str path: path of the file or directory
+        """
+        path = path.rstrip(os.sep)
+        if not self.is_indexed(path):
+            return
+        parent, name = self.split(path)
+        if path in self.dirs:
+            for dir_path in [
+                d for d in self.dirs if d == path or d.startswith(path + os.sep)
+            ]:
+                del self.dirs[dir_path]
+            if parent in self.dirs and name in self.dirs[parent]["dirs"]:
+                self.dirs[parent]["dirs"].remove(name)
+        elif parent in self.dirs:
+            self.dirs[parent]["files"].pop(name, None)
+        if parent in self.dirs:
+            self.dirs[parent]["mtime"] = None
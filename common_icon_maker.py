@@ -0,0 +1,27 @@
+"""Folder icon generation from preview images in a pool of worker processes"""
+import f_icon
+
+from common_worker_pool import run_in_pool
+
+
+def make_icon(preview_path) -> (str, str):
+    """
+    Creates folder icon from the preview image. Runs in worker process.
+    :param str preview_path: path of the Preview.png
+    :return: preview path and error description, or None as error if icon was created
+    """
+    try:
+        f_icon.create_icon(preview_path)
+    except Exception as _e:
+        return preview_path, str(_e)
+    return preview_path, None
+
+
+def make_icons(preview_paths, workers=None):
+    """
+    Creates icons in parallel
+    :param [] preview_paths: paths of the preview images
+    :param int workers: number of worker processes, None for number of processors
+    :return: generator of (preview path, error) in order of completion
+    """
+    return run_in_pool(make_icon, preview_paths, workers)
@@ -0,0 +1,131 @@
+"""In-memory lookup tables over database rows, used to avoid linear scans while processing data"""
+
+
+class KeyedLookup:
+    """Dictionary index over database rows keyed by one column"""
+
+    def __init__(self, rows, key, id_key):
+        """
+        Builds index from already loaded database rows
+        :param [] rows: database rows as dictionaries
+        :param str key: column used as lookup key (for example "name" or "original_id")
+        :param str id_key: column holding the row ID (for example "tag_id")
+        """
+        self.key = key
+        self.id_key = id_key
+        self.rows = {}
+        for row in rows:
+            # first row wins, same as the first match of a linear scan
+            if row[key] not in self.rows:
+                self.rows[row[key]] = row
+
+    def __contains__(self, value) -> bool:
+        return value in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, value):
+        """
+        Row by its key value
+        :param value: key value
+        :return: row dictionary or None if it is not known
+        """
+        return self.rows.get(value)
+
+    def get_id(self, value) -> int:
+        """
+        Row ID by its key value
+        :param value: key value
+        :return: row ID or -1 if it is not known
+        """
+        row = self.rows.get(value)
+        if row is None:
+            return -1
+        return row[self.id_key]
+
+    def add(self, row) -> None:
+        """
+        Adds new row to the index. Must be called after every insert to keep index in sync with the database
+        :param dict row: row data, must contain key and ID columns
+        """
+        if row[self.key] not in self.rows:
+            self.rows[row[self.key]] = row
+
+    def get_or_create_id(self, value, create) -> int:
+        """
+        Row ID by its key value, creating new database entry when it is not known.
+        Meant for simple name tables (tag, type, category, ...)
+        :param value: key value
+        :param create: function inserting new entry and returning its ID, like CommonDatabaseAccess.set_new_tag
+        :return: row ID
+        """
+        row_id = self.get_id(value)
+        if row_id == -1:
+            row_id = create(value)
+            self.add({self.id_key: row_id, self.key: value})
+        return row_id
+
+
+class LinkLookup:
+    """Set of ID pairs for link tables (asset_tag, asset_preview, ...)"""
+
+    def __init__(self, rows, first_key, second_key):
+        """
+        Builds index from already loaded link table rows
+        :param [] rows: database rows as dictionaries
+        :param str first_key: column of the first ID (for example "asset_id")
+        :param str second_key: column of the second ID (for example "tag_id")
+        """
+        self.first_key = first_key
+        self.second_key = second_key
+        self.pairs = {(row[first_key], row[second_key]) for row in rows}
+        self.pending = []
+
+    def __contains__(self, pair) -> bool:
+        return pair in self.pairs
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def has(self, first_id, second_id) -> bool:
+        """
+        Checks if link between both IDs exists
+        :param int first_id: first ID
+        :param int second_id: second ID
+        :return: True if link is known
+        """
+        return (first_id, second_id) in self.pairs
+
+    def add(self, first_id, second_id) -> None:
+        """
+        Adds new link to the index. Must be called after every insert to keep index in sync with the database
+        :param int first_id: first ID
+        :param int second_id: second ID
+        """
+        self.pairs.add((first_id, second_id))
+
+    def queue(self, first_id, second_id) -> bool:
+        """
+        Adds link to the index and keeps it for the next flush, so new links can be written with one bulk insert
+        :param int first_id: first ID
+        :param int second_id: second ID
+        :return: True if link was not known before
+        """
+        if (first_id, second_id) in self.pairs:
+            return False
+        self.pairs.add((first_id, second_id))
+        self.pending.append((first_id, second_id))
+        return True
+
+    def flush(self, create_many) -> int:
+        """
+        Writes all queued links to the database
+        :param create_many: bulk insert function, like CommonDatabaseAccess.set_asset_tags
+        :return: number of written links
+        """
+        count = len(self.pending)
+        if count > 0:
+            create_many(self.pending)
+            self.pending = []
+        return count
@@ -0,0 +1,302 @@
+"""Opt-in statistics of SQL statements executed by the database connection, grouped by statement shape"""
+import random
+import re
+import sqlite3
+import time
+
+from rich.table import Table
+
+# latency samples kept per statement shape for the percentiles
+SAMPLE_LIMIT = 1000
+# virtual machine instructions between calls of the progress handler
+PROGRESS_STEPS = 1000
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_BLOB_RE = re.compile(r"\b[xX]\?")
+# None parameters, not NOT NULL
+_NULL_RE = re.compile(r"(?<=[=,(])(\s*)NULL\b", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST_RE = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def statement_shape(sql) -> str:
+    """
+    Statement with literals and parameters replaced by ?, lists of them collapsed and whitespace squeezed,
+    so every execution of the same query has the same shape, whatever values it got
+    :param str sql: statement text, with parameters or with values filled in by SQLite
+    :return: shape of the statement
+    """
+    shape = _STRING_RE.sub("?", sql)
+    shape = _BLOB_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _NULL_RE.sub(r"\1?", shape)
+    shape = _IN_LIST_RE.sub("(...)", shape)
+    shape = _VALUES_LIST_RE.sub("(...)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+class StatementStats:
+    """Counters of one statement shape"""
+
+    def __init__(self):
+        # execute calls, executemany counts once
+        self.calls = 0
+        # statements started by SQLite, executemany counts every row
+        self.executions = 0
+        # rows fetched, or changed by INSERT, UPDATE and DELETE
+        self.rows = 0
+        # seconds spent in execute and fetching
+        self.total = 0.0
+        # virtual machine instructions, in PROGRESS_STEPS units
+        self.steps = 0
+        # latencies of the calls, at most SAMPLE_LIMIT picked evenly from all calls
+        self.samples = []
+
+    def percentile(self, fraction) -> float:
+        """
+        :param float fraction: 0.5 for median, 0.95 for 95th percentile
+        :return: call latency in seconds
+        """
+        if len(self.samples) == 0:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SqlStats:
+    """
+    Collects per shape counts, latencies and rows of the statements of one connection.
+    SQLite trace callback counts every started statement, progress handler counts virtual machine work
+    of the running statement, and the connection cursors measure duration of the calls and returned rows.
+    """
+
+    def __init__(self, limit=20):
+        """
+        :param int limit: number of statement shapes in the printed table
+        """
+        self.limit = limit
+        self.statements = {}
+        # statement text to its shape, for statements with parameters
+        self.shapes = {}
+        # statement shape which is running now, for the progress handler
+        self.current = None
+        self.random = random.Random(0)
+
+    def attach(self, conn) -> None:
+        """
+        Installs callbacks to the connection created with factory=TracedConnection
+        :param TracedConnection conn: connection to measure
+        """
+        conn.stats = self
+        conn.set_trace_callback(self.on_trace)
+        conn.set_progress_handler(self.on_progress, PROGRESS_STEPS)
+
+    def shape_of(self, sql) -> str:
+        shape = self.shapes.get(sql)
+        if shape is None:
+            shape = statement_shape(sql)
+            if len(self.shapes) < 10000:
+                self.shapes[sql] = shape
+        return shape
+
+    def get(self, shape) -> StatementStats:
+        statement = self.statements.get(shape)
+        if statement is None:
+            statement = self.statements[shape] = StatementStats()
+        return statement
+
+    def on_trace(self, sql) -> None:
+        # text has the values filled in, so it is not cached like statements with parameters
+        self.current = statement_shape(sql)
+        self.get(self.current).executions += 1
+
+    def on_progress(self) -> int:
+        if self.current is not None:
+            self.get(self.current).steps += 1
+        return 0  # continue with the statement
+
+    def record(self, shape, seconds, rows) -> None:
+        """
+        Records one finished call
+        :param str shape: statement shape
+        :param float seconds: time spent in execute and fetching
+        :param int rows: number of rows fetched or changed
+        """
+        statement = self.get(shape)
+        statement.calls += 1
+        statement.rows += rows
+        statement.total += seconds
+        if len(statement.samples) < SAMPLE_LIMIT:
+            statement.samples.append(seconds)
+        else:
+            index = self.random.randrange(statement.calls)
+            if index < SAMPLE_LIMIT:
+                statement.samples[index] = seconds
+
+    def reset(self) -> None:
+        self.statements = {}
+        self.current = None
+
+    def top(self, limit=None) -> []:
+        """
+        :param int limit: number of shapes, self.limit if None
+        :return: (shape, StatementStats) with the longest total time first
+        """
+        ordered = sorted(
+            self.statements.items(),
+            key=lambda item: (item[1].total, item[1].executions),
+            reverse=True,
+        )
+        return ordered[: limit or self.limit]
+
+    def table(self, title="SQL statements", limit=None) -> Table:
+        """
+        Table of the statement shapes with the longest total time.
+        Many executions with about one row each usually mean query in a loop (N+1).
+        :param str title: title of the table
+        :param int limit: number of shapes, self.limit if None
+        :return: rich table, for console.print
+        """
+        total = sum(statement.total for statement in self.statements.values())
+        executions = sum(statement.executions for statement in self.statements.values())
+        table = Table(
+            title=f"{title} - {executions} executions, {total:.3f} s in SQLite",
+            title_justify="left",
+        )
+        table.add_column("Statement", overflow="fold", ratio=1)
+        for column in (
+            "Execs",
+            "Rows",
+            "Rows/exec",
+            "Total ms",
+            "p50 ms",
+            "p95 ms",
+            "p99 ms",
+            "VM steps",
+        ):
+            table.add_column(column, justify="right", no_wrap=True)
+        for shape, statement in self.top(limit):
+            executions = max(statement.executions, statement.calls)
+            table.add_row(
+                shape if len(shape) <= 300 else shape[:297] + "...",
+                str(executions),
+                str(statement.rows),
+                f"{statement.rows / executions:.1f}" if executions else "",
+                f"{statement.total * 1000:.1f}",
+                f"{statement.percentile(0.5) * 1000:.3f}",
+                f"{statement.percentile(0.95) * 1000:.3f}",
+                f"{statement.percentile(0.99) * 1000:.3f}",
+                f"{statement.steps * PROGRESS_STEPS // 1000}k",
+            )
+        return table
+
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Cursor measuring its calls. Call lasts from execute until all rows are fetched,
+    next execute or until the cursor is dropped, so rows read with fetchone or iteration are counted too.
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.stats = conn.stats
+        self.shape = None
+        self.elapsed = 0.0
+        self.fetched = 0
+
+    def finish(self) -> None:
+        if self.shape is not None:
+            self.stats.record(self.shape, self.elapsed, self.fetched)
+            self.shape = None
+
+    def measure(self, sql, function, *args):
+        self.finish()
+        shape = self.stats.shape_of(sql)
+        start = time.perf_counter()
+        try:
+            result = function(*args)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.shape = shape
+            self.fetched = 0
+        if self.description is None:
+            # statement without result rows is complete after execute
+            self.fetched = max(0, self.rowcount)
+            self.finish()
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self.measure(sql, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.measure(sql, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.measure(sql_script, super().executescript, sql_script)
+
+    def fetch(self, function, *args):
+        if self.shape is None:
+            return function(*args)
+        self.stats.current = self.shape
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self.fetch(super().fetchone)
+        if row is None:
+            self.finish()
+        else:
+            self.fetched += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self.fetch(super().fetchmany, size or self.arraysize)
+        self.fetched += len(rows)
+        if len(rows) == 0:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self.fetch(super().fetchall)
+        self.fetched += len(rows)
+        self.finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self.fetch(super().__next__)
+        except StopIteration:
+            self.finish()
+            raise
+        self.fetched += 1
+        return row
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def __del__(self):
+        self.finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the ones of execute shortcuts, are TracedCursor"""
+
+    stats = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
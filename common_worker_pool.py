@@ -0,0 +1,23 @@
+"""Running one function over many items in a pool of workers"""
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def run_in_pool(function, items, workers=None, executor_class=ProcessPoolExecutor):
+    """
+    Calls function for every item in parallel. Function should catch its own errors and return them
+    in the result, so one bad item does not stop the rest.
+    :param function: function of one item, module level function for process pool
+    :param [] items: arguments of the function calls
+    :param int workers: number of workers, None for number of processors
+    :param executor_class: ProcessPoolExecutor for CPU work, ThreadPoolExecutor for waiting work
+    :return: generator of function results in order of completion
+    """
+    if len(items) == 0:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    with executor_class(max_workers=workers) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
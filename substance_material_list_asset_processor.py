@@ -5,6 +5,9 @@ and saved in local SQLite file
 import os
 import time
 import sys
+import argparse
+import functools
+import itertools
 
 import re
 import json
@@ -15,24 +18,37 @@ import platform
 
 from os import path
 
-import requests  # to get image from the web
-import shutil  # to save it locally
 
 from rich import pretty
 from rich.console import Console
 from rich.traceback import install
 from rich.progress import track
 
-from common_database_access import CommonDatabaseAccess
-
-import f_icon
+from common_download_engine import DownloadEngine
+from common_file_hasher import hash_files
+from common_file_transfer import FileTransferEngine
+from common_filesystem_index import FilesystemIndex
+from common_icon_maker import make_icons
+from common_database_access import CommonDatabaseAccess, STORAGE_FILE, STORAGE_MODES
+from common_sql_stats import SqlStats
 
 from pathlib import Path
+from urllib.parse import urlparse
 
 console = Console()
 pretty.install()
 install()  # this is for tracing project activity
-global_data = {"version": "Beta 1 (15.09.2022)\n"}
+global_data = {
+    "version": "Beta 1 (15.09.2022)\n",
+    "download_workers": 8,
+    "download_per_host": 4,
+    "refresh_images": False,
+    "hash_workers": os.cpu_count() or 1,
+    "transfer_workers": 4,
+    "icon_workers": os.cpu_count() or 1,
+    "cdn_url": None,
+    "sql_stats": 0,
+}
 
 
 def clear_console():
@@ -43,14 +59,25 @@ def clear_console():
     os.system(command)
 
 
+def get_single_download_engine() -> DownloadEngine:
+    """
+        Engine for downloads of single files outside of the download queue, shared by all of them,
+        so they reuse its HTTP session. It is not started, so it has no worker threads and progress display.
+    :return: download engine
+    """
+    if "single_download_engine" not in global_data:
+        global_data["single_download_engine"] = DownloadEngine(
+            workers=1, per_host=1, show_progress=False
+        )
+    return global_data["single_download_engine"]
+
+
 def download_image(url, file_path):
     if not path.exists(file_path):
-        r = requests.get(url, stream=True)
-        # Set decode_content value to True, otherwise the downloaded image file's size will be zero.
-        r.raw.decode_content = True
-        # Open a local file with wb ( write binary ) permission.
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(r.raw, f)
+        # written to the partial file and renamed only when whole file is received
+        result = get_single_download_engine().download(url, file_path)
+        if not result.ok:
+            console.print(f"[red]Failed to download {url} -- {result.error}")
 
 
 def append_date(filename):
@@ -65,17 +92,190 @@ def append_date(filename):
     )
 
 
-def check_for_download(url, file_path, need_to_refresh) -> None:
+def rebase_url(url) -> str:
+    """
+        Points image url to the server given on the command line, keeping its path
+    :param str url: url of the image
+    :return: url on the configured server, or unchanged url if no server is configured
+    """
+    if not url or not global_data["cdn_url"]:
+        return url
+    parts = urlparse(url)
+    rebased = global_data["cdn_url"].rstrip("/") + parts.path
+    if parts.query:
+        rebased += "?" + parts.query
+    return rebased
+
+
+def check_for_download(
+    url, file_path, need_to_refresh, engine=None, on_done=None, downloaded_files=None
+) -> None:
     """
-        Checks if destination file exists, and if it does not, or need to refresh, then downloads file from url
+        Checks if destination file exists, and if it does not, or need to refresh, then downloads file from url.
+        With download engine refreshed file is requested conditionally, and previous file is renamed
+        only when the server sends different image.
     :param str url: url of the file to be downloaded
     :param str file_path: path of the destination file
     :param bool need_to_refresh: force override for download
+    :param DownloadEngine engine: download engine to queue download in, if None file is downloaded right away
+    :param on_done: function called with DownloadResult when queued download finishes
+    :param dict downloaded_files: records of completely downloaded files by file path
     """
+    url = rebase_url(url)
     if url:
-        if os.path.exists(file_path) and need_to_refresh:
-            os.rename(file_path, append_date(file_path))
-        download_image(url, file_path)
+        if engine is None:
+            if os.path.exists(file_path) and need_to_refresh:
+                os.rename(file_path, append_date(file_path))
+            download_image(url, file_path)
+        elif not path.exists(file_path):
+            engine.submit(url, file_path, on_done)
+        elif need_to_refresh:
+            validators = None
+            if downloaded_files is not None and is_downloaded(
+                url, file_path, downloaded_files
+            ):
+                record = downloaded_files[file_path]
+                validators = {
+                    "etag": record["etag"],
+                    "last_modified": record["last_modified"],
+                }
+            engine.submit(
+                url,
+                file_path,
+                on_done,
+                validators=validators,
+                backup_path=append_date(file_path),
+            )
+
+
+def details_file_name(index) -> str:
+    """
+        File name of the details image
+    :param int index: position of the image in preview_details of the extra data
+    :return: file name
+    """
+    return f"Details{'' if index == 0 else str(index)}.png"
+
+
+def variant_file_name(index) -> str:
+    """
+        File name of the variant image
+    :param int index: position of the image in preview_variant of the extra data
+    :return: file name
+    """
+    return f"Variant{str(index + 1)}.png"
+
+
+def is_downloaded(url, file_path, downloaded_files) -> bool:
+    """
+        Checks if file on the disk is the complete download of the url
+    :param str url: url of the file
+    :param str file_path: path of the file
+    :param dict downloaded_files: records of completely downloaded files by file path
+    :return: True if file was downloaded from the same url and have the recorded size
+    """
+    record = downloaded_files.get(file_path)
+    return (
+        record is not None
+        and record["url"] == url
+        and path.exists(file_path)
+        and os.path.getsize(file_path) == record["size"]
+    )
+
+
+def save_extra_data(extra_data_path, extra_data) -> None:
+    """
+        Saves extra-data.txt of the asset folder
+    :param str extra_data_path: path to the extra-data.txt
+    :param dict extra_data: extra data
+    """
+    with open(extra_data_path, "w") as outfile:
+        json.dump(extra_data, outfile, indent=4, sort_keys=True)
+
+
+def image_downloaded(
+    database, extra_data_path, extra_data, key, original_id, refresh, result
+) -> None:
+    """
+        Called when queued image download finishes, records the download.
+        Failed new details or variant image keeps its position in the extra data, so its file name stays the same,
+        and is added to preview_pending to be downloaded again next time. Failed thumbnail is removed.
+    :param CommonDatabaseAccess database: reference to the database
+    :param str extra_data_path: path to the extra-data.txt
+    :param dict extra_data: extra data of the asset folder
+    :param str key: extra data key of the image (preview_original_id, preview_details or preview_variant)
+    :param str original_id: original ID of the preview image
+    :param bool refresh: True if already known image was checked for changes
+    :param DownloadResult result: download result
+    """
+    pending = extra_data.setdefault("preview_pending", [])
+    if result.ok:
+        database.set_downloaded_file(
+            result.file_path,
+            result.url,
+            result.size,
+            result.etag,
+            result.last_modified,
+        )
+        if original_id in pending:
+            pending.remove(original_id)
+            save_extra_data(extra_data_path, extra_data)
+        return
+    console.print(f"[red]Failed to download {result.url} -- {result.error}")
+    if refresh:
+        return
+    if key == "preview_original_id":
+        extra_data.pop(key, None)
+    elif original_id not in pending:
+        pending.append(original_id)
+    save_extra_data(extra_data_path, extra_data)
+
+
+def queue_image(
+    database,
+    engine,
+    downloaded_files,
+    extra_data_path,
+    extra_data,
+    key,
+    preview,
+    file_path,
+    refresh=False,
+) -> None:
+    """
+        Queues preview image download, new images are added to the extra data.
+        Image which is already in the extra data (pending after failed download) keeps its position.
+    :param CommonDatabaseAccess database: reference to the database
+    :param DownloadEngine engine: download engine
+    :param dict downloaded_files: records of completely downloaded files by file path
+    :param str extra_data_path: path to the extra-data.txt
+    :param dict extra_data: extra data of the asset folder
+    :param str key: extra data key of the image (preview_original_id, preview_details or preview_variant)
+    :param dict preview: preview data
+    :param str file_path: path of the image file
+    :param bool refresh: True to only check already known image for changes
+    """
+    if not refresh:
+        if key == "preview_original_id":
+            extra_data[key] = preview["original_id"]
+        elif preview["original_id"] not in extra_data[key]:
+            extra_data[key].append(preview["original_id"])
+    check_for_download(
+        preview["url"],
+        file_path,
+        True,
+        engine,
+        functools.partial(
+            image_downloaded,
+            database,
+            extra_data_path,
+            extra_data,
+            key,
+            preview["original_id"],
+            refresh,
+        ),
+        downloaded_files,
+    )
 
 
 def pluralize(noun) -> str:
@@ -116,6 +316,18 @@ def check_size(file_path) -> int:
     return file_stats.st_size
 
 
+def get_filesystem_index() -> FilesystemIndex:
+    """
+        Index of the library folder, refreshed with changes made since the last action
+    :return: filesystem index
+    """
+    if "filesystem_index" not in global_data:
+        global_data["filesystem_index"] = FilesystemIndex(global_data["local_path"])
+    fs = global_data["filesystem_index"]
+    fs.refresh()
+    return fs
+
+
 def is_date_early(first_date, second_date) -> bool:
     """
         Compares 2 strings as dates
@@ -132,83 +344,116 @@ def is_date_early(first_date, second_date) -> bool:
     return first_converted_date < second_converted_date
 
 
-def move_folders_to_new_category(database) -> None:
+def track_type_assets(
+    database, asset_types=None, only_existing_types=False, progress=track
+):
+    """
+        Iterates the latest revision of every asset together with its type and active category,
+        showing progress for each asset type. All assets are read with one database query.
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] asset_types: asset types to iterate, all types if None
+    :param bool only_existing_types: skip asset types without local folder
+    :param progress: progress function, rich track or DownloadEngine.track
+    :return: generator of asset data with added type_path, category_path and asset_path
+    """
+    type_ids = None
+    if asset_types is not None:
+        type_ids = [a["type_id"] for a in asset_types]
+    counts = database.get_latest_assets_count_by_type()
+    all_assets = database.get_latest_assets_with_category(type_ids)
+    for type_id, type_assets in itertools.groupby(
+        all_assets, key=lambda asset: asset["type_id"]
+    ):
+        first_asset = next(type_assets)
+        type_name = correct_type_name(first_asset["type_name"])
+        type_path = global_data["local_path"] + os.sep + type_name
+        if only_existing_types and not os.path.exists(type_path):
+            continue
+        console.print()
+        for asset in progress(
+            itertools.chain([first_asset], type_assets),
+            description=f"Assets for type {type_name}",
+            total=counts[type_id],
+        ):
+            set_asset_paths(asset)
+            yield asset
+
+
+def find_asset_folders(fs, asset_types, all_categories) -> {}:
+    """
+        Maps asset folder names to their current locations in the Type/Category/Asset tree with one pass over the index
+    :param FilesystemIndex fs: library folder index
+    :param [] asset_types: all asset types
+    :param [] all_categories: all categories
+    :return: list of asset folder paths by folder name, in type and category order
+    """
+    locations = {}
+    for a in asset_types:
+        type_path = global_data["local_path"] + os.sep + correct_type_name(a["name"])
+        if not fs.is_dir(type_path):
+            continue
+        for c in all_categories:
+            category_path = type_path + os.sep + c["name"]
+            for name in fs.list_dirs(category_path):
+                if name not in locations:
+                    locations[name] = []
+                locations[name].append(category_path + os.sep + name)
+    return locations
+
+
+def move_folders_to_new_category(database, dry_run=False) -> None:
     """
     Checks if asset folder do not exist at category location, then looks in every category
     for the asset to relocate to the proper location
     :param CommonDatabaseAccess database: reference to the database
+    :param bool dry_run: only write the plan of the moves, without moving anything
     """
     console.print("Generating report ...")
-    asset_types = database.get_all_types()
-    all_categories = database.get_all_categories()
+    fs = get_filesystem_index()
+    locations = find_asset_folders(
+        fs, database.get_all_types(), database.get_all_categories()
+    )
+    planned_sources = set()
+    planned_destinations = set()
+    plan = []
+    for asset in track_type_assets(database):
+        expected_path = asset["asset_path"]
+        if fs.is_dir(expected_path) or expected_path in planned_destinations:
+            continue
+        # we did not find our asset in the right place, so we take it from other category
+        for checked_path in locations.get(asset["name"], []):
+            if checked_path != expected_path and checked_path not in planned_sources:
+                plan.append((checked_path, expected_path, asset["category_path"]))
+                planned_sources.add(checked_path)
+                planned_destinations.add(expected_path)
+                break
     placement_log = []
-    for a in asset_types:  # track(asset_types, description="Types."):
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            expected_path = (
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-                + os.sep
-                + asset["name"]
-            )
-            if not os.path.exists(expected_path):
-                # we did not find our asset in the right place, so we check everywhere
-                found = False
-                for a1 in asset_types:
-                    for c1 in all_categories:
-                        checked_path = (
-                            global_data["local_path"]
-                            + os.sep
-                            + correct_type_name(a1["name"])
-                            + os.sep
-                            + c1["name"]
-                            + os.sep
-                            + asset["name"]
-                        )
-                        if checked_path != expected_path and os.path.exists(
-                            checked_path
-                        ):
-                            placement_log.append(checked_path + " >> " + expected_path)
-                            if not os.path.exists(
-                                global_data["local_path"]
-                                + os.sep
-                                + correct_type_name(a["name"])
-                                + os.sep
-                                + c["name"]
-                            ):
-                                os.makedirs(
-                                    global_data["local_path"]
-                                    + os.sep
-                                    + correct_type_name(a["name"])
-                                    + os.sep
-                                    + c["name"]
-                                )
-
-                            os.rename(checked_path, expected_path)
-                            found = True
-                            break
-                    if found:
-                        break
-    console.print("Moved Assets - " + str(len(placement_log)))
+    for checked_path, expected_path, category_path in plan:
+        placement_log.append(checked_path + " >> " + expected_path)
+        if dry_run:
+            continue
+        if not fs.is_dir(category_path):
+            os.makedirs(category_path)
+            fs.add_dir(category_path)
+        os.rename(checked_path, expected_path)
+        fs.remove(checked_path)
+        fs.add_dir(expected_path)
+    if dry_run:
+        console.print("Planned Moves - " + str(len(placement_log)))
+    else:
+        console.print("Moved Assets - " + str(len(placement_log)))
     console.print()
     console.print("All Done !!!")
     if len(placement_log) > 0:
         file = open(
             append_date(
-                global_data["local_path"] + os.sep + "AssetCategoryChangeLog.txt"
+                global_data["local_path"]
+                + os.sep
+                + (
+                    "AssetCategoryChangePlan.txt"
+                    if dry_run
+                    else "AssetCategoryChangeLog.txt"
+                )
             ),
             "w",
             encoding="utf-8",
@@ -216,7 +461,6 @@ def move_folders_to_new_category(database) -> None:
         for f in placement_log:
             file.write(f + "\n")
         file.close()
-    input("Press any enter to close...")
 
 
 def fancy_list_generation(database) -> None:
@@ -272,7 +516,6 @@ def fancy_list_generation(database) -> None:
         for f in fancy_requests:
             file.write(f + "\n")
         file.close()
-    input("Press any enter to close...")
 
 
 def generate_detail_report(database) -> None:
@@ -281,77 +524,49 @@ def generate_detail_report(database) -> None:
     :param CommonDatabaseAccess database: reference to the database
     """
     console.print("Generating detail report ...")
-    asset_types = database.get_all_types()
+    fs = get_filesystem_index()
     placement_log = {"have": [], "missing": [], "revision": []}
-    for a in asset_types:  # track(asset_types, description="Types."):
-        if not os.path.exists(
-            global_data["local_path"] + os.sep + correct_type_name(a["name"])
-        ):
-            continue
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        data = {}
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            if os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-                + os.sep
-                + asset["name"]
-            ):
-                asset_downloads = database.get_asset_download_by_asset_id(
-                    asset["asset_id"]
-                )
-                for ad in asset_downloads:
-                    revisions = database.get_revision_by_download_id(ad["download_id"])
-                    max_revision = 0
-                    max_date = ""
-                    found_file_revision = -1
-                    found_date = ""
-                    for r in revisions:
-                        max_revision = max(max_revision, r["revision"])
-                        if r["revision"] == max_revision:
-                            max_date = r["created_at"]
-                        if r["have_file"]:
-                            found_file_revision = max(
-                                found_file_revision, r["revision"]
+    for asset in track_type_assets(database, only_existing_types=True):
+        type_name = correct_type_name(asset["type_name"])
+        if fs.is_dir(asset["asset_path"]):
+            asset_downloads = database.get_asset_download_by_asset_id(asset["asset_id"])
+            for ad in asset_downloads:
+                revisions = database.get_revision_by_download_id(ad["download_id"])
+                max_revision = 0
+                max_date = ""
+                found_file_revision = -1
+                found_date = ""
+                for r in revisions:
+                    max_revision = max(max_revision, r["revision"])
+                    if r["revision"] == max_revision:
+                        max_date = r["created_at"]
+                    if r["have_file"]:
+                        found_file_revision = max(found_file_revision, r["revision"])
+                        found_date = r["created_at"]
+                if found_file_revision > -1:
+                    # we found file
+                    if found_file_revision == max_revision:
+                        if max_date == found_date:
+                            placement_log["have"].append(
+                                f"{type_name} > {asset['category_name']} > {asset['name']} > {revisions[0]['filename']}"
                             )
-                            found_date = r["created_at"]
-                    if found_file_revision > -1:
-                        # we found file
-                        if found_file_revision == max_revision:
-                            if max_date == found_date:
-                                placement_log["have"].append(
-                                    f"{correct_type_name(a['name'])} > {c['name']} > {asset['name']} > {revisions[0]['filename']}"
-                                )
-                            elif is_date_early(found_date, max_date):
-                                placement_log["revision"].append(
-                                    f"{correct_type_name(a['name'])} > {c['name']} > {asset['name']} > {revisions[0]['filename']} -- Have Revision {found_file_revision} with date {found_date}, max revision {max_revision} with date {max_date}"
-                                )
-                            else:
-                                # this not suppose to happen
-                                placement_log["have"].append(
-                                    f"{correct_type_name(a['name'])} > {c['name']} > {asset['name']} > {revisions[0]['filename']}"
-                                )
-                        else:
+                        elif is_date_early(found_date, max_date):
                             placement_log["revision"].append(
-                                f"{correct_type_name(a['name'])} > {c['name']} > {asset['name']} > {revisions[0]['filename']} -- Have Revision {found_file_revision}, max revision {max_revision}"
+                                f"{type_name} > {asset['category_name']} > {asset['name']} > {revisions[0]['filename']} -- Have Revision {found_file_revision} with date {found_date}, max revision {max_revision} with date {max_date}"
+                            )
+                        else:
+                            # this not suppose to happen
+                            placement_log["have"].append(
+                                f"{type_name} > {asset['category_name']} > {asset['name']} > {revisions[0]['filename']}"
                             )
                     else:
-                        placement_log["missing"].append(
-                            f"{correct_type_name(a['name'])} > {c['name']} > {asset['name']} > {revisions[0]['filename']}"
+                        placement_log["revision"].append(
+                            f"{type_name} > {asset['category_name']} > {asset['name']} > {revisions[0]['filename']} -- Have Revision {found_file_revision}, max revision {max_revision}"
                         )
+                else:
+                    placement_log["missing"].append(
+                        f"{type_name} > {asset['category_name']} > {asset['name']} > {revisions[0]['filename']}"
+                    )
     file = open(
         append_date(global_data["local_path"] + os.sep + "AssetDetailsCountReport.txt"),
         "w",
@@ -379,7 +594,6 @@ def generate_detail_report(database) -> None:
             file.write(f + "\n")
         file.write("\n")
     file.close()
-    input("Press any enter to close...")
 
 
 def generate_folder_report(database) -> None:
@@ -388,40 +602,24 @@ def generate_folder_report(database) -> None:
     :param CommonDatabaseAccess database: reference to the database
     """
     console.print("Generating folder report ...")
-    asset_types = database.get_all_types()
+    fs = get_filesystem_index()
     placement_log = []
-    for a in asset_types:  # track(asset_types, description="Types."):
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        data = {}
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            local_path = (
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-                + os.sep
-                + asset["name"]
-            )
-            if c["name"] not in data:
-                data[c["name"]] = {"have": 0, "missing": 0}
-            if os.path.exists(local_path):
-                data[c["name"]]["have"] = data[c["name"]]["have"] + 1
-            else:
-                data[c["name"]]["missing"] = data[c["name"]]["missing"] + 1
-        for d in data:
+    data = {}
+    for asset in track_type_assets(database):
+        type_name = correct_type_name(asset["type_name"])
+        if type_name not in data:
+            data[type_name] = {}
+        type_data = data[type_name]
+        if asset["category_name"] not in type_data:
+            type_data[asset["category_name"]] = {"have": 0, "missing": 0}
+        if fs.is_dir(asset["asset_path"]):
+            type_data[asset["category_name"]]["have"] += 1
+        else:
+            type_data[asset["category_name"]]["missing"] += 1
+    for type_name in data:
+        for d in data[type_name]:
             placement_log.append(
-                f"{correct_type_name(a['name'])} - {d} (Have {data[d]['have']}; Missing {data[d]['missing']})"
+                f"{type_name} - {d} (Have {data[type_name][d]['have']}; Missing {data[type_name][d]['missing']})"
             )
     file = open(
         append_date(global_data["local_path"] + os.sep + "AssetFolderCountReport.txt"),
@@ -431,69 +629,114 @@ def generate_folder_report(database) -> None:
     for f in placement_log:
         file.write(f + "\n")
     file.close()
-    input("Press any enter to close...")
 
 
-def mark_database_with_my_files(database) -> None:
+def mark_database_with_my_files(database, verify=False) -> None:
     """
         Marks database with locally existing asset files
     :param CommonDatabaseAccess database: reference to the database
+    :param bool verify: also check content of the files by hash, only new and changed files are read
     """
     console.print("Checking local files for the database ...")
-    placement_log = {"new": []}
-    asset_types = database.get_all_types()
-    for a in asset_types:  # track(asset_types, description="Types."):
-        if not os.path.exists(
-            global_data["local_path"] + os.sep + correct_type_name(a["name"])
-        ):
-            continue
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            if os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-            ):
-                local_path = (
-                    global_data["local_path"]
-                    + os.sep
-                    + correct_type_name(a["name"])
-                    + os.sep
-                    + c["name"]
-                    + os.sep
-                    + asset["name"]
-                    + os.sep
-                )
-                asset_downloads = database.get_asset_download_by_asset_id(
-                    asset["asset_id"]
-                )
-                for ad in asset_downloads:
-                    revisions = database.get_revision_by_download_id(ad["download_id"])
-                    # revisions can have different file names, so need to check everything
-                    for r in revisions:
-                        check_file = local_path + r["filename"]
-                        if os.path.exists(check_file):
-                            file_size = check_size(check_file)
-                            if r["size"] == file_size and not r["have_file"]:
-                                r["have_file"] = True
-                                database.update_revision(r)
+    fs = get_filesystem_index()
+    placement_log = {"new": [], "corrupted": []}
+    found_files = []
+    # True for revisions with local file, only revisions of the scanned folders are reconciled
+    scanned_revisions = {}
+    for asset in track_type_assets(database, only_existing_types=True):
+        if fs.is_dir(asset["category_path"]):
+            local_path = asset["asset_path"] + os.sep
+            asset_downloads = database.get_asset_download_by_asset_id(asset["asset_id"])
+            for ad in asset_downloads:
+                revisions = database.get_revision_by_download_id(ad["download_id"])
+                # revisions can have different file names, so need to check everything
+                for r in revisions:
+                    scanned_revisions.setdefault(r["revision_id"], False)
+                    check_file = local_path + r["filename"]
+                    if fs.is_file(check_file):
+                        file_stat = fs.file_stat(check_file)
+                        if file_stat is not None and r["size"] == file_stat[0]:
+                            found_files.append((r, check_file, file_stat))
+                            scanned_revisions[r["revision_id"]] = True
+                            if not r["have_file"]:
                                 placement_log["new"].append(f"{check_file}")
                                 # break
-    console.print("New files - " + str(len(placement_log["new"])))
+    added, removed = database.update_revisions_have_file(scanned_revisions)
+    if verify:
+        verify_found_files(database, found_files, placement_log)
+    console.print("New files - " + str(added))
+    console.print("No longer found files - " + str(removed))
+    if verify:
+        console.print("Corrupted files - " + str(len(placement_log["corrupted"])))
+        if len(placement_log["corrupted"]) > 0:
+            file = open(
+                append_date(
+                    global_data["local_path"] + os.sep + "FileVerificationReport.txt"
+                ),
+                "w",
+                encoding="utf-8",
+            )
+            file.write(
+                f'Changed since first verification({len(placement_log["corrupted"])}): \n'
+            )
+            file.write("\n")
+            for f in placement_log["corrupted"]:
+                file.write(f + "\n")
+            file.close()
     console.print()
-    input("Press any enter to close...")
+
+
+def verify_found_files(database, found_files, placement_log) -> None:
+    """
+        Hashes found asset files and compares them with the hash saved for the revision on the first verification.
+        Hashes are cached by file path, size and modification time, so only new and changed files are read.
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] found_files: list of (revision data, file path, (size, modification time)) of files with the expected size,
+        stat is None for files which were not found
+    :param dict placement_log: log to add corrupted files to
+    """
+    cached_hashes = database.get_all_file_hashes()
+    file_stats = {}
+    file_hashes = {}
+    to_hash = []
+    for r, check_file, file_stat in found_files:
+        if file_stat is None or check_file in file_stats:
+            continue
+        file_stats[check_file] = file_stat
+        cached = cached_hashes.get(check_file)
+        if cached is not None and (cached["size"], cached["mtime"]) == file_stat:
+            file_hashes[check_file] = cached["hash"]
+        else:
+            to_hash.append(check_file)
+    new_hashes = []
+    console.print()
+    for file_path, file_hash in track(
+        hash_files(to_hash, global_data["hash_workers"]),
+        description="Hashing files.",
+        total=len(to_hash),
+    ):
+        if file_hash is not None:
+            file_hashes[file_path] = file_hash
+            new_hashes.append(
+                (
+                    file_path,
+                    *file_stats[file_path],
+                    file_hash,
+                )
+            )
+    database.set_file_hashes(new_hashes)
+    revision_hashes = []
+    for r, check_file, file_stat in found_files:
+        file_hash = file_hashes.get(check_file)
+        if file_hash is None:
+            continue
+        if r["file_hash"] is None:
+            revision_hashes.append((file_hash, r["revision_id"]))
+        elif r["file_hash"] != file_hash:
+            placement_log["corrupted"].append(
+                f"{check_file} -- revision {r['revision']}"
+            )
+    database.set_revision_file_hashes(revision_hashes)
 
 
 def transfer_all_local_files(database) -> None:
@@ -502,97 +745,126 @@ def transfer_all_local_files(database) -> None:
     :param CommonDatabaseAccess database: reference to the database
     """
     console.print("Placing files in corresponding folders ...")
-    files = os.listdir(global_data["local_path"] + os.sep + global_data["source_path"])
-    placement_log = {"moved": [], "double": [], "missing": [], "revision": []}
+    transfer = FileTransferEngine(
+        global_data["local_path"] + os.sep + "FileTransferJournal.jsonl",
+        global_data["transfer_workers"],
+    )
+    unfinished = transfer.unfinished()
+    if len(unfinished) > 0:
+        console.print(
+            f"Finishing interrupted transfer ({sum(len(c) for c in unfinished)} files) ..."
+        )
+        for result in transfer.run(unfinished, track):
+            if not result.ok:
+                console.print(f"Failed to move {result.source} -> {result.error}")
+    fs = get_filesystem_index()
+    source_folder = global_data["local_path"] + os.sep + global_data["source_path"]
+    files = fs.list_files(source_folder)
+    destinations = database.get_revision_destinations()
+    placement_log = {
+        "moved": [],
+        "double": [],
+        "missing": [],
+        "revision": [],
+        "failed": [],
+    }
+    # chains of moves, moves in one chain depend on each other and are done in order
+    moves = []
     for f in files:
-        file_revision = database.get_revision_by_filename(f)
-        if len(file_revision) > 0:
-            download = database.get_download_by_download_id(
-                file_revision[0]["download_id"]
-            )
-            asset_download = database.get_asset_download_by_download_id(
-                download[0]["download_id"]
-            )
-            asset_original_id = database.get_asset_by_asset_id(
-                asset_download[0]["asset_id"]
-            )
-            asset_revision = database.get_latest_asset_revision_by_original_id(
-                asset_original_id[0]["original_id"]
-            )
-            asset_type = database.get_types_by_type_id(asset_revision[0]["type_id"])
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset_revision[0]["asset_id"])[
-                    0
-                ]["category_id"]
-            )[0]
-            source_path = (
-                global_data["local_path"]
-                + os.sep
-                + global_data["source_path"]
-                + os.sep
-                + f
+        if f not in destinations:
+            continue
+        file_revision = destinations[f]["revisions"]
+        if destinations[f]["type_name"] is None:
+            placement_log["missing"].append(f"Missing asset for file -> {f}")
+            continue
+        asset_label = f"{correct_type_name(destinations[f]['type_name'])} -- {destinations[f]['category_name']} -- {destinations[f]['asset_name']}"
+        source_path = source_folder + os.sep + f
+        local_path = (
+            global_data["local_path"]
+            + os.sep
+            + correct_type_name(destinations[f]["type_name"])
+            + os.sep
+            + destinations[f]["category_name"]
+            + os.sep
+            + destinations[f]["asset_name"]
+        )
+        destination_path = local_path + os.sep + f
+        if fs.is_dir(local_path):
+            # sizes are read from the disk, index entries can be stale for files replaced since it was saved
+            destination_stat = (
+                fs.file_stat(destination_path) if fs.is_file(destination_path) else None
             )
-            local_path = (
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(asset_type[0]["name"])
-                + os.sep
-                + c["name"]
-                + os.sep
-                + asset_revision[0]["name"]
+            source_stat = (
+                fs.file_stat(source_path) if destination_stat is not None else None
             )
-            destination_path = local_path + os.sep + f
-            if os.path.exists(local_path):
-                if os.path.exists(destination_path):
-                    # destination file exists
-                    new_size = check_size(source_path)
-                    old_size = check_size(destination_path)
-                    new_rev = 0
-                    old_rev = 0
-                    if new_size != old_size:
-                        # different sizes
-                        for r in file_revision:
-                            if r["size"] == new_size:
-                                new_rev = r["revision"]
-                            if r["size"] == old_size:
-                                old_rev = r["revision"]
-                        if new_rev > old_rev:
-                            # source is new file
-                            for_rename = os.path.splitext(destination_path)
-                            os.rename(
-                                destination_path,
-                                f"{for_rename[0]}_rev{old_rev}{for_rename[1]}",
-                            )
-                            os.rename(source_path, destination_path)
-                            placement_log["revision"].append(
-                                f"{f} -> {correct_type_name(asset_type[0]['name'])} -- {c['name']} -- {asset_revision[0]['name']}. Replacing {for_rename[0]}_rev{old_rev}{for_rename[1]}"
-                            )
-                        else:
-                            # source is old file
-                            for_rename = os.path.splitext(destination_path)
-                            os.rename(
-                                source_path,
-                                f"{for_rename[0]}_rev{new_rev}{for_rename[1]}",
-                            )
-                            placement_log["revision"].append(
-                                f"{for_rename[0]}_rev{old_rev}{for_rename[1]} -> {correct_type_name(asset_type[0]['name'])} -- {c['name']} -- {asset_revision[0]['name']}"
-                            )
+            if destination_stat is not None and source_stat is None:
+                placement_log["failed"].append(
+                    f"{source_path} -> {destination_path}. Source file no longer exists"
+                )
+            elif destination_stat is not None:
+                # destination file exists
+                new_size = source_stat[0]
+                old_size = destination_stat[0]
+                new_rev = 0
+                old_rev = 0
+                if new_size != old_size:
+                    # different sizes
+                    for r in file_revision:
+                        if r["size"] == new_size:
+                            new_rev = r["revision"]
+                        if r["size"] == old_size:
+                            old_rev = r["revision"]
+                    for_rename = os.path.splitext(destination_path)
+                    if new_rev > old_rev:
+                        # source is new file
+                        moves.append(
+                            [
+                                (
+                                    destination_path,
+                                    f"{for_rename[0]}_rev{old_rev}{for_rename[1]}",
+                                ),
+                                (source_path, destination_path),
+                            ]
+                        )
+                        placement_log["revision"].append(
+                            f"{f} -> {asset_label}. Replacing {for_rename[0]}_rev{old_rev}{for_rename[1]}"
+                        )
                     else:
-                        # same sizes
-                        placement_log["double"].append(
-                            f"{f} -> {correct_type_name(asset_type[0]['name'])} -- {c['name']} -- {asset_revision[0]['name']}"
+                        # source is old file
+                        moves.append(
+                            [
+                                (
+                                    source_path,
+                                    f"{for_rename[0]}_rev{new_rev}{for_rename[1]}",
+                                )
+                            ]
+                        )
+                        placement_log["revision"].append(
+                            f"{for_rename[0]}_rev{old_rev}{for_rename[1]} -> {asset_label}"
                         )
                 else:
-                    # destination file do not exist
-                    os.rename(source_path, destination_path)
-                    placement_log["moved"].append(
-                        f"{f} -> {correct_type_name(asset_type[0]['name'])} -- {c['name']} -- {asset_revision[0]['name']}"
-                    )
+                    # same sizes
+                    placement_log["double"].append(f"{f} -> {asset_label}")
             else:
-                # destination folder do not exist
-                placement_log["missing"].append(
-                    f"Missing folder for -> {correct_type_name(asset_type[0]['name'])} -- {c['name']} -- {asset_revision[0]['name']}. For File -> {f}"
-                )
+                # destination file do not exist
+                moves.append([(source_path, destination_path)])
+                placement_log["moved"].append(f"{f} -> {asset_label}")
+        else:
+            # destination folder do not exist
+            placement_log["missing"].append(
+                f"Missing folder for -> {asset_label}. For File -> {f}"
+            )
+
+    # moving planned files in parallel, journal lets next run finish interrupted transfer
+    for result in transfer.run(moves, track):
+        if result.ok:
+            fs.remove(result.source)
+            fs.add_file(result.destination)
+        else:
+            placement_log["failed"].append(
+                f"{result.source} -> {result.destination}. {result.error}"
+            )
+    fs.save_cache()
 
     # generating report
     if (
@@ -600,6 +872,7 @@ def transfer_all_local_files(database) -> None:
         or len(placement_log["revision"]) > 0
         or len(placement_log["double"]) > 0
         or len(placement_log["missing"]) > 0
+        or len(placement_log["failed"]) > 0
     ):
         file = open(
             append_date(global_data["local_path"] + os.sep + "FileTransferReport.txt"),
@@ -631,219 +904,387 @@ def transfer_all_local_files(database) -> None:
             file.write("\n")
             for f in placement_log["missing"]:
                 file.write(f + "\n")
+            file.write("\n")
+        if len(placement_log["failed"]) > 0:
+            file.write(f'Failed moves({len(placement_log["failed"])}): \n')
+            file.write("\n")
+            for f in placement_log["failed"]:
+                file.write(f + "\n")
         file.close()
 
     console.print("Moved files - " + str(len(placement_log["moved"])))
     console.print("Revision files - " + str(len(placement_log["revision"])))
     console.print("Double files (not moved) - " + str(len(placement_log["double"])))
     console.print("Missing Destinations - " + str(len(placement_log["missing"])))
+    console.print("Failed moves - " + str(len(placement_log["failed"])))
     console.print()
     console.print("All Done !!!")
-    input("Press any enter to close...")
 
 
-def make_all_icons(database, ignore_created=True) -> None:
+def create_icons(database, preview_paths) -> int:
     """
-        Generate icons for all asset folders
+        Creates folder icons from preview images in worker processes and remembers previews of created icons
     :param CommonDatabaseAccess database: reference to the database
-    :param bool ignore_created: ignores already existing icons if True (default)
+    :param [] preview_paths: paths of the Preview.png files
+    :return: number of failed icons
+    """
+    previews = {}
+    for preview_path in preview_paths:
+        try:
+            preview_stats = os.stat(preview_path)
+        except OSError:
+            continue
+        previews[preview_path] = (preview_stats.st_size, preview_stats.st_mtime_ns)
+    created = []
+    failed = []
+    for preview_path, error in track(
+        make_icons(list(previews), global_data["icon_workers"]),
+        description="Creating icons.",
+        total=len(previews),
+    ):
+        if error is None:
+            created.append((preview_path, *previews[preview_path]))
+        else:
+            failed.append(preview_path)
+            console.print(f"[red]Failed to create icon for {preview_path} -- {error}")
+    database.set_icon_cache(created)
+    console.print("Created icons - " + str(len(created)))
+    console.print("Failed icons - " + str(len(failed)))
+    return len(failed)
+
+
+def make_all_icons(database, ignore_created=True) -> int:
+    """
+        Generate icons for all asset folders. Unless ignore_created is True,
+        icons of previews unchanged since their icon was created are skipped.
+    :param CommonDatabaseAccess database: reference to the database
+    :param bool ignore_created: recreates already existing icons if True (default)
+    :return: number of failed icons
     """
     console.print("Creating folder icons ...")
-    asset_types = database.get_all_types()
-    for a in asset_types:  # track(asset_types, description="Types."):
-        if not os.path.exists(
-            global_data["local_path"] + os.sep + correct_type_name(a["name"])
-        ):
+    fs = get_filesystem_index()
+    icon_cache = database.get_all_icon_cache()
+    preview_paths = []
+    unchanged = 0
+    for asset in track_type_assets(database, only_existing_types=True):
+        local_path = asset["asset_path"]
+        preview_path = local_path + os.sep + "Preview.png"
+        if not fs.is_file(preview_path):
             continue
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
+        icon_exists = fs.is_file(local_path + os.sep + "Preview.ico")
+        if platform.system() == "Windows":
+            if icon_exists and not ignore_created:
+                continue
+        else:
+            icon_exists = True
+        cached = icon_cache.get(preview_path)
+        # preview replaced in place do not change its folder, so its own stat is checked
+        if (
+            not ignore_created
+            and icon_exists
+            and cached is not None
+            and (cached["size"], cached["mtime"]) == fs.file_stat(preview_path)
         ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            if os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-            ):
-                local_path = (
-                    global_data["local_path"]
-                    + os.sep
-                    + correct_type_name(a["name"])
-                    + os.sep
-                    + c["name"]
-                    + os.sep
-                    + asset["name"]
+            unchanged += 1
+            continue
+        preview_paths.append(preview_path)
+
+    failed = create_icons(database, preview_paths)
+    console.print("Unchanged previews (skipped) - " + str(unchanged))
+    return failed
+
+
+def queue_asset_images(
+    database, engine, downloaded_files, asset, previews, has_extra_data
+) -> None:
+    """
+        Queues downloads of new preview images of one asset folder and saves its extra-data.txt
+    :param database: reference to the database, or DownloadRecorder outside of the main thread
+    :param DownloadEngine engine: download engine
+    :param dict downloaded_files: records of completely downloaded files by file path
+    :param dict asset: asset data with asset_path
+    :param [] previews: previews of the asset with original_id, url, is_thumbnail and is_far
+    :param bool has_extra_data: True if asset folder already has extra-data.txt
+    """
+    local_path = asset["asset_path"]
+    extra_data_path = local_path + os.sep + "extra-data.txt"
+    extra_data = {}
+    if has_extra_data:
+        with open(extra_data_path) as json_file:
+            extra_data = json.load(json_file)
+    if "preview_details" not in extra_data:
+        extra_data["preview_details"] = []
+    if "preview_variant" not in extra_data:
+        extra_data["preview_variant"] = []
+    if "extra_data" not in extra_data:
+        extra_data["extra_data"] = {}
+    # images which failed to download last time, downloaded again to the file of their position
+    pending = set(extra_data.get("preview_pending", []))
+    for preview in previews:
+        queue_args = (
+            database,
+            engine,
+            downloaded_files,
+            extra_data_path,
+            extra_data,
+        )
+        if preview["is_thumbnail"]:
+            is_new = (
+                "preview_original_id" not in extra_data
+                or extra_data["preview_original_id"] != preview["original_id"]
+            )
+            if is_new or global_data["refresh_images"]:
+                queue_image(
+                    *queue_args,
+                    "preview_original_id",
+                    preview,
+                    local_path + os.sep + "Preview.png",
+                    not is_new,
                 )
-                if os.path.exists(local_path):
-                    # console.print(asset)
-                    if platform.system() == "Windows":
-                        if os.path.exists(local_path + os.sep + "Preview.png") and (
-                            not os.path.exists(local_path + os.sep + "Preview.ico")
-                            or ignore_created
-                        ):
-                            f_icon.create_icon(local_path + os.sep + "Preview.png")
-                    else:
-                        if os.path.exists(local_path + os.sep + "Preview.png"):
-                            f_icon.create_icon(local_path + os.sep + "Preview.png")
+        elif preview["original_id"] in extra_data["preview_details"]:
+            is_pending = preview["original_id"] in pending
+            if is_pending or global_data["refresh_images"]:
+                index = extra_data["preview_details"].index(preview["original_id"])
+                queue_image(
+                    *queue_args,
+                    "preview_details",
+                    preview,
+                    local_path + os.sep + details_file_name(index),
+                    not is_pending,
+                )
+        elif preview["original_id"] in extra_data["preview_variant"]:
+            is_pending = preview["original_id"] in pending
+            if is_pending or global_data["refresh_images"]:
+                index = extra_data["preview_variant"].index(preview["original_id"])
+                queue_image(
+                    *queue_args,
+                    "preview_variant",
+                    preview,
+                    local_path + os.sep + variant_file_name(index),
+                    not is_pending,
+                )
+        elif preview["is_far"]:
+            index = len(extra_data["preview_details"])
+            queue_image(
+                *queue_args,
+                "preview_details",
+                preview,
+                local_path + os.sep + details_file_name(index),
+            )
+        else:
+            index = len(extra_data["preview_variant"])
+            queue_image(
+                *queue_args,
+                "preview_variant",
+                preview,
+                local_path + os.sep + variant_file_name(index),
+            )
+    if asset["extra_data_author"]:
+        extra_data["extra_data"]["author"] = asset["extra_data_author"]
+    if asset["extra_data_physical_size"]:
+        extra_data["extra_data"]["physical_size"] = asset["extra_data_physical_size"]
+    if asset["extra_data_type"]:
+        extra_data["extra_data"]["type"] = asset["extra_data_type"]
+    if asset["extra_data_style"]:
+        extra_data["extra_data"]["style"] = asset["extra_data_style"]
+    if asset["extra_data_quality"]:
+        extra_data["extra_data"]["quality"] = asset["extra_data_quality"]
+    if asset["extra_data_meshes"]:
+        extra_data["extra_data"]["meshes"] = asset["extra_data_meshes"]
+    if asset["extra_data_counters_quads"]:
+        extra_data["extra_data"]["quads"] = asset["extra_data_counters_quads"]
+    if asset["extra_data_substance_resolution"]:
+        extra_data["extra_data"]["substance_resolution"] = asset[
+            "extra_data_substance_resolution"
+        ]
+    if asset["extra_data_preview_disp"]:
+        extra_data["extra_data"]["preview_displacement"] = asset[
+            "extra_data_preview_disp"
+        ]
+    save_extra_data(extra_data_path, extra_data)
 
-    input("Press any enter to close...")
+
+def report_image_results(database, results) -> int:
+    """
+        Creates icons of the changed previews and prints download summary
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] results: DownloadResult of all downloads
+    :return: number of failed images and icons
+    """
+    # icons of changed previews are made after all downloads, using every processor
+    failed_icons = create_icons(
+        database,
+        [
+            r.file_path
+            for r in results
+            if r.ok
+            and not r.not_modified
+            and os.path.basename(r.file_path) == "Preview.png"
+        ],
+    )
+    failed = [r for r in results if not r.ok]
+    not_modified = [r for r in results if r.ok and r.not_modified]
+    console.print()
+    console.print(
+        "Downloaded images - " + str(len(results) - len(failed) - len(not_modified))
+    )
+    console.print("Not modified images - " + str(len(not_modified)))
+    console.print("Failed images - " + str(len(failed)))
+    return len(failed) + failed_icons
 
 
-def download_all_images(database) -> None:
+def download_all_images(database) -> int:
     """
         Downloads all images for each asset folder and generates extra_data.txt file
     :param CommonDatabaseAccess database: reference to the database
+    :return: number of failed images and icons
     """
     console.print("Downloading images ...")
-    asset_types = database.get_all_types()
+    fs = get_filesystem_index()
     far_tag_id = database.get_all_preview_tag_by_name("far")[0]["preview_tag_id"]
-    for a in asset_types:  # track(asset_types, description="Types."):
-        if not os.path.exists(
-            global_data["local_path"] + os.sep + correct_type_name(a["name"])
-        ):
+    far_preview_ids = {
+        ppt["preview_id"]
+        for ppt in database.get_all_preview_preview_tags()
+        if ppt["preview_tag_id"] == far_tag_id
+    }
+    engine = DownloadEngine(
+        workers=global_data["download_workers"],
+        per_host=global_data["download_per_host"],
+    )
+    downloaded_files = {
+        record["file_path"]: record for record in database.get_all_downloaded_files()
+    }
+    engine.start()
+    for asset in track_type_assets(
+        database, only_existing_types=True, progress=engine.track
+    ):
+        if not fs.is_dir(asset["asset_path"]):
             continue
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            if os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-            ):
-                local_path = (
-                    global_data["local_path"]
-                    + os.sep
-                    + correct_type_name(a["name"])
-                    + os.sep
-                    + c["name"]
-                    + os.sep
-                    + asset["name"]
-                )
-                if os.path.exists(local_path):
-                    extra_data_path = local_path + os.sep + "extra-data.txt"
-                    extra_data = {}
-                    if os.path.exists(extra_data_path):
-                        with open(extra_data_path) as json_file:
-                            extra_data = json.load(json_file)
-                    if "preview_details" not in extra_data:
-                        extra_data["preview_details"] = []
-                    if "preview_variant" not in extra_data:
-                        extra_data["preview_variant"] = []
-                    if "extra_data" not in extra_data:
-                        extra_data["extra_data"] = {}
-                    asset_previews = database.get_asset_preview_by_asset_id(
-                        asset["asset_id"]
+        previews = []
+        for ap in database.get_asset_preview_by_asset_id(asset["asset_id"]):
+            preview = database.get_preview_by_preview_id(ap["preview_id"])[0]
+            preview["is_thumbnail"] = preview["preview_id"] == asset["thumbnail_id"]
+            preview["is_far"] = preview["preview_id"] in far_preview_ids
+            previews.append(preview)
+        queue_asset_images(
+            database,
+            engine,
+            downloaded_files,
+            asset,
+            previews,
+            fs.is_file(asset["asset_path"] + os.sep + "extra-data.txt"),
+        )
+
+    engine.stop()
+    return report_image_results(database, engine.results)
+
+
+class DownloadRecorder:
+    """
+    Collects finished downloads outside of the main thread, in place of the database.
+    Collected downloads are saved by the main thread with save().
+    """
+
+    def __init__(self):
+        self.downloaded_files = []
+
+    def set_downloaded_file(self, file_path, url, size, etag, last_modified=None):
+        self.downloaded_files.append((file_path, url, size, etag, last_modified))
+
+    def save(self, database) -> None:
+        """
+        :param CommonDatabaseAccess database: reference to the database
+        """
+        for downloaded_file in self.downloaded_files:
+            database.set_downloaded_file(*downloaded_file)
+
+
+def set_asset_paths(asset) -> None:
+    """
+        Adds type_path, category_path and asset_path to the asset data
+    :param dict asset: asset data with type_name, category_name and name
+    """
+    asset["type_path"] = (
+        global_data["local_path"] + os.sep + correct_type_name(asset["type_name"])
+    )
+    asset["category_path"] = asset["type_path"] + os.sep + asset["category_name"]
+    asset["asset_path"] = asset["category_path"] + os.sep + asset["name"]
+
+
+def process_asset_events(events, downloaded_files) -> {}:
+    """
+        Updates folders of changed assets while online data is processed. Runs in worker thread,
+        takes change events from the queue until None, without using the database.
+        Recategorized asset folder is moved, missing folder is created and new images are downloaded.
+    :param queue.Queue events: change events from substance_material_list_scraper.asset_change_events
+    :param dict downloaded_files: records of completely downloaded files by file path
+    :return: counts of created, moved and failed folders, download results and DownloadRecorder with downloads to save
+    """
+    recorder = DownloadRecorder()
+    processed = {
+        "created": 0,
+        "moved": 0,
+        "failed": 0,
+        "results": [],
+        "recorder": recorder,
+    }
+    engine = DownloadEngine(
+        workers=global_data["download_workers"],
+        per_host=global_data["download_per_host"],
+        show_progress=False,
+    )
+    with engine:
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            asset = event["asset"]
+            set_asset_paths(asset)
+            try:
+                if event["old_category_name"] is not None:
+                    old_path = (
+                        asset["type_path"]
+                        + os.sep
+                        + event["old_category_name"]
+                        + os.sep
+                        + asset["name"]
                     )
-                    for ap in asset_previews:
-                        preview = database.get_preview_by_preview_id(ap["preview_id"])[
-                            0
-                        ]
-                        if preview["preview_id"] == asset["thumbnail_id"]:
-                            if (
-                                "preview_original_id" not in extra_data
-                                or extra_data["preview_original_id"]
-                                != preview["original_id"]
-                            ):
-                                check_for_download(
-                                    preview["url"],
-                                    local_path + os.sep + "Preview.png",
-                                    True,
-                                )
-                                extra_data["preview_original_id"] = preview[
-                                    "original_id"
-                                ]
-                                f_icon.create_icon(local_path + os.sep + "Preview.png")
-                        else:
-                            if (
-                                preview["preview_id"]
-                                not in extra_data["preview_details"]
-                                and preview["preview_id"]
-                                not in extra_data["preview_variant"]
-                            ):
-                                is_far = (
-                                    len(
-                                        database.get_preview_preview_tag_by_preview_id_and_preview_tag_id(
-                                            preview["preview_id"], far_tag_id
-                                        )
-                                    )
-                                    > 0
-                                )
-                                if is_far:
-                                    details_count = len(extra_data["preview_details"])
-                                    check_for_download(
-                                        preview["url"],
-                                        local_path
-                                        + os.sep
-                                        + f"Details{'' if details_count == 0 else str(details_count)}.png",
-                                        True,
-                                    )
-                                    extra_data["preview_details"].append(
-                                        preview["original_id"]
-                                    )
-                                else:
-                                    variant_count = len(extra_data["preview_variant"])
-                                    check_for_download(
-                                        preview["url"],
-                                        local_path
-                                        + os.sep
-                                        + f"Variant{str(variant_count + 1)}.png",
-                                        True,
-                                    )
-                                    extra_data["preview_variant"].append(
-                                        preview["original_id"]
-                                    )
-                    if asset["extra_data_author"]:
-                        extra_data["extra_data"]["author"] = asset["extra_data_author"]
-                    if asset["extra_data_physical_size"]:
-                        extra_data["extra_data"]["physical_size"] = asset[
-                            "extra_data_physical_size"
-                        ]
-                    if asset["extra_data_type"]:
-                        extra_data["extra_data"]["type"] = asset["extra_data_type"]
-                    if asset["extra_data_style"]:
-                        extra_data["extra_data"]["style"] = asset["extra_data_style"]
-                    if asset["extra_data_quality"]:
-                        extra_data["extra_data"]["quality"] = asset[
-                            "extra_data_quality"
-                        ]
-                    if asset["extra_data_meshes"]:
-                        extra_data["extra_data"]["meshes"] = asset["extra_data_meshes"]
-                    if asset["extra_data_counters_quads"]:
-                        extra_data["extra_data"]["quads"] = asset[
-                            "extra_data_counters_quads"
-                        ]
-                    if asset["extra_data_substance_resolution"]:
-                        extra_data["extra_data"]["substance_resolution"] = asset[
-                            "extra_data_substance_resolution"
-                        ]
-                    if asset["extra_data_preview_disp"]:
-                        extra_data["extra_data"]["preview_displacement"] = asset[
-                            "extra_data_preview_disp"
-                        ]
-                    with open(extra_data_path, "w") as outfile:
-                        json.dump(extra_data, outfile, indent=4, sort_keys=True)
-
-    input("Press any enter to close...")
+                    if os.path.isdir(old_path) and not os.path.isdir(
+                        asset["asset_path"]
+                    ):
+                        os.makedirs(asset["category_path"], exist_ok=True)
+                        os.rename(old_path, asset["asset_path"])
+                        processed["moved"] += 1
+                if not os.path.isdir(asset["asset_path"]):
+                    os.makedirs(asset["asset_path"])
+                    processed["created"] += 1
+                queue_asset_images(
+                    recorder,
+                    engine,
+                    downloaded_files,
+                    asset,
+                    event["previews"],
+                    os.path.isfile(asset["asset_path"] + os.sep + "extra-data.txt"),
+                )
+            except (OSError, ValueError) as _e:
+                processed["failed"] += 1
+                console.print(f"[red]Failed to update {asset['asset_path']} -- {_e}")
+    processed["results"] = engine.results
+    return processed
+
+
+def finish_asset_events(database, processed) -> int:
+    """
+        Saves downloads made by process_asset_events, creates icons and prints summary
+    :param CommonDatabaseAccess database: reference to the database
+    :param dict processed: result of process_asset_events
+    :return: number of failed images and icons
+    """
+    processed["recorder"].save(database)
+    console.print("Created folders - " + str(processed["created"]))
+    console.print("Moved folders - " + str(processed["moved"]))
+    console.print("Failed folders - " + str(processed["failed"]))
+    return processed["failed"] + report_image_results(database, processed["results"])
 
 
 def create_folder_for_type(database, asset_types) -> None:
@@ -852,66 +1293,29 @@ def create_folder_for_type(database, asset_types) -> None:
     :param CommonDatabaseAccess database: reference to the database
     :param [] asset_types: given asset types
     """
+    fs = get_filesystem_index()
     # 1. create _source folder for files to move to their location
-    if not os.path.exists(
-        global_data["local_path"] + os.sep + global_data["source_path"]
-    ):
+    if not fs.is_dir(global_data["local_path"] + os.sep + global_data["source_path"]):
         os.makedirs(global_data["local_path"] + os.sep + global_data["source_path"])
+        fs.add_dir(global_data["local_path"] + os.sep + global_data["source_path"])
     # 2. Now creating rest of the folders
     console.print("Creating folders ...")
-    for a in asset_types:  # track(asset_types, description="Types."):
-        all_type_assets = database.get_all_assets_revisions_by_type_id(a["type_id"])
-        if not os.path.exists(
+    for a in asset_types:
+        if not fs.is_dir(
             global_data["local_path"] + os.sep + correct_type_name(a["name"])
         ):
             os.makedirs(
                 global_data["local_path"] + os.sep + correct_type_name(a["name"])
             )
-        console.print()
-        for asset in track(
-            all_type_assets,
-            description=f"Assets for type {correct_type_name(a['name'])}",
-            total=len(all_type_assets),
-        ):
-            c = database.get_category_by_id(
-                database.get_asset_category_by_asset_id(asset["asset_id"])[0][
-                    "category_id"
-                ]
-            )[0]
-            if not os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-            ):
-                os.makedirs(
-                    global_data["local_path"]
-                    + os.sep
-                    + correct_type_name(a["name"])
-                    + os.sep
-                    + c["name"]
-                )
-            if not os.path.exists(
-                global_data["local_path"]
-                + os.sep
-                + correct_type_name(a["name"])
-                + os.sep
-                + c["name"]
-                + os.sep
-                + asset["name"]
-            ):
-                os.makedirs(
-                    global_data["local_path"]
-                    + os.sep
-                    + correct_type_name(a["name"])
-                    + os.sep
-                    + c["name"]
-                    + os.sep
-                    + asset["name"]
-                )
+            fs.add_dir(
+                global_data["local_path"] + os.sep + correct_type_name(a["name"])
+            )
+    for asset in track_type_assets(database, asset_types):
+        if not fs.is_dir(asset["asset_path"]):
+            os.makedirs(asset["asset_path"])
+            fs.add_dir(asset["asset_path"])
+    fs.save_cache()
     console.print()
-    input("Press any enter to close...")
 
 
 def create_folders(database) -> None:
@@ -944,12 +1348,25 @@ def create_folders(database) -> None:
             menu_sel = int(user_input)
             if 1 <= menu_sel < count - 1:  # Specific asset type
                 create_folder_for_type(database, [all_asset_types[menu_sel - 1]])
+                database.print_sql_stats(console, menu_items[menu_sel - 1])
+                input("Press any enter to close...")
             elif menu_sel == count - 1:  # all asset types
                 create_folder_for_type(database, all_asset_types)
+                database.print_sql_stats(console, menu_items[menu_sel - 1])
+                input("Press any enter to close...")
             elif menu_sel == count:  # Quit
                 menu_exit = True
 
 
+def new_sql_stats():
+    """
+    :return: SqlStats for the database, if statistics are enabled, otherwise None
+    """
+    if global_data["sql_stats"] > 0:
+        return SqlStats(global_data["sql_stats"])
+    return None
+
+
 def main_menu(database) -> None:
     """
     Draw main menu
@@ -967,7 +1384,9 @@ def main_menu(database) -> None:
         "[8] Generate existing folder report. (Do this after Marking database with my files).",
         "[9] Fancy list generation. (Convert simple material list to list with format and links, looks for Requests.txt).",
         "[10] Move folders if Category changed.",
-        "[11] Quit.",
+        "[11] Plan folder moves if Category changed. (Writes AssetCategoryChangePlan.txt, nothing is moved).",
+        "[12] Mark database with my files and verify their content. (First run reads all files, later only changed ones).",
+        "[13] Quit.",
     ]
     menu_exit = False
     while not menu_exit:
@@ -1000,14 +1419,96 @@ def main_menu(database) -> None:
                 fancy_list_generation(database)
             if menu_sel == 10:  # Move folders to new category
                 move_folders_to_new_category(database)
-            if menu_sel == 11:  # Quit
+            if menu_sel == 11:  # Plan folder moves to new category
+                move_folders_to_new_category(database, True)
+            if menu_sel == 12:  # Mark database with my files and verify content
+                mark_database_with_my_files(database, True)
+            if menu_sel == 13:  # Quit
                 menu_exit = True
+            elif (
+                2 <= menu_sel <= 12
+            ):  # actions do not wait, so their results stay visible
+                database.print_sql_stats(console, menu_items[menu_sel - 1])
+                input("Press any enter to close...")
 
 
 def main() -> None:
     """
     Check location of the database and then going to main menu
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--storage",
+        choices=STORAGE_MODES,
+        default=STORAGE_FILE,
+        help="Work directly on the database file, or on in-memory copy saved every backup interval. "
+        "Use memory mode when database is on the network share. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--backup-interval",
+        type=int,
+        default=300,
+        help="Seconds between saves of the in-memory database to the file. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-w",
+        "--download-workers",
+        type=int,
+        default=global_data["download_workers"],
+        help="Maximum number of parallel image downloads. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--download-per-host",
+        type=int,
+        default=global_data["download_per_host"],
+        help="Maximum number of parallel image downloads from one server. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-r",
+        "--refresh-images",
+        action="store_true",
+        help="Check already downloaded images for changes on the server.",
+    )
+    parser.add_argument(
+        "--hash-workers",
+        type=int,
+        default=global_data["hash_workers"],
+        help="Number of processes hashing local files. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--transfer-workers",
+        type=int,
+        default=global_data["transfer_workers"],
+        help="Number of parallel file moves when placing local files. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--icon-workers",
+        type=int,
+        default=global_data["icon_workers"],
+        help="Number of processes creating folder icons. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--cdn-url",
+        help="Download images from this server instead of the one in the online data, keeping their paths.",
+    )
+    parser.add_argument(
+        "--sql-stats",
+        type=int,
+        default=global_data["sql_stats"],
+        help="Print this many SQL statements with the longest total time after every action, "
+        "0 for no statistics. (Default is %(default)s",
+    )
+    args = parser.parse_args()
+    global_data["sql_stats"] = max(0, args.sql_stats)
+    global_data["cdn_url"] = args.cdn_url
+    global_data["icon_workers"] = max(1, args.icon_workers)
+    global_data["transfer_workers"] = max(1, args.transfer_workers)
+    global_data["hash_workers"] = max(1, args.hash_workers)
+    global_data["refresh_images"] = args.refresh_images
+    global_data["download_workers"] = max(1, args.download_workers)
+    global_data["download_per_host"] = max(1, args.download_per_host)
+
     menu_title = " Select database file"
     menu_items = []
     menu_items_count = 0
@@ -1035,9 +1536,14 @@ def main() -> None:
         input("Press any enter to close...")
     elif menu_items_count == 1:
         database = CommonDatabaseAccess(
-            db_path=local_path + os.sep + menu_items_references[0], force=False
+            db_path=local_path + os.sep + menu_items_references[0],
+            force=False,
+            storage_mode=args.storage,
+            backup_interval=args.backup_interval,
+            sql_stats=new_sql_stats(),
         )
         main_menu(database)
+        database.close()
     else:
         menu_exit = False
         while not menu_exit:
@@ -1056,8 +1562,12 @@ def main() -> None:
                         + os.sep
                         + menu_items_references[menu_sel - 1],
                         force=False,
+                        storage_mode=args.storage,
+                        backup_interval=args.backup_interval,
+                        sql_stats=new_sql_stats(),
                     )
                     main_menu(database)
+                    database.close()
                     menu_exit = True
 
 
@@ -0,0 +1,338 @@
+"""Measuring processing of online data, database queries and asset processor actions on generated catalog"""
+import os
+import argparse
+import json
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from rich import pretty
+from rich.console import Console
+from rich.traceback import install
+
+from common_catalog_generator import generate_online_data, make_png
+from common_database_access import CommonDatabaseAccess
+import substance_material_list_scraper as scraper
+import substance_material_list_asset_processor as processor
+
+console = Console()
+pretty.install()
+install()  # this is for tracing project activity
+global_data = {
+    "version": "Beta 1 (17.10.2026)\n",
+}
+SECTIONS = ["ingest", "queries", "actions"]
+
+
+def measure(timings, name, function, *args):
+    """
+    Runs function and records its duration
+    :param dict timings: durations in seconds by name
+    :param str name: name of the measurement
+    :param function: measured function
+    :return: result of the function
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    timings[name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def prepare_library_files(database, library_path, files) -> None:
+    """
+    Adds asset files for the transfer to the _source folder and preview images to the asset folders
+    :param CommonDatabaseAccess database: reference to the database
+    :param str library_path: library folder
+    :param int files: number of asset files and previews
+    """
+    source_path = library_path + os.sep + "_source"
+    png = make_png()
+    destinations = database.get_revision_destinations()
+    for filename in list(destinations)[:files]:
+        destination = destinations[filename]
+        if destination["type_name"] is None:
+            continue
+        size = max(revision["size"] for revision in destination["revisions"])
+        with open(source_path + os.sep + filename, "wb") as f:
+            f.truncate(size)
+        asset_path = (
+            library_path
+            + os.sep
+            + processor.correct_type_name(destination["type_name"])
+            + os.sep
+            + destination["category_name"]
+            + os.sep
+            + destination["asset_name"]
+        )
+        if os.path.isdir(asset_path):
+            with open(asset_path + os.sep + "Preview.png", "wb") as f:
+                f.write(png)
+
+
+def run_benchmark(work_path, args) -> {}:
+    """
+    Generates catalog in the work folder and measures selected sections
+    :param str work_path: empty work folder, used as library folder
+    :param args: command line arguments
+    :return: durations in seconds by measurement name
+    """
+    timings = {}
+    data_path = work_path + os.sep + "all_assets_raw.txt"
+    scraper.global_data["local_path"] = work_path
+    scraper.global_data["data_path"] = data_path
+    processor.global_data["local_path"] = work_path
+    processor.global_data["source_path"] = "_source"
+    measure(
+        timings,
+        "generate",
+        generate_online_data,
+        data_path,
+        args.assets,
+        args.previews,
+        args.tags,
+        args.revisions,
+        args.seed,
+    )
+    database = CommonDatabaseAccess(
+        db_path=work_path + os.sep + "benchmark.db", force=True
+    )
+    measure(timings, "ingest", scraper.process_online_data, database)
+    if "ingest" in args.sections:
+        # second run finds every asset unchanged
+        measure(timings, "ingest_unchanged", scraper.process_online_data, database)
+
+    if "queries" in args.sections:
+        measure(
+            timings,
+            "query_latest_assets_with_category",
+            lambda: sum(1 for _ in database.get_latest_assets_with_category()),
+        )
+        measure(
+            timings,
+            "query_latest_assets_count_by_type",
+            database.get_latest_assets_count_by_type,
+        )
+        measure(
+            timings, "query_revision_destinations", database.get_revision_destinations
+        )
+        measure(
+            timings, "query_asset_fingerprints", database.get_all_asset_fingerprints
+        )
+        measure(timings, "query_catalog_signature", database.get_catalog_signature)
+        measure(
+            timings,
+            "query_asset_revision_by_original_id",
+            lambda: [
+                database.get_latest_asset_revision_by_original_id(f"asset-{index}")
+                for index in range(0, args.assets, max(1, args.assets // 1000))
+            ],
+        )
+
+    if "actions" in args.sections:
+        measure(
+            timings,
+            "action_create_folders",
+            processor.create_folder_for_type,
+            database,
+            database.get_all_types(),
+        )
+        prepare_library_files(database, work_path, args.files)
+        measure(
+            timings,
+            "action_transfer_files",
+            processor.transfer_all_local_files,
+            database,
+        )
+        measure(timings, "action_make_icons", processor.make_all_icons, database)
+        measure(
+            timings,
+            "action_make_icons_unchanged",
+            processor.make_all_icons,
+            database,
+            False,
+        )
+        measure(
+            timings,
+            "action_mark_files",
+            processor.mark_database_with_my_files,
+            database,
+        )
+        measure(
+            timings,
+            "action_mark_and_verify_files",
+            processor.mark_database_with_my_files,
+            database,
+            True,
+        )
+        measure(
+            timings,
+            "action_plan_category_moves",
+            processor.move_folders_to_new_category,
+            database,
+            True,
+        )
+        measure(
+            timings,
+            "action_folder_report",
+            processor.generate_folder_report,
+            database,
+        )
+        measure(
+            timings,
+            "action_detail_report",
+            processor.generate_detail_report,
+            database,
+        )
+    database.close()
+    return timings
+
+
+def load_history(history_path) -> []:
+    """
+    :param str history_path: path of the history file
+    :return: saved benchmark runs, empty if there is no history yet
+    """
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_comparison(run, previous) -> None:
+    """
+    Prints durations of the run next to the previous run with same parameters
+    :param dict run: current benchmark run
+    :param dict previous: previous benchmark run or None
+    """
+    console.print()
+    if previous is not None:
+        console.print(
+            f"Compared with run from {previous['started_at']} ({previous['label']})"
+        )
+    for name, seconds in run["timings"].items():
+        line = f"{name:<40} {seconds:>10.4f} s"
+        if previous is not None and name in previous["timings"]:
+            before = previous["timings"][name]
+            line += f" {before:>10.4f} s"
+            if before > 0:
+                change = (seconds - before) / before * 100
+                color = "red" if change > 10 else "green" if change < -10 else "white"
+                line += f" [{color}]{change:+7.1f} %"
+        console.print(line)
+
+
+def main() -> None:
+    """
+    Runs benchmark with generated catalog, saves it to the history and compares it with the previous run
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-a",
+        "--assets",
+        type=int,
+        default=1000,
+        help="Number of generated assets. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--previews",
+        type=int,
+        default=3,
+        help="Preview attachments per asset. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--tags",
+        type=int,
+        default=5,
+        help="Tags per asset. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--revisions",
+        type=int,
+        default=2,
+        help="Revisions of the downloadable file per asset. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=100,
+        help="Number of asset files and previews put into the library for actions. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed of the catalog generator. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--sections",
+        nargs="+",
+        choices=SECTIONS,
+        default=SECTIONS,
+        help="Parts to measure, processing of online data is always measured. (Default is all",
+    )
+    parser.add_argument(
+        "--history",
+        default="benchmark-history.json",
+        help="File with results of all runs. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-l",
+        "--label",
+        default="",
+        help="Description of the run, saved in the history.",
+    )
+    parser.add_argument(
+        "--work",
+        help="Folder for the generated library, temporary folder removed after the run if not given.",
+    )
+    args = parser.parse_args()
+    args.assets = max(1, args.assets)
+    args.previews = max(1, args.previews)
+
+    console.print("version " + global_data["version"])
+    work_path = args.work
+    if work_path is None:
+        work_path = tempfile.mkdtemp(prefix="substance-benchmark-")
+    else:
+        work_path = os.path.abspath(work_path)
+        os.makedirs(work_path, exist_ok=True)
+    try:
+        timings = run_benchmark(work_path, args)
+    finally:
+        if args.work is None:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    run = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "parameters": {
+            "assets": args.assets,
+            "previews": args.previews,
+            "tags": args.tags,
+            "revisions": args.revisions,
+            "files": args.files,
+            "seed": args.seed,
+        },
+        "system": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "processors": os.cpu_count(),
+        },
+        "timings": timings,
+    }
+    history = load_history(args.history)
+    previous = None
+    for old_run in reversed(history):
+        if old_run["parameters"] == run["parameters"]:
+            previous = old_run
+            break
+    print_comparison(run, previous)
+    history.append(run)
+    with open(args.history, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
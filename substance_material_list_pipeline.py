@@ -0,0 +1,417 @@
+"""Running scraping and asset processing without menus, as a chain of stages which skips stages with unchanged inputs"""
+import os
+import sys
+import argparse
+import hashlib
+import queue
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from rich import pretty
+from rich.console import Console
+from rich.traceback import install
+
+from common_database_access import CommonDatabaseAccess, STORAGE_FILE, STORAGE_MODES
+from common_sql_stats import SqlStats
+import substance_material_list_scraper as scraper
+import substance_material_list_asset_processor as processor
+
+console = Console()
+pretty.install()
+install()  # this is for tracing project activity
+global_data = {
+    "version": "Beta 1 (17.10.2026)\n",
+    "scrape_hours": 20,
+    "stream_assets": True,
+}
+STATE_PREFIX = "pipeline_"  # scrape_state key prefix of the stage inputs from the last successful run
+# files of the asset folders which do not take part in marking database with my files
+NOT_ASSET_FILE_EXTENSIONS = (".png", ".jpg", ".ico", ".ini", ".txt", ".json", ".part")
+
+
+def digest(*parts) -> str:
+    """
+    :param parts: texts describing stage inputs
+    :return: hash of all parts
+    """
+    result = hashlib.sha256()
+    for part in parts:
+        result.update(str(part).encode("utf-8"))
+        result.update(b"\0")
+    return result.hexdigest()
+
+
+def catalog_signature(database) -> str:
+    """
+    :param CommonDatabaseAccess database: reference to the database
+    :return: hash of the catalog summary and fingerprints of all assets
+    """
+    fingerprints = database.get_all_asset_fingerprints()
+    return digest(
+        database.get_catalog_signature(),
+        *(f"{key}={fingerprints[key]}" for key in sorted(fingerprints)),
+    )
+
+
+def library_signature(include=None) -> str:
+    """
+    Hash of names, sizes and modification times of the files in the library folders.
+    Files in the library root (database, reports) are left out.
+    :param include: function which gets file name and returns True for files to include, None for all files
+    :return: hash of the library files
+    """
+    fs = processor.get_filesystem_index()
+    parts = []
+    for file_path in fs.iter_files(include_root=False):
+        if include is None or include(os.path.basename(file_path)):
+            file_stat = fs.file_stat(file_path)
+            if file_stat is not None:
+                parts.append(f"{file_path}={file_stat[0]}:{file_stat[1]}")
+    return digest(*parts)
+
+
+def is_asset_file(name) -> bool:
+    return not name.lower().endswith(NOT_ASSET_FILE_EXTENSIONS)
+
+
+def is_image_file(name) -> bool:
+    return name.lower().endswith((".png", ".jpg")) or name == "extra-data.txt"
+
+
+def is_icon_file(name) -> bool:
+    return name in ("Preview.png", "Preview.ico")
+
+
+def scrape_inputs(database) -> str:
+    # online data has no local inputs, scrape runs once per scrape interval
+    return str(int(time.time() // (global_data["scrape_hours"] * 3600)))
+
+
+def run_scrape(database) -> bool:
+    scraper.scrap_online_data(database)
+    return True
+
+
+def ingest_inputs(database) -> str:
+    data_path = scraper.global_data["data_path"]
+    if not os.path.exists(data_path):
+        return None
+    data_stats = os.stat(data_path)
+    return digest(data_path, data_stats.st_size, data_stats.st_mtime_ns)
+
+
+def run_ingest(database) -> bool:
+    """
+    Processes online data. When streaming, changed assets get their folders and images in worker thread
+    while ingest is still running, and folders and images stages stay up to date, if they were before ingest.
+    """
+    if not global_data["stream_assets"]:
+        scraper.process_online_data(database)
+        return True
+    up_to_date = [
+        name
+        for name in ("folders", "images")
+        if database.get_scrape_state(STATE_PREFIX + name)
+        == STAGES[name]["inputs"](database)
+    ]
+    downloaded_files = {
+        record["file_path"]: record for record in database.get_all_downloaded_files()
+    }
+    events = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        worker = executor.submit(
+            processor.process_asset_events, events, downloaded_files
+        )
+        try:
+            scraper.process_online_data(database, events.put)
+        finally:
+            events.put(None)
+        processed = worker.result()
+    if processor.finish_asset_events(database, processed) == 0:
+        for name in up_to_date:
+            database.set_scrape_state(
+                STATE_PREFIX + name, STAGES[name]["inputs"](database)
+            )
+    return True
+
+
+def folders_inputs(database) -> str:
+    return digest(
+        catalog_signature(database), *processor.get_filesystem_index().iter_dirs()
+    )
+
+
+def run_folders(database) -> bool:
+    processor.create_folder_for_type(database, database.get_all_types())
+    return True
+
+
+def images_inputs(database) -> str:
+    return digest(catalog_signature(database), library_signature(is_image_file))
+
+
+def run_images(database) -> bool:
+    return processor.download_all_images(database) == 0
+
+
+def icons_inputs(database) -> str:
+    return library_signature(is_icon_file)
+
+
+def run_icons(database) -> bool:
+    return processor.make_all_icons(database, False) == 0
+
+
+def mark_inputs(database) -> str:
+    return digest(catalog_signature(database), library_signature(is_asset_file))
+
+
+def run_mark(database) -> bool:
+    processor.mark_database_with_my_files(database)
+    return True
+
+
+def run_reports(database) -> bool:
+    processor.generate_folder_report(database)
+    processor.generate_detail_report(database)
+    return True
+
+
+# stages with the stages they depend on, function returning signature of their inputs and function running them
+STAGES = {
+    "scrape": {"after": [], "inputs": scrape_inputs, "run": run_scrape},
+    "ingest": {"after": ["scrape"], "inputs": ingest_inputs, "run": run_ingest},
+    "folders": {"after": ["ingest"], "inputs": folders_inputs, "run": run_folders},
+    "images": {"after": ["folders"], "inputs": images_inputs, "run": run_images},
+    "icons": {"after": ["images"], "inputs": icons_inputs, "run": run_icons},
+    "mark": {"after": ["folders"], "inputs": mark_inputs, "run": run_mark},
+    "reports": {"after": ["mark"], "inputs": mark_inputs, "run": run_reports},
+}
+
+
+def stage_order(selected) -> []:
+    """
+    Orders stages so every stage comes after the stages it depends on
+    :param [] selected: names of the stages to run
+    :return: names of the selected stages in running order
+    """
+    order = []
+
+    def visit(name):
+        if name in order:
+            return
+        for dependency in STAGES[name]["after"]:
+            visit(dependency)
+        order.append(name)
+
+    for name in STAGES:
+        visit(name)
+    return [name for name in order if name in selected]
+
+
+def depends_on(name, others) -> bool:
+    """
+    :param str name: name of the stage
+    :param set others: names of the other stages
+    :return: True if stage depends directly or through other stages on any of the others
+    """
+    return any(
+        dependency in others or depends_on(dependency, others)
+        for dependency in STAGES[name]["after"]
+    )
+
+
+def run_pipeline(database, selected, forced) -> {}:
+    """
+    Runs selected stages in dependency order. Stage is skipped when its inputs are the same as after its last
+    successful run. Stages after failed stage are not run.
+    Inputs are stored after the run, so changes made by the stage itself (new icons) do not trigger it next time.
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] selected: names of the stages to run
+    :param [] forced: names of the stages to run even with unchanged inputs
+    :return: status and duration of every selected stage
+    """
+    results = {}
+    failed = set()
+    for name in stage_order(selected):
+        stage = STAGES[name]
+        start = time.monotonic()
+        if depends_on(name, failed):
+            results[name] = {"status": "blocked", "duration": 0}
+            failed.add(name)
+            continue
+        inputs = stage["inputs"](database)
+        if inputs is None:
+            results[name] = {"status": "no input", "duration": 0}
+            continue
+        state_key = STATE_PREFIX + name
+        if name not in forced and database.get_scrape_state(state_key) == inputs:
+            results[name] = {"status": "unchanged", "duration": 0}
+            continue
+        console.rule(f"Stage {name}")
+        try:
+            complete = stage["run"](database)
+        except Exception:
+            console.print_exception()
+            results[name] = {"status": "failed", "duration": time.monotonic() - start}
+            failed.add(name)
+            continue
+        if complete:
+            database.set_scrape_state(state_key, stage["inputs"](database))
+        results[name] = {
+            "status": "done" if complete else "incomplete",
+            "duration": time.monotonic() - start,
+        }
+        database.print_sql_stats(console, f"Stage {name}")
+    return results
+
+
+def main() -> None:
+    """
+    Reads options, runs the pipeline and prints stage summary. Exit code is 1 if any stage failed.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--database",
+        default="all_assets.db",
+        help="Path to the SQLite file. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-l",
+        "--library",
+        help="Asset library folder. (Default is folder of the database",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=list(STAGES),
+        default=list(STAGES),
+        help="Stages to run, in any order. (Default is all stages",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        nargs="+",
+        choices=list(STAGES),
+        default=[],
+        help="Stages to run even when their inputs are unchanged.",
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Do not update folders and images of changed assets during ingest, only in their own stages.",
+    )
+    parser.add_argument(
+        "--scrape-hours",
+        type=int,
+        default=global_data["scrape_hours"],
+        help="Hours before online data is scraped again. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-s",
+        "--storage",
+        choices=STORAGE_MODES,
+        default=STORAGE_FILE,
+        help="Work directly on the database file, or on in-memory copy saved every backup interval. "
+        "Use memory mode when database is on the network share. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--backup-interval",
+        type=int,
+        default=300,
+        help="Seconds between saves of the in-memory database to the file. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-m",
+        "--scrape-mode",
+        choices=scraper.SCRAPE_MODES,
+        default=scraper.global_data["scrape_mode"],
+        help="Scrape mode, same as in the scraper. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--full-scrape-days",
+        type=int,
+        default=scraper.global_data["full_scrape_days"],
+        help="Days between forced full scrapes in auto scrape mode. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=scraper.global_data["concurrency"],
+        help="Maximum number of parallel requests while scraping online data. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--api-url",
+        default=scraper.API_URL,
+        help="GraphQL API url, for example of the local stub server. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--cdn-url",
+        help="Download images from this server instead of the one in the online data, keeping their paths.",
+    )
+    parser.add_argument(
+        "-w",
+        "--download-workers",
+        type=int,
+        default=processor.global_data["download_workers"],
+        help="Maximum number of parallel image downloads. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-r",
+        "--refresh-images",
+        action="store_true",
+        help="Check already downloaded images for changes on the server, forces images stage.",
+    )
+    parser.add_argument(
+        "--sql-stats",
+        type=int,
+        default=0,
+        help="Print this many SQL statements with the longest total time after every stage, "
+        "0 for no statistics. (Default is %(default)s",
+    )
+    args = parser.parse_args()
+    global_data["scrape_hours"] = max(1, args.scrape_hours)
+    global_data["stream_assets"] = (
+        not args.no_stream and "folders" in args.stages and "images" in args.stages
+    )
+    library_path = os.path.abspath(
+        args.library or os.path.dirname(os.path.abspath(args.database))
+    )
+    scraper.global_data["local_path"] = library_path
+    scraper.global_data["data_path"] = library_path + os.sep + "all_assets_raw.txt"
+    scraper.global_data["scrape_mode"] = args.scrape_mode
+    scraper.global_data["full_scrape_days"] = max(1, args.full_scrape_days)
+    scraper.global_data["concurrency"] = max(1, args.concurrency)
+    scraper.global_data["api_url"] = args.api_url
+    processor.global_data["cdn_url"] = args.cdn_url
+    processor.global_data["local_path"] = library_path
+    processor.global_data["source_path"] = "_source"
+    processor.global_data["download_workers"] = max(1, args.download_workers)
+    processor.global_data["refresh_images"] = args.refresh_images
+    forced = set(args.force)
+    if args.refresh_images:
+        forced.add("images")
+
+    console.print("version " + global_data["version"])
+    database = CommonDatabaseAccess(
+        db_path=args.database,
+        force=True,
+        storage_mode=args.storage,
+        backup_interval=args.backup_interval,
+        sql_stats=SqlStats(args.sql_stats) if args.sql_stats > 0 else None,
+    )
+    results = run_pipeline(database, args.stages, forced)
+    database.close()
+
+    console.print()
+    for name, result in results.items():
+        console.print(f"{name:<8} {result['status']:<10} {result['duration']:.1f} s")
+    if any(result["status"] in ("failed", "blocked") for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,16 @@ import os
 import sys
 import argparse
 
+import hashlib
+import itertools
 import json
+import math
 import requests
+import requests.adapters
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from os import path
@@ -16,13 +23,42 @@ from rich.console import Console
 from rich.traceback import install
 from rich.progress import track
 
-from common_database_access import CommonDatabaseAccess
+from common_database_access import (
+    CommonDatabaseAccess,
+    STORAGE_FILE,
+    STORAGE_MEMORY,
+    STORAGE_MODES,
+)
+from common_lookup_cache import KeyedLookup, LinkLookup
+from common_sql_stats import SqlStats
 
 
 console = Console()
 pretty.install()
 install()  # this is for tracing project activity
-global_data = {"version": "Beta 1 (08.09.2022)\n"}
+global_data = {
+    "version": "Beta 1 (08.09.2022)\n",
+    "batch_size": 500,
+    "concurrency": 4,
+    "scrape_mode": "auto",
+    "full_scrape_days": 7,
+    "api_url": None,
+    "sql_stats": 0,
+}
+SCRAPE_FULL = "full"
+SCRAPE_INCREMENTAL = "incremental"
+SCRAPE_AUTO = "auto"
+SCRAPE_MODES = [SCRAPE_AUTO, SCRAPE_FULL, SCRAPE_INCREMENTAL]
+SCRAPE_HEADER = "__scrape__"  # first line of the saved online data, with scrape details
+# kinds of asset changes sent to the asset processor during processing of online data
+ASSET_NEW = "new"
+ASSET_UPDATED = "updated"
+ASSET_RECATEGORIZED = "recategorized"
+ASSET_NEW_PREVIEW = "new_preview"
+API_URL = "https://source-api.substance3d.com/beta/graphql"
+API_ORIGIN = "https://substance3d.adobe.com"
+PAGE_LIMIT = 100  # same as $limit in the ASSETS_QUERY
+ASSETS_QUERY = "query Assets($page: Int = 0, $limit: Int = 100, $search: String, $filters: AssetFilters, $sortDir: SortDir = desc, $sort: AssetSort = byPublicationDate) {\n  assets(search: $search, filters: $filters, sort: $sort, sortDir: $sortDir, page: $page, limit: $limit) {\n    total\n    hasMore\n    items {\n      ...AssetAttachmentsFragment\n      __typename\n    }\n    __typename\n  }\n}\n\nfragment AssetAttachmentsFragment on Asset {\n  ...AssetFragment\n  attachments {\n    id\n    tags\n    label\n    ... on PreviewAttachment {\n      kind\n      url\n      __typename\n    }\n    ... on DownloadAttachment {\n      url\n      revisions {\n        filename\n        size\n        revision\n        createdAt\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment AssetFragment on Asset {\n  id\n  title\n  tags\n  type\n  status\n  categories\n  cost\n  new\n  free\n  licenses\n  downloadsRecentlyUpdated\n  extraData {\n    key\n    value\n    __typename\n  }\n  thumbnail {\n    id\n    url\n    tags\n    __typename\n  }\n  createdAt\n  __typename\n}\n"
 
 
 def get_duration(then, now=datetime.now(), interval="default"):
@@ -99,531 +135,848 @@ def clear_console():
     os.system(command)
 
 
-def scrap_online_data():
+class RateLimiter:
+    """Adaptive delay between requests, shared by all fetching threads"""
+
+    def __init__(self, delay=0.1, min_delay=0.0, max_delay=30.0):
+        """
+        :param float delay: starting delay between requests in seconds
+        :param float min_delay: delay will not go below this value
+        :param float max_delay: delay will not go above this value
+        """
+        self.delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.next_request = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Blocks until this thread is allowed to send next request"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_request)
+            self.next_request = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def success(self) -> None:
+        """Server answered fine, slowly speeding up"""
+        with self.lock:
+            self.delay = max(self.min_delay, self.delay * 0.9)
+
+    def failure(self, retry_after=None) -> None:
+        """
+        Server is throttling or failing, backing off
+        :param str retry_after: value of the Retry-After header, if server sent it
+        """
+        with self.lock:
+            delay = max(self.delay * 2, 0.5)
+            if retry_after and retry_after.isnumeric():
+                delay = max(delay, float(retry_after))
+            self.delay = min(self.max_delay, delay)
+            self.next_request = max(self.next_request, time.monotonic() + self.delay)
+
+
+def create_session(pool_size) -> requests.Session:
     """
-    Access Substance material list webpage APK for all asset details.
+    HTTP session reusing connections between requests
+    :param int pool_size: number of connections kept open, should match number of threads using it
+    :return: session
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Origin": API_ORIGIN})
+    return session
+
+
+def fetch_assets_page(session, url, page, rate_limiter, retries=5) -> dict:
+    """
+    Downloads one page of the Assets query
+    :param requests.Session session: HTTP session
+    :param str url: GraphQL API url
+    :param int page: page number, starting from 0
+    :param RateLimiter rate_limiter: shared rate limiter
+    :param int retries: number of attempts for throttled or failed requests
+    :return: assets data with total, hasMore and items
+    """
+    payload = {
+        "operationName": "Assets",
+        "query": ASSETS_QUERY.replace("$page: Int = 0,", f"$page: Int = {page},"),
+    }
+    for attempt in range(retries):
+        rate_limiter.wait()
+        try:
+            r = session.post(url, data=payload, timeout=60)
+        except requests.RequestException:
+            if attempt == retries - 1:
+                raise
+            rate_limiter.failure()
+            continue
+        if (r.status_code == 429 or r.status_code >= 500) and attempt < retries - 1:
+            rate_limiter.failure(r.headers.get("Retry-After"))
+            continue
+        r.raise_for_status()
+        rate_limiter.success()
+        return json.loads(r.text)["data"]["assets"]
+
+
+def fetch_all_asset_pages(url, concurrency):
     """
-    items = []
+    Downloads all pages of the Assets query. First page tells total count,
+    the rest of the pages are downloaded in parallel, but returned in page order.
+    At most 2 * concurrency pages are downloaded ahead of the page which was returned last,
+    and pages still waiting are cancelled when the generator is closed or fails.
+    :param str url: GraphQL API url
+    :param int concurrency: maximum number of parallel requests
+    :return: generator of assets pages (total, hasMore, items)
+    """
+    session = create_session(concurrency)
+    rate_limiter = RateLimiter()
+    first_page = fetch_assets_page(session, url, 0, rate_limiter)
+    yield first_page
+    if not first_page["hasMore"]:
+        return
+    page_count = math.ceil(first_page["total"] / PAGE_LIMIT)
+    # only few pages are downloaded ahead, so the catalog is not kept in memory while it is written
+    window = deque()
+    pages = iter(range(1, page_count))
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for page in itertools.islice(pages, 2 * concurrency):
+            window.append(
+                executor.submit(fetch_assets_page, session, url, page, rate_limiter)
+            )
+        while len(window) > 0:
+            assets_page = window.popleft().result()
+            yield assets_page
+            if not assets_page["hasMore"]:
+                # catalog got smaller while we were downloading
+                break
+            page = next(pages, None)
+            if page is not None:
+                window.append(
+                    executor.submit(fetch_assets_page, session, url, page, rate_limiter)
+                )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_new_asset_pages(url, newest_created_at, last_seen_ids):
+    """
+    Downloads pages of the Assets query until it reaches already known assets.
+    Assets are sorted by publication date, newest first, so everything after known asset is known too.
+    Only new assets are picked up. Changes of already known assets (new file revisions, moves to other
+    category, new previews) are found only by full scrape, which auto mode runs every full_scrape_days.
+    :param str url: GraphQL API url
+    :param str newest_created_at: creation date of the newest processed asset
+    :param set last_seen_ids: IDs of the newest processed assets
+    :return: generator of assets pages (total, hasMore, items)
+    """
+    session = create_session(1)
+    rate_limiter = RateLimiter()
     page = 0
-    url = "https://source-api.substance3d.com/beta/graphql"
-    # 1. Downloading all elements from the API. 100 elements at a time.
     while True:
-        payload = {
-            "operationName": "Assets",
-            "query": "query Assets($page: Int = 0, $limit: Int = 100, $search: String, $filters: AssetFilters, $sortDir: SortDir = desc, $sort: AssetSort = byPublicationDate) {\n  assets(search: $search, filters: $filters, sort: $sort, sortDir: $sortDir, page: $page, limit: $limit) {\n    total\n    hasMore\n    items {\n      ...AssetAttachmentsFragment\n      __typename\n    }\n    __typename\n  }\n}\n\nfragment AssetAttachmentsFragment on Asset {\n  ...AssetFragment\n  attachments {\n    id\n    tags\n    label\n    ... on PreviewAttachment {\n      kind\n      url\n      __typename\n    }\n    ... on DownloadAttachment {\n      url\n      revisions {\n        filename\n        size\n        revision\n        createdAt\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment AssetFragment on Asset {\n  id\n  title\n  tags\n  type\n  status\n  categories\n  cost\n  new\n  free\n  licenses\n  downloadsRecentlyUpdated\n  extraData {\n    key\n    value\n    __typename\n  }\n  thumbnail {\n    id\n    url\n    tags\n    __typename\n  }\n  createdAt\n  __typename\n}\n",
-        }
-        q = payload["query"]
-        payload["query"] = q.replace("$page: Int = 0,", f"$page: Int = {page},")
-        r = requests.post(
-            url, headers={"Origin": "https://substance3d.adobe.com"}, data=payload
-        )
-        data = json.loads(r.text)
-        items.extend(data["data"]["assets"]["items"])
-        print(
-            f"Downloaded assets data - {len(items)} / {data['data']['assets']['total']}"
-        )
-        if data["data"]["assets"]["hasMore"]:
-            page = page + 1
-            time.sleep(0.1)
-        else:
+        assets_page = fetch_assets_page(session, url, page, rate_limiter)
+        yield assets_page
+        reached_known = False
+        for item in assets_page["items"]:
+            if item["id"] in last_seen_ids or (
+                item["createdAt"] and item["createdAt"] < newest_created_at
+            ):
+                reached_known = True
+                break
+        if reached_known or not assets_page["hasMore"]:
             break
-    with open(global_data["data_path"], "w+") as convert_file:
-        convert_file.write(json.dumps(items))
+        page = page + 1
+
+
+def get_full_scrape_age(database):
+    """
+    :param CommonDatabaseAccess database: reference to the database
+    :return: days since the last processed full scrape, None if there was none or its date can not be read
+    """
+    last_full_scrape = database.get_scrape_state("last_full_scrape")
+    if not last_full_scrape:
+        return None
+    try:
+        full_scrape_age = datetime.now() - datetime.fromisoformat(last_full_scrape)
+    except ValueError:
+        return None
+    return max(0, full_scrape_age.days)
+
+
+def get_scrape_mode(database, mode) -> str:
+    """
+    Resolves automatic scrape mode. Full scrape is forced when there is no cursor yet,
+    when there was no full scrape, or when last full scrape is older than full scrape interval,
+    because incremental scrape sees only new assets
+    :param CommonDatabaseAccess database: reference to the database
+    :param str mode: requested scrape mode
+    :return: SCRAPE_FULL or SCRAPE_INCREMENTAL
+    """
+    full_scrape_age = get_full_scrape_age(database)
+    if mode != SCRAPE_AUTO:
+        if mode == SCRAPE_INCREMENTAL and not database.get_scrape_state(
+            "newest_created_at"
+        ):
+            return SCRAPE_FULL
+        if mode == SCRAPE_INCREMENTAL and (
+            full_scrape_age is None
+            or full_scrape_age >= global_data["full_scrape_days"]
+        ):
+            console.print(
+                "[yellow]Incremental scrape sees only new assets, "
+                "changes of known assets need full scrape, which is overdue"
+            )
+        return mode
+    if (
+        full_scrape_age is None
+        or full_scrape_age >= global_data["full_scrape_days"]
+        or not database.get_scrape_state("newest_created_at")
+    ):
+        return SCRAPE_FULL
+    console.print(
+        f"Last full scrape {full_scrape_age} days ago, "
+        f"next in {global_data['full_scrape_days'] - full_scrape_age} days"
+    )
+    return SCRAPE_INCREMENTAL
+
+
+def scrap_online_data(database, url=None, concurrency=None, mode=None):
+    """
+    Access Substance material list webpage APK for all asset details.
+    :param CommonDatabaseAccess database: reference to the database, for the incremental scrape cursor
+    :param str url: GraphQL API url, default is from the command line or the Substance API
+    :param int concurrency: maximum number of parallel requests, default is from the command line
+    :param str mode: SCRAPE_FULL, SCRAPE_INCREMENTAL or SCRAPE_AUTO, default is from the command line
+    """
+    if url is None:
+        url = global_data["api_url"] or API_URL
+    if concurrency is None:
+        concurrency = global_data["concurrency"]
+    mode = get_scrape_mode(
+        database, global_data["scrape_mode"] if mode is None else mode
+    )
+    if mode == SCRAPE_FULL:
+        pages = fetch_all_asset_pages(url, concurrency)
+    else:
+        pages = fetch_new_asset_pages(
+            url,
+            database.get_scrape_state("newest_created_at"),
+            set(json.loads(database.get_scrape_state("last_seen_ids") or "[]")),
+        )
+    console.print(f"Scrape mode - {mode}")
+    count = 0
+    # 1. Downloading all elements from the API. 100 elements at a time.
+    # Written as one asset per line, into temporary file, so failed scrap do not destroy previous data
+    temp_path = global_data["data_path"] + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as convert_file:
+        header = {"mode": mode, "scraped_at": datetime.now().isoformat()}
+        convert_file.write(json.dumps({SCRAPE_HEADER: header}) + "\n")
+        for assets_page in pages:
+            for item in assets_page["items"]:
+                convert_file.write(json.dumps(item) + "\n")
+            count = count + len(assets_page["items"])
+            print(f"Downloaded assets data - {count} / {assets_page['total']}")
+    os.replace(temp_path, global_data["data_path"])
     console.print()
     console.print("All Done !!!")
-    input("Press Enter to continue...")
 
 
-def process_online_data(database):
+def read_raw_assets(data_path):
     """
-    Processes saved online data
-    :param CommonDatabaseAccess database: reference to teh database
+    Reads saved online data one asset at a time. Supports one asset per line format
+    and old format with all assets in one JSON list.
+    :param str data_path: path to the saved online data
+    :return: generator of asset items
+    """
+    with open(data_path, "r", encoding="utf-8") as data_file:
+        first_line = data_file.readline()
+        if first_line.lstrip().startswith("["):
+            # old format, whole file is one list
+            yield from json.loads(first_line + data_file.read())
+            return
+        for line in itertools.chain([first_line], data_file):
+            if line.strip():
+                item = json.loads(line)
+                if SCRAPE_HEADER not in item:
+                    yield item
+
+
+def read_raw_header(data_path):
+    """
+    Reads scrape details (mode and time) saved at the beginning of the online data
+    :param str data_path: path to the saved online data
+    :return: scrape details, or None for files without them
+    """
+    with open(data_path, "r", encoding="utf-8") as data_file:
+        first_line = data_file.readline()
+    if first_line.startswith('{"' + SCRAPE_HEADER + '"'):
+        return json.loads(first_line)[SCRAPE_HEADER]
+    return None
+
+
+def count_raw_assets(data_path):
+    """
+    Number of assets in saved online data, without parsing them
+    :param str data_path: path to the saved online data
+    :return: number of assets, or None for the old format
     """
-    if not os.path.exists(global_data["data_path"]):
-        console.print("Missing data file, download it first !!!\n")
-        return
     count = 0
-    all_tags = database.get_all_tags()
-    all_types = database.get_all_types()
-    all_categories = database.get_all_categories()
-    all_preview_tags = database.get_all_preview_tags()
-    all_download_tags = database.get_all_download_tags()
-    all_preview_kinds = database.get_all_preview_kinds()
-    all_previews = database.get_all_previews()
-    all_preview_preview_tags = database.get_all_preview_preview_tags()
-    all_asset_tags = database.get_all_asset_tags()
-    all_asset_previews = database.get_all_asset_previews()
-    data = [json.loads(line) for line in open(global_data["data_path"], "r")]
-    report_data = {
-        "new_file_version": [],
-        "new_preview_image": [],
-        "new_asset": [],
-        "changed_category": [],
-        "updated_asset": [],
-        "edited_asset": [],
+    with open(data_path, "rb") as data_file:
+        for line in data_file:
+            if count == 0 and line.lstrip().startswith(b"["):
+                return None
+            if line.strip() and not line.startswith(
+                b'{"' + SCRAPE_HEADER.encode() + b'"'
+            ):
+                count = count + 1
+    return count
+
+
+def load_lookups(database) -> dict:
+    """
+    Loads lookup tables used while processing online data
+    :param CommonDatabaseAccess database: reference to the database
+    :return: lookup tables by name
+    """
+    return {
+        "tags": KeyedLookup(database.get_all_tags(), "name", "tag_id"),
+        "types": KeyedLookup(database.get_all_types(), "name", "type_id"),
+        "categories": KeyedLookup(database.get_all_categories(), "name", "category_id"),
+        "preview_tags": KeyedLookup(
+            database.get_all_preview_tags(), "name", "preview_tag_id"
+        ),
+        "download_tags": KeyedLookup(
+            database.get_all_download_tags(), "name", "download_tag_id"
+        ),
+        "preview_kinds": KeyedLookup(
+            database.get_all_preview_kinds(), "name", "preview_kind_id"
+        ),
+        "previews": KeyedLookup(
+            database.get_all_previews(), "original_id", "preview_id"
+        ),
+        "preview_preview_tags": LinkLookup(
+            database.get_all_preview_preview_tags(), "preview_id", "preview_tag_id"
+        ),
+        "asset_tags": LinkLookup(database.get_all_asset_tags(), "asset_id", "tag_id"),
+        "asset_previews": LinkLookup(
+            database.get_all_asset_previews(), "asset_id", "preview_id"
+        ),
+        "download_download_tags": LinkLookup(
+            database.get_all_download_download_tags(), "download_id", "download_tag_id"
+        ),
+        "asset_downloads": LinkLookup(
+            database.get_all_asset_downloads(), "asset_id", "download_id"
+        ),
+        "fingerprints": database.get_all_asset_fingerprints(),
+    }
+
+
+def asset_fingerprint(d) -> str:
+    """
+    Stable hash of the asset item from the online data. Same data gives same hash, regardless of key order
+    :param dict d: asset item from the online data
+    :return: hex digest
+    """
+    normalized = json.dumps(
+        d, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def asset_change_events(database, changes) -> []:
+    """
+    Builds change events with everything the asset processor needs to update asset folders,
+    so they can be handled without access to the database
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] changes: list of (asset item from the online data, change from process_asset_data)
+    :return: list of events with kinds of change, asset data with names of type and category,
+        previous category name and previews of the asset
+    """
+    assets = {
+        asset["original_id"]: asset
+        for asset in database.get_latest_assets_with_category(
+            original_ids=[d["id"] for d, change in changes]
+        )
     }
-    for d in track(data[0], description=f"Substance assets ", total=len(data[0])):
-        count = count + 1
-        # console.print(d)
-        # checking attached data first
-        current_previews = []
-        current_downloads = []
-        for a in d["attachments"]:
-            if a["__typename"] == "PreviewAttachment":
-                preview_data = []
-                for item in all_previews:
-                    if item["original_id"] == a["id"]:
-                        preview_data.append(item)
+    events = []
+    for d, change in changes:
+        if d["id"] not in assets:
+            continue
+        events.append(
+            {
+                "kinds": change["kinds"],
+                "old_category_name": change["old_category_name"],
+                "asset": assets[d["id"]],
+                "previews": [
+                    {
+                        "original_id": a["id"],
+                        "url": a["url"],
+                        "is_thumbnail": a["id"] == d["thumbnail"]["id"],
+                        "is_far": "far" in a["tags"],
+                    }
+                    for a in d["attachments"]
+                    if a["__typename"] == "PreviewAttachment"
+                ],
+            }
+        )
+    return events
+
+
+def process_asset_batch(database, batch, lookups, report_data, on_change=None) -> None:
+    """
+    Processes batch of assets in one database transaction. On error whole batch is rolled back
+    and lookup tables are loaded again, so they do not keep IDs and links of the rolled back rows.
+    :param CommonDatabaseAccess database: reference to the database
+    :param [] batch: asset items from the online data
+    :param dict lookups: lookup tables from load_lookups
+    :param dict report_data: collected changes for the scan report
+    :param on_change: function called with change event of every changed asset, after the batch is saved
+    """
+    changes = []
+    try:
+        with database.transaction():
+            processed_fingerprints = []
+            for d in batch:
+                fingerprint = asset_fingerprint(d)
+                if lookups["fingerprints"].get(d["id"]) == fingerprint:
+                    # nothing changed since last processing
+                    report_data["unchanged_asset"].append(d["id"])
+                    continue
+                change = process_asset_data(database, d, lookups, report_data)
+                if len(change["kinds"]) > 0:
+                    changes.append((d, change))
+                lookups["fingerprints"][d["id"]] = fingerprint
+                processed_fingerprints.append((fingerprint, d["id"]))
+            database.set_asset_fingerprints(processed_fingerprints)
+            # link tables are written in bulk at the end of the batch
+            lookups["preview_preview_tags"].flush(database.set_preview_preview_tags)
+            lookups["asset_tags"].flush(database.set_asset_tags)
+            lookups["asset_previews"].flush(database.set_asset_previews)
+            lookups["download_download_tags"].flush(database.set_download_download_tags)
+            lookups["asset_downloads"].flush(database.set_asset_downloads)
+    except BaseException:
+        lookups.update(load_lookups(database))
+        raise
+    if on_change is not None and len(changes) > 0:
+        for event in asset_change_events(database, changes):
+            on_change(event)
+
+
+def process_asset_data(database, d, lookups, report_data) -> {}:
+    """
+    Adds or updates one asset item from the online data
+    :param CommonDatabaseAccess database: reference to the database
+    :param dict d: asset item from the online data
+    :param dict lookups: lookup tables from load_lookups
+    :param dict report_data: collected changes for the scan report
+    :return: kinds of changes of the asset and previous category name if category changed
+    """
+    change = {"kinds": [], "old_category_name": None}
+    # console.print(d)
+    # checking attached data first
+    current_previews = []
+    current_downloads = []
+    for a in d["attachments"]:
+        if a["__typename"] == "PreviewAttachment":
+            preview_data = lookups["previews"].get(a["id"])
+            if preview_data is None:
+                preview_data = {}
+                preview_data["original_id"] = a["id"]
+                preview_data["url"] = a["url"]
+                preview_data["label"] = a["label"]
+                preview_data["preview_kind_id"] = lookups[
+                    "preview_kinds"
+                ].get_or_create_id(a["kind"], database.set_new_preview_kind)
+                new_preview_id = database.set_new_preview(preview_data)
+                preview_data["preview_id"] = new_preview_id
+                lookups["previews"].add(preview_data)
+                if ASSET_NEW_PREVIEW not in change["kinds"]:
+                    change["kinds"].append(ASSET_NEW_PREVIEW)
+            current_previews.append(preview_data)
+
+            for t in a["tags"]:
+                tag_id = lookups["preview_tags"].get_or_create_id(
+                    t, database.set_new_preview_tag
+                )
+                lookups["preview_preview_tags"].queue(
+                    preview_data["preview_id"], tag_id
+                )
+
+        elif a["__typename"] == "DownloadAttachment":
+            # Processing downloadable file
+            download_data = database.get_download_by_original_id(a["id"])
+            if len(download_data) == 0:
+                download_data.append({})
+                download_data[0]["original_id"] = a["id"]
+                download_data[0]["url"] = a["url"]
+                download_data[0]["label"] = a["label"]
+                new_download_id = database.set_new_download(download_data[0])
+                download_data[0]["download_id"] = new_download_id
+                current_downloads.append(download_data[0])
+            else:
+                current_downloads.append(download_data[0])
+
+            for t in a["tags"]:
+                tag_id = lookups["download_tags"].get_or_create_id(
+                    t, database.set_new_download_tag
+                )
+                lookups["download_download_tags"].queue(
+                    download_data[0]["download_id"], tag_id
+                )
+
+            for r in a["revisions"]:
+                revision_data = database.get_revisions_by_download_id_and_revision(
+                    download_data[0]["download_id"], r["revision"]
+                )
+                revision_count = len(revision_data)
+                need_double = True
+                for rd in revision_data:
+                    if (
+                        rd["filename"] == r["filename"]
+                        and rd["size"] == r["size"]
+                        # or rd["created_at"] == r["createdAt"]
+                    ):
+                        need_double = False
                         break
-                if len(preview_data) == 0:
-                    preview_data.append({})
-                    preview_data[0]["original_id"] = a["id"]
-                    preview_data[0]["url"] = a["url"]
-                    preview_data[0]["label"] = a["label"]
-                    preview_kind_id = -1
-                    for pk in all_preview_kinds:
-                        if pk["name"] == a["kind"]:
-                            preview_kind_id = pk["preview_kind_id"]
-                            break
-                    if preview_kind_id == -1:
-                        preview_kind_id = database.set_new_preview_kind(a["kind"])
-                        all_preview_kinds.append(
-                            {"preview_kind_id": preview_kind_id, "name": a["kind"]}
-                        )
-                    preview_data[0]["preview_kind_id"] = preview_kind_id
-                    new_preview_id = database.set_new_preview(preview_data[0])
-                    preview_data[0]["preview_id"] = new_preview_id
-                    all_previews.append(preview_data[0])
-                    current_previews.append(preview_data[0])
-                else:
-                    current_previews.append(preview_data[0])
-
-                for t in a["tags"]:
-                    tag_id = -1
-                    for at in all_preview_tags:
-                        if at["name"] == t:
-                            tag_id = at["preview_tag_id"]
-                            break
-                    if tag_id == -1:
-                        tag_id = database.set_new_preview_tag(t)
-                        all_preview_tags.append({"preview_tag_id": tag_id, "name": t})
-                    preview_preview_tag = []
-                    for item in all_preview_preview_tags:
-                        if (
-                            item["preview_id"] == preview_data[0]["preview_id"]
-                            and item["preview_tag_id"] == tag_id
-                        ):
-                            preview_preview_tag.append(item)
-                            break
-                    if len(preview_preview_tag) == 0:
-                        new_preview_preview_tag_id = database.set_preview_preview_tag(
-                            preview_data[0]["preview_id"], tag_id
-                        )
-                        all_preview_preview_tags.append(
+                if len(revision_data) == 0 or need_double:
+                    revision_data = [{}]
+                    revision_data[0]["download_id"] = download_data[0]["download_id"]
+                    revision_data[0]["filename"] = r["filename"]
+                    revision_data[0]["size"] = r["size"]
+                    revision_data[0]["revision"] = r["revision"]
+                    revision_data[0]["created_at"] = r["createdAt"]
+                    revision_data[0]["have_file"] = False
+                    new_revision_id = database.set_new_revision(revision_data[0])
+                    if revision_count > 0:
+                        report_data["new_file_version"].append(
                             {
-                                "preview_preview_tag_id": new_preview_preview_tag_id,
-                                "preview_id": preview_data[0]["preview_id"],
-                                "preview_tag_id": tag_id,
+                                "Asset": d["title"],
+                                "filename": r["filename"],
+                                "revision": r["revision"],
+                                "category": d["categories"][0],
                             }
                         )
+        else:
+            console.print(f"Found Unknown Attachment type - {a['__typename']} !!!")
+    # and now main asset data
+    asset_data = database.get_latest_asset_revision_by_original_id(d["id"])
+    if len(asset_data) == 0:
+        # Asset with this ID is not in the database
+        asset_data.append({})
+        asset_data[0]["original_id"] = d["id"]
+        asset_data[0]["name"] = d["title"]
+        asset_data[0]["type_id"] = lookups["types"].get_or_create_id(
+            d["__typename"], database.set_new_type
+        )
+        asset_data[0]["is_new"] = d["new"]
+        asset_data[0]["is_update"] = d["downloadsRecentlyUpdated"]
+        asset_data[0]["created_at"] = d["createdAt"]
 
-            elif a["__typename"] == "DownloadAttachment":
-                # Processing downloadable file
-                download_data = database.get_download_by_original_id(a["id"])
-                if len(download_data) == 0:
-                    download_data.append({})
-                    download_data[0]["original_id"] = a["id"]
-                    download_data[0]["url"] = a["url"]
-                    download_data[0]["label"] = a["label"]
-                    new_download_id = database.set_new_download(download_data[0])
-                    download_data[0]["download_id"] = new_download_id
-                    current_downloads.append(download_data[0])
-                else:
-                    current_downloads.append(download_data[0])
-
-                for t in a["tags"]:
-                    tag_id = -1
-                    for at in all_download_tags:
-                        if at["name"] == t:
-                            tag_id = at["download_tag_id"]
-                            break
-                    if tag_id == -1:
-                        tag_id = database.set_new_download_tag(t)
-                        all_download_tags.append({"download_tag_id": tag_id, "name": t})
-                    download_download_tag = database.get_download_download_tag_by_download_id_and_download_tag_id(
-                        download_data[0]["download_id"], tag_id
-                    )
-                    if len(download_download_tag) == 0:
-                        database.set_download_download_tag(
-                            download_data[0]["download_id"], tag_id
-                        )
+        asset_data[0]["thumbnail_id"] = lookups["previews"].get_id(d["thumbnail"]["id"])
+        asset_data[0]["extra_data_author"] = ""
+        asset_data[0]["extra_data_physical_size"] = ""
+        asset_data[0]["extra_data_ref"] = ""
+        asset_data[0]["extra_data_type"] = ""
+        asset_data[0]["extra_data_style"] = ""
+        asset_data[0]["extra_data_quality"] = ""
+        asset_data[0]["extra_data_meshes"] = ""
+        asset_data[0]["extra_data_counters_quads"] = ""
+        asset_data[0]["extra_data_substance_resolution"] = ""
+        asset_data[0]["extra_data_preview_disp"] = ""
 
-                for r in a["revisions"]:
-                    revision_data = database.get_revisions_by_download_id_and_revision(
-                        download_data[0]["download_id"], r["revision"]
-                    )
-                    revision_count = len(revision_data)
-                    need_double = True
-                    for rd in revision_data:
-                        if (
-                            rd["filename"] == r["filename"]
-                            and rd["size"] == r["size"]
-                            # or rd["created_at"] == r["createdAt"]
-                        ):
-                            need_double = False
-                            break
-                    if len(revision_data) == 0 or need_double:
-                        revision_data = [{}]
-                        revision_data[0]["download_id"] = download_data[0][
-                            "download_id"
-                        ]
-                        revision_data[0]["filename"] = r["filename"]
-                        revision_data[0]["size"] = r["size"]
-                        revision_data[0]["revision"] = r["revision"]
-                        revision_data[0]["created_at"] = r["createdAt"]
-                        revision_data[0]["have_file"] = False
-                        new_revision_id = database.set_new_revision(revision_data[0])
-                        if revision_count > 0:
-                            report_data["new_file_version"].append(
-                                {
-                                    "Asset": d["title"],
-                                    "filename": r["filename"],
-                                    "revision": r["revision"],
-                                    "category": d["categories"][0],
-                                }
-                            )
-            else:
-                console.print(f"Found Unknown Attachment type - {a['__typename']} !!!")
-        # and now main asset data
-        asset_data = database.get_latest_asset_revision_by_original_id(d["id"])
-        if len(asset_data) == 0:
-            # Asset with this ID is not in the database
-            asset_data.append({})
-            asset_data[0]["original_id"] = d["id"]
+        for ed in d["extraData"]:
+            if ed["key"] == "author":
+                asset_data[0]["extra_data_author"] = ed["value"]
+            elif ed["key"] == "physicalSize":
+                asset_data[0]["extra_data_physical_size"] = ed["value"]
+            elif ed["key"] == "ref":
+                asset_data[0]["extra_data_ref"] = ed["value"]
+            elif ed["key"] == "type":
+                asset_data[0]["extra_data_type"] = ed["value"]
+            elif ed["key"] == "style":
+                asset_data[0]["extra_data_style"] = ed["value"]
+            elif ed["key"] == "quality":
+                asset_data[0]["extra_data_quality"] = ed["value"]
+            elif ed["key"] == "meshes":
+                asset_data[0]["extra_data_meshes"] = ed["value"]
+            elif ed["key"] == "counters.quads":
+                asset_data[0]["extra_data_counters_quads"] = ed["value"]
+            elif ed["key"] == "substance_resolution":
+                asset_data[0]["extra_data_substance_resolution"] = ed["value"]
+            elif ed["key"] == "previewDisp":
+                asset_data[0]["extra_data_preview_disp"] = ed["value"]
+        new_asset_id = database.set_new_asset(asset_data[0]["original_id"])
+        asset_data[0]["asset_id"] = new_asset_id
+        new_asset_revision_id = database.set_new_asset_revision(asset_data[0])
+        report_data["new_asset"].append(
+            {"Asset": d["title"], "category": d["categories"][0]}
+        )
+        change["kinds"].append(ASSET_NEW)
+    else:
+        # We have asset with this ID in the database
+        have_changes = False
+        have_small_change = False
+        small_change = []
+        big_change = []
+        if asset_data[0]["name"] != d["title"]:
+            have_changes = True
+            big_change.append(
+                f'Title changed from "{asset_data[0]["name"]}" to "{d["title"]}"'
+            )
             asset_data[0]["name"] = d["title"]
-            type_id = -1
-            for t in all_types:
-                if t["name"] == d["__typename"]:
-                    type_id = t["type_id"]
-                    break
-            if type_id == -1:
-                type_id = database.set_new_type(d["__typename"])
-                all_types.append({"type_id": type_id, "name": d["__typename"]})
+        type_id = lookups["types"].get_or_create_id(
+            d["__typename"], database.set_new_type
+        )
+        if asset_data[0]["type_id"] != type_id:
+            have_changes = True
+            big_change.append(
+                f'Type changed from "{database.get_types_by_type_id(asset_data[0]["type_id"])[0]["name"]}" to "{d["__typename"]}"'
+            )
             asset_data[0]["type_id"] = type_id
+        if asset_data[0]["is_new"] != d["new"]:
+            have_small_change = True
+            small_change.append(
+                f'New status changed from "{bool(asset_data[0]["is_new"])}" to "{d["new"]}"'
+            )
             asset_data[0]["is_new"] = d["new"]
+        if asset_data[0]["is_update"] != d["downloadsRecentlyUpdated"]:
+            have_small_change = True
+            small_change.append(
+                f'Is Updated status changed from "{bool(asset_data[0]["is_update"])}" to "{d["downloadsRecentlyUpdated"]}"'
+            )
             asset_data[0]["is_update"] = d["downloadsRecentlyUpdated"]
+        if asset_data[0]["created_at"] != d["createdAt"]:
+            have_changes = True
+            big_change.append(
+                f'Created date changed from "{asset_data[0]["created_at"]}" to "{d["createdAt"]}"'
+            )
             asset_data[0]["created_at"] = d["createdAt"]
+        thumbnail_id = lookups["previews"].get_id(d["thumbnail"]["id"])
+        if asset_data[0]["thumbnail_id"] != thumbnail_id:
+            have_changes = True
+            big_change.append(
+                f'Thumbnail id changed from "{asset_data[0]["thumbnail_id"]}" to "{thumbnail_id}"'
+            )
+            asset_data[0]["thumbnail_id"] = thumbnail_id
+            report_data["new_preview_image"].append(
+                {"Asset": d["title"], "category": d["categories"][0]}
+            )
+            if ASSET_NEW_PREVIEW not in change["kinds"]:
+                change["kinds"].append(ASSET_NEW_PREVIEW)
 
-            preview_id = -1
-            for item in all_previews:
-                if item["original_id"] == d["thumbnail"]["id"]:
-                    preview_id = item["preview_id"]
-                    break
-            asset_data[0]["thumbnail_id"] = preview_id
-            asset_data[0]["extra_data_author"] = ""
-            asset_data[0]["extra_data_physical_size"] = ""
-            asset_data[0]["extra_data_ref"] = ""
-            asset_data[0]["extra_data_type"] = ""
-            asset_data[0]["extra_data_style"] = ""
-            asset_data[0]["extra_data_quality"] = ""
-            asset_data[0]["extra_data_meshes"] = ""
-            asset_data[0]["extra_data_counters_quads"] = ""
-            asset_data[0]["extra_data_substance_resolution"] = ""
-            asset_data[0]["extra_data_preview_disp"] = ""
-
-            for ed in d["extraData"]:
-                if ed["key"] == "author":
+        for ed in d["extraData"]:
+            if ed["key"] == "author":
+                if asset_data[0]["extra_data_author"] != ed["value"]:
+                    have_small_change = True
+                    small_change.append(
+                        f'Extra Author changed from "{asset_data[0]["extra_data_author"]}" to "{ed["value"]}"'
+                    )
                     asset_data[0]["extra_data_author"] = ed["value"]
-                elif ed["key"] == "physicalSize":
+            elif ed["key"] == "physicalSize":
+                if asset_data[0]["extra_data_physical_size"] != ed["value"]:
+                    small_change.append(
+                        f'Extra Physical size changed from "{asset_data[0]["extra_data_physical_size"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_physical_size"] = ed["value"]
-                elif ed["key"] == "ref":
+            elif ed["key"] == "ref":
+                if asset_data[0]["extra_data_ref"] != ed["value"]:
+                    have_changes = True
+                    big_change.append(
+                        f'Extra Internal reference changed from "{asset_data[0]["extra_data_ref"]}" to "{ed["value"]}"'
+                    )
                     asset_data[0]["extra_data_ref"] = ed["value"]
-                elif ed["key"] == "type":
+            elif ed["key"] == "type":
+                if asset_data[0]["extra_data_type"] != ed["value"]:
+                    small_change.append(
+                        f'Extra type changed from "{asset_data[0]["extra_data_type"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_type"] = ed["value"]
-                elif ed["key"] == "style":
+            elif ed["key"] == "style":
+                if asset_data[0]["extra_data_style"] != ed["value"]:
+                    small_change.append(
+                        f'Extra style changed from "{asset_data[0]["extra_data_style"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_style"] = ed["value"]
-                elif ed["key"] == "quality":
+            elif ed["key"] == "quality":
+                if asset_data[0]["extra_data_quality"] != ed["value"]:
+                    small_change.append(
+                        f'Extra quality changed from "{asset_data[0]["extra_data_quality"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_quality"] = ed["value"]
-                elif ed["key"] == "meshes":
+            elif ed["key"] == "meshes":
+                if asset_data[0]["extra_data_meshes"] != ed["value"]:
+                    small_change.append(
+                        f'Extra meshes changed from "{asset_data[0]["extra_data_meshes"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_meshes"] = ed["value"]
-                elif ed["key"] == "counters.quads":
+            elif ed["key"] == "counters.quads":
+                if asset_data[0]["extra_data_counters_quads"] != ed["value"]:
+                    small_change.append(
+                        f'Extra quad count changed from "{asset_data[0]["extra_data_counters_quads"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_counters_quads"] = ed["value"]
-                elif ed["key"] == "substance_resolution":
+            elif ed["key"] == "substance_resolution":
+                if asset_data[0]["extra_data_substance_resolution"] != ed["value"]:
+                    small_change.append(
+                        f'Extra resolution changed from "{asset_data[0]["extra_data_substance_resolution"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_substance_resolution"] = ed["value"]
-                elif ed["key"] == "previewDisp":
+            elif ed["key"] == "previewDisp":
+                if asset_data[0]["extra_data_preview_disp"] != ed["value"]:
+                    small_change.append(
+                        f'Extra displacement changed from "{asset_data[0]["extra_data_preview_disp"]}" to "{ed["value"]}"'
+                    )
+                    have_small_change = True
                     asset_data[0]["extra_data_preview_disp"] = ed["value"]
-            new_asset_id = database.set_new_asset(asset_data[0]["original_id"])
-            asset_data[0]["asset_id"] = new_asset_id
-            new_asset_revision_id = database.set_new_asset_revision(asset_data[0])
-            report_data["new_asset"].append(
-                {"Asset": d["title"], "category": d["categories"][0]}
-            )
-        else:
-            # We have asset with this ID in the database
-            have_changes = False
-            have_small_change = False
-            small_change = []
-            big_change = []
-            if asset_data[0]["name"] != d["title"]:
-                have_changes = True
-                big_change.append(
-                    f'Title changed from "{asset_data[0]["name"]}" to "{d["title"]}"'
-                )
-                asset_data[0]["name"] = d["title"]
-            type_id = -1
-            for t in all_types:
-                if t["name"] == d["__typename"]:
-                    type_id = t["type_id"]
-                    break
-            if type_id == -1:
-                type_id = database.set_new_type(d["__typename"])
-                all_types.append({"type_id": type_id, "name": d["__typename"]})
-            if asset_data[0]["type_id"] != type_id:
-                have_changes = True
-                big_change.append(
-                    f'Type changed from "{database.get_types_by_type_id(asset_data[0]["type_id"])[0]["name"]}" to "{d["__typename"]}"'
-                )
-                asset_data[0]["type_id"] = type_id
-            if asset_data[0]["is_new"] != d["new"]:
-                have_small_change = True
-                small_change.append(
-                    f'New status changed from "{bool(asset_data[0]["is_new"])}" to "{d["new"]}"'
-                )
-                asset_data[0]["is_new"] = d["new"]
-            if asset_data[0]["is_update"] != d["downloadsRecentlyUpdated"]:
-                have_small_change = True
-                small_change.append(
-                    f'Is Updated status changed from "{bool(asset_data[0]["is_update"])}" to "{d["downloadsRecentlyUpdated"]}"'
-                )
-                asset_data[0]["is_update"] = d["downloadsRecentlyUpdated"]
-            if asset_data[0]["created_at"] != d["createdAt"]:
-                have_changes = True
-                big_change.append(
-                    f'Created date changed from "{asset_data[0]["created_at"]}" to "{d["createdAt"]}"'
-                )
-                asset_data[0]["created_at"] = d["createdAt"]
-            thumbnail_id = -1
-            for item in all_previews:
-                if item["original_id"] == d["thumbnail"]["id"]:
-                    thumbnail_id = item["preview_id"]
-                    break
-            if asset_data[0]["thumbnail_id"] != thumbnail_id:
-                have_changes = True
-                big_change.append(
-                    f'Thumbnail id changed from "{asset_data[0]["thumbnail_id"]}" to "{thumbnail_id}"'
-                )
-                asset_data[0]["thumbnail_id"] = thumbnail_id
-                report_data["new_preview_image"].append(
-                    {"Asset": d["title"], "category": d["categories"][0]}
-                )
 
-            for ed in d["extraData"]:
-                if ed["key"] == "author":
-                    if asset_data[0]["extra_data_author"] != ed["value"]:
-                        have_small_change = True
-                        small_change.append(
-                            f'Extra Author changed from "{asset_data[0]["extra_data_author"]}" to "{ed["value"]}"'
-                        )
-                        asset_data[0]["extra_data_author"] = ed["value"]
-                elif ed["key"] == "physicalSize":
-                    if asset_data[0]["extra_data_physical_size"] != ed["value"]:
-                        small_change.append(
-                            f'Extra Physical size changed from "{asset_data[0]["extra_data_physical_size"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_physical_size"] = ed["value"]
-                elif ed["key"] == "ref":
-                    if asset_data[0]["extra_data_ref"] != ed["value"]:
-                        have_changes = True
-                        big_change.append(
-                            f'Extra Internal reference changed from "{asset_data[0]["extra_data_ref"]}" to "{ed["value"]}"'
-                        )
-                        asset_data[0]["extra_data_ref"] = ed["value"]
-                elif ed["key"] == "type":
-                    if asset_data[0]["extra_data_type"] != ed["value"]:
-                        small_change.append(
-                            f'Extra type changed from "{asset_data[0]["extra_data_type"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_type"] = ed["value"]
-                elif ed["key"] == "style":
-                    if asset_data[0]["extra_data_style"] != ed["value"]:
-                        small_change.append(
-                            f'Extra style changed from "{asset_data[0]["extra_data_style"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_style"] = ed["value"]
-                elif ed["key"] == "quality":
-                    if asset_data[0]["extra_data_quality"] != ed["value"]:
-                        small_change.append(
-                            f'Extra quality changed from "{asset_data[0]["extra_data_quality"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_quality"] = ed["value"]
-                elif ed["key"] == "meshes":
-                    if asset_data[0]["extra_data_meshes"] != ed["value"]:
-                        small_change.append(
-                            f'Extra meshes changed from "{asset_data[0]["extra_data_meshes"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_meshes"] = ed["value"]
-                elif ed["key"] == "counters.quads":
-                    if asset_data[0]["extra_data_counters_quads"] != ed["value"]:
-                        small_change.append(
-                            f'Extra quad count changed from "{asset_data[0]["extra_data_counters_quads"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_counters_quads"] = ed["value"]
-                elif ed["key"] == "substance_resolution":
-                    if asset_data[0]["extra_data_substance_resolution"] != ed["value"]:
-                        small_change.append(
-                            f'Extra resolution changed from "{asset_data[0]["extra_data_substance_resolution"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_substance_resolution"] = ed["value"]
-                elif ed["key"] == "previewDisp":
-                    if asset_data[0]["extra_data_preview_disp"] != ed["value"]:
-                        small_change.append(
-                            f'Extra displacement changed from "{asset_data[0]["extra_data_preview_disp"]}" to "{ed["value"]}"'
-                        )
-                        have_small_change = True
-                        asset_data[0]["extra_data_preview_disp"] = ed["value"]
-
-            all_small_changes = ".".join(small_change)
-            all_big_changes = ".".join(big_change)
-            if not have_changes and have_small_change:
-                database.update_asset_revision(asset_data[0])
-                report_data["edited_asset"].append(
-                    {
-                        "Asset": d["title"],
-                        "category": d["categories"][0],
-                        "details": all_small_changes,
-                    }
-                )
-            elif have_changes:
-                database.update_asset_revision_revision(asset_data[0])
-                report_data["updated_asset"].append(
-                    {
-                        "Asset": d["title"],
-                        "category": d["categories"][0],
-                        "details": f"{all_big_changes}. {all_small_changes}",
-                    }
-                )
-
-        for t in d["tags"]:
-            tag_id = -1
-            for at in all_tags:
-                if at["name"] == t:
-                    tag_id = at["tag_id"]
-                    break
-            if tag_id == -1:
-                tag_id = database.set_new_tag(t)
-                all_tags.append({"tag_id": tag_id, "name": t})
-            asset_tag = []
-            for item in all_asset_tags:
-                if (
-                    item["asset_id"] == asset_data[0]["asset_id"]
-                    and item["tag_id"] == tag_id
-                ):
-                    asset_tag.append(item)
-                    break
-            if len(asset_tag) == 0:
-                new_asset_tag = database.set_asset_tag(
-                    asset_data[0]["asset_id"], tag_id
-                )
-                all_asset_tags.append(
-                    {
-                        "asset_tag_id": new_asset_tag,
-                        "asset_id": asset_data[0]["asset_id"],
-                        "tag_id": tag_id,
-                    }
-                )
-
-        all_asset_categories = database.get_asset_category_by_asset_id(
-            asset_data[0]["asset_id"]
-        )
-        for aac in all_asset_categories:
-            aac["is_active"] = False
-        current_category = database.get_active_asset_category_by_asset_id(
-            asset_data[0]["asset_id"]
-        )
-        for c in d["categories"]:
-            category_id = -1
-            for ac in all_categories:
-                if ac["name"] == c:
-                    category_id = ac["category_id"]
-                    cat_data = None
-                    for item in all_asset_categories:
-                        if item["category_id"] == category_id:
-                            cat_data = item
-                            break
-                    if cat_data is not None:
-                        cat_data["is_active"] = True
-                    break
-            if category_id == -1:
-                category_id = database.set_new_category(c)
-                all_categories.append({"category_id": category_id, "name": c})
-            asset_category = database.get_asset_category_by_asset_id_and_category_id(
-                asset_data[0]["asset_id"], category_id
+        all_small_changes = ".".join(small_change)
+        all_big_changes = ".".join(big_change)
+        if have_changes or have_small_change:
+            change["kinds"].append(ASSET_UPDATED)
+        if not have_changes and have_small_change:
+            database.update_asset_revision(asset_data[0])
+            report_data["edited_asset"].append(
+                {
+                    "Asset": d["title"],
+                    "category": d["categories"][0],
+                    "details": all_small_changes,
+                }
             )
-            if len(asset_category) == 0:
-                database.set_asset_category(
-                    asset_data[0]["asset_id"], category_id, True
-                )
-
-        for aac in all_asset_categories:
-            if not aac["is_active"]:
-                database.update_asset_category(aac)
-        new_category = database.get_active_asset_category_by_asset_id(
-            asset_data[0]["asset_id"]
-        )
-        # We always assume, that is only 1 active category
-        if (
-            len(current_category) > 0
-            and len(new_category) > 0
-            and current_category[0]["category_id"] != new_category[0]["category_id"]
-        ):
-            report_data["changed_category"].append(
+        elif have_changes:
+            database.update_asset_revision_revision(asset_data[0])
+            report_data["updated_asset"].append(
                 {
                     "Asset": d["title"],
-                    "old_category": database.get_category_by_id(
-                        current_category[0]["category_id"]
-                    )[0]["name"],
-                    "new_category": database.get_category_by_id(
-                        new_category[0]["category_id"]
-                    )[0]["name"],
+                    "category": d["categories"][0],
+                    "details": f"{all_big_changes}. {all_small_changes}",
                 }
             )
 
-        for cp in current_previews:
-            asset_preview = []
-            for item in all_asset_previews:
-                if (
-                    item["asset_id"] == asset_data[0]["asset_id"]
-                    and item["preview_id"] == cp["preview_id"]
-                ):
-                    asset_preview.append(item)
-                    break
-            if len(asset_preview) == 0:
-                new_asset_preview_id = database.set_asset_preview(
-                    asset_data[0]["asset_id"], cp["preview_id"]
-                )
-                all_asset_previews.append(
-                    {
-                        "asset_preview_id": new_asset_preview_id,
-                        "asset_id": asset_data[0]["asset_id"],
-                        "preview_id": cp["preview_id"],
-                    }
-                )
+    for t in d["tags"]:
+        tag_id = lookups["tags"].get_or_create_id(t, database.set_new_tag)
+        lookups["asset_tags"].queue(asset_data[0]["asset_id"], tag_id)
 
-        for cd in current_downloads:
-            asset_download = database.get_asset_download_by_asset_id_and_download_id(
-                asset_data[0]["asset_id"], cd["download_id"]
+    all_asset_categories = database.get_asset_category_by_asset_id(
+        asset_data[0]["asset_id"]
+    )
+    for aac in all_asset_categories:
+        aac["is_active"] = False
+    current_category = database.get_active_asset_category_by_asset_id(
+        asset_data[0]["asset_id"]
+    )
+    asset_categories_by_id = {}
+    for aac in all_asset_categories:
+        asset_categories_by_id.setdefault(aac["category_id"], aac)
+    for c in d["categories"]:
+        category_id = lookups["categories"].get_id(c)
+        if category_id != -1:
+            cat_data = asset_categories_by_id.get(category_id)
+            if cat_data is not None:
+                cat_data["is_active"] = True
+        else:
+            category_id = lookups["categories"].get_or_create_id(
+                c, database.set_new_category
             )
-            if len(asset_download) == 0:
-                database.set_asset_download(
-                    asset_data[0]["asset_id"], cd["download_id"]
-                )
+        asset_category = database.get_asset_category_by_asset_id_and_category_id(
+            asset_data[0]["asset_id"], category_id
+        )
+        if len(asset_category) == 0:
+            database.set_asset_category(asset_data[0]["asset_id"], category_id, True)
+
+    for aac in all_asset_categories:
+        if not aac["is_active"]:
+            database.update_asset_category(aac)
+    new_category = database.get_active_asset_category_by_asset_id(
+        asset_data[0]["asset_id"]
+    )
+    # We always assume, that is only 1 active category
+    if (
+        len(current_category) > 0
+        and len(new_category) > 0
+        and current_category[0]["category_id"] != new_category[0]["category_id"]
+    ):
+        report_data["changed_category"].append(
+            {
+                "Asset": d["title"],
+                "old_category": database.get_category_by_id(
+                    current_category[0]["category_id"]
+                )[0]["name"],
+                "new_category": database.get_category_by_id(
+                    new_category[0]["category_id"]
+                )[0]["name"],
+            }
+        )
+        change["kinds"].append(ASSET_RECATEGORIZED)
+        change["old_category_name"] = report_data["changed_category"][-1][
+            "old_category"
+        ]
+
+    for cp in current_previews:
+        lookups["asset_previews"].queue(asset_data[0]["asset_id"], cp["preview_id"])
+
+    for cd in current_downloads:
+        lookups["asset_downloads"].queue(asset_data[0]["asset_id"], cd["download_id"])
+    return change
+
+
+def process_online_data(database, on_change=None):
+    """
+    Processes saved online data
+    :param CommonDatabaseAccess database: reference to teh database
+    :param on_change: function called with change event of every new or changed asset, None for no events
+    """
+    if not os.path.exists(global_data["data_path"]):
+        console.print("Missing data file, download it first !!!\n")
+        return
+    lookups = load_lookups(database)
+    report_data = {
+        "new_file_version": [],
+        "new_preview_image": [],
+        "new_asset": [],
+        "changed_category": [],
+        "updated_asset": [],
+        "edited_asset": [],
+        "unchanged_asset": [],
+    }
+    assets = track(
+        read_raw_assets(global_data["data_path"]),
+        description=f"Substance assets ",
+        total=count_raw_assets(global_data["data_path"]),
+    )
+    newest_created_at = database.get_scrape_state("newest_created_at") or ""
+    newest_ids = []
+    batch = []
+    for d in assets:
+        batch.append(d)
+        if d["createdAt"] and d["createdAt"] > newest_created_at:
+            newest_created_at = d["createdAt"]
+        if len(newest_ids) < PAGE_LIMIT:
+            newest_ids.append(d["id"])
+        if len(batch) >= global_data["batch_size"]:
+            process_asset_batch(database, batch, lookups, report_data, on_change)
+            batch = []
+    process_asset_batch(database, batch, lookups, report_data, on_change)
+
+    # cursor for the next incremental scrape, saved only after data is in the database
+    with database.transaction():
+        if newest_created_at:
+            database.set_scrape_state("newest_created_at", newest_created_at)
+        if len(newest_ids) > 0:
+            database.set_scrape_state("last_seen_ids", json.dumps(newest_ids))
+        header = read_raw_header(global_data["data_path"])
+        if header is not None and header["mode"] == SCRAPE_FULL:
+            database.set_scrape_state("last_full_scrape", header["scraped_at"])
 
     console.print("New elements - " + str(len(report_data["new_asset"])))
     console.print("Updated elements - " + str(len(report_data["updated_asset"])))
@@ -631,6 +984,7 @@ def process_online_data(database):
     console.print("Changed category - " + str(len(report_data["changed_category"])))
     console.print("File new versions - " + str(len(report_data["new_file_version"])))
     console.print("New preview images - " + str(len(report_data["new_preview_image"])))
+    console.print("Unchanged elements - " + str(len(report_data["unchanged_asset"])))
     console.print()
     console.print("All Done !!!")
 
@@ -695,8 +1049,6 @@ def process_online_data(database):
             file.write("\n")
         file.close()
 
-    input("Press Enter to continue... (Close App to save changes !!!)")
-
 
 def main():
     """
@@ -710,14 +1062,85 @@ def main():
         default="all_assets.db",
         help="Path to the SQLite file. (Default is %(default)s",
     )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=global_data["batch_size"],
+        help="Number of assets processed in one database transaction. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-s",
+        "--storage",
+        choices=STORAGE_MODES,
+        default=STORAGE_FILE,
+        help="Work directly on the database file, or on in-memory copy saved every backup interval. "
+        "Use memory mode when database is on the network share. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--backup-interval",
+        type=int,
+        default=300,
+        help="Seconds between saves of the in-memory database to the file. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=global_data["concurrency"],
+        help="Maximum number of parallel requests while scraping online data. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-m",
+        "--scrape-mode",
+        choices=SCRAPE_MODES,
+        default=global_data["scrape_mode"],
+        help="Full scrape downloads whole catalog, incremental stops at already processed assets "
+        "and picks up only new assets, auto does incremental with forced full scrape every "
+        "full scrape days. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--full-scrape-days",
+        type=int,
+        default=global_data["full_scrape_days"],
+        help="Days between forced full scrapes in auto mode. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--api-url",
+        default=API_URL,
+        help="GraphQL API url, for example of the local stub server. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--sql-stats",
+        type=int,
+        default=global_data["sql_stats"],
+        help="Print this many SQL statements with the longest total time after every action, "
+        "0 for no statistics. (Default is %(default)s",
+    )
     args = parser.parse_args()
-    database = CommonDatabaseAccess(db_path=args.database, force=True)
+    global_data["sql_stats"] = max(0, args.sql_stats)
+    global_data["api_url"] = args.api_url
+    global_data["batch_size"] = args.batch_size
+    global_data["scrape_mode"] = args.scrape_mode
+    global_data["full_scrape_days"] = max(1, args.full_scrape_days)
+    global_data["concurrency"] = max(1, args.concurrency)
+    database = CommonDatabaseAccess(
+        db_path=args.database,
+        force=True,
+        storage_mode=args.storage,
+        backup_interval=args.backup_interval,
+        sql_stats=SqlStats(global_data["sql_stats"])
+        if global_data["sql_stats"] > 0
+        else None,
+    )
 
     menu_title = " Select action"
     menu_items = [
         "[1] Scrap online data",
         "[2] Process online data",
-        "[3] Quit (Close App to save changes !!!)",
+        "[3] Quit (Close App to save changes !!!)"
+        if database.storage_mode == STORAGE_MEMORY
+        else "[3] Quit",
     ]
 
     local_path = os.path.dirname(sys.argv[0])
@@ -747,11 +1170,19 @@ def main():
         if user_input.isnumeric():
             menu_sel = int(user_input)
             if menu_sel == 1:  # Scrap online data
-                scrap_online_data()
+                scrap_online_data(database)
+                database.print_sql_stats(console, menu_items[0])
+                input("Press Enter to continue...")
             elif menu_sel == 2:  # Process online data
                 process_online_data(database)
+                database.print_sql_stats(console, menu_items[1])
+                if database.storage_mode == STORAGE_MEMORY:
+                    input("Press Enter to continue... (Close App to save changes !!!)")
+                else:
+                    input("Press Enter to continue...")
             elif menu_sel == 3:  # Quit
                 menu_exit = True
+    database.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,342 @@
+"""Local stand-in for the Substance GraphQL API and image CDN, with injectable latency, errors and rate limits"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from rich import pretty
+from rich.console import Console
+from rich.traceback import install
+
+from common_catalog_generator import make_asset, make_png
+import substance_material_list_scraper as scraper
+
+console = Console()
+pretty.install()
+install()  # this is for tracing project activity
+global_data = {
+    "version": "Beta 1 (17.10.2026)\n",
+    "items": [],
+    "latency": 0.0,
+    "jitter": 0.0,
+    "error_rate": 0.0,
+    "drop_rate": 0.0,
+    "rate_limit": 0.0,
+    "file_size": 64 * 1024,
+    "content_version": 1,
+    "started_at": time.time(),
+}
+stats = Counter()
+stats_lock = threading.Lock()
+random_lock = threading.Lock()
+rnd = random.Random()
+
+
+def load_fixture(fixture_path) -> []:
+    """
+    Reads asset items from the saved online data, in any format scraper can read
+    :param str fixture_path: path of the online data file
+    :return: asset items
+    """
+    return list(scraper.read_raw_assets(fixture_path))
+
+
+def generate_items(assets, seed) -> []:
+    """
+    :param int assets: number of generated assets
+    :param int seed: seed of the generator
+    :return: asset items, newest first like the Assets query
+    """
+    generator = random.Random(seed)
+    items = [make_asset(index, generator, 3, 5, 2) for index in range(assets)]
+    items.reverse()
+    return items
+
+
+def chance(rate) -> bool:
+    with random_lock:
+        return rnd.random() < rate
+
+
+class TokenBucket:
+    """Allows given number of requests per second, with bursts up to the same number"""
+
+    def __init__(self, rate):
+        """
+        :param float rate: requests per second, 0 for no limit
+        """
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        """
+        :return: True if request is allowed
+        """
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def file_payload(file_path) -> (bytes, str):
+    """
+    Content of the CDN file, same for the same path and content version
+    :param str file_path: path part of the url
+    :return: content and its ETag
+    """
+    version = global_data["content_version"]
+    etag = '"' + hashlib.sha1(f"{file_path}:{version}".encode()).hexdigest() + '"'
+    if file_path.lower().endswith((".png", ".jpg")):
+        # version is added after image end, so changed version gives different but still valid image
+        return make_png() + str(version).encode(), etag
+    seed = hashlib.sha256(f"{file_path}:{version}".encode()).digest()
+    size = global_data["file_size"]
+    return (seed * (size // len(seed) + 1))[:size], etag
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """POST requests are answered as the Assets query, GET requests as CDN files"""
+
+    protocol_version = "HTTP/1.1"
+    bucket = None
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def count(self, kind, status) -> None:
+        with stats_lock:
+            stats[(kind, status)] += 1
+
+    def send_empty(self, kind, status, headers=None) -> None:
+        self.count(kind, status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def inject_faults(self, kind) -> bool:
+        """
+        Waits for configured latency and answers with error or throttling when it is drawn
+        :param str kind: "api" or "cdn"
+        :return: True if request was already answered
+        """
+        delay = global_data["latency"]
+        if global_data["jitter"] > 0:
+            with random_lock:
+                delay += rnd.uniform(0, global_data["jitter"])
+        if delay > 0:
+            time.sleep(delay)
+        if not StubHandler.bucket.take():
+            self.send_empty(kind, 429, {"Retry-After": "1"})
+            return True
+        if chance(global_data["error_rate"]):
+            self.send_empty(kind, 503)
+            return True
+        return False
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if self.inject_faults("api"):
+            return
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            query = json.loads(body).get("query", "")
+        else:
+            query = parse_qs(body).get("query", [""])[0]
+        page_match = re.search(r"\$page: Int = (\d+)", query)
+        limit_match = re.search(r"\$limit: Int = (\d+)", query)
+        page = int(page_match.group(1)) if page_match else 0
+        limit = int(limit_match.group(1)) if limit_match else scraper.PAGE_LIMIT
+        items = global_data["items"]
+        page_items = items[page * limit : (page + 1) * limit]
+        content = json.dumps(
+            {
+                "data": {
+                    "assets": {
+                        "total": len(items),
+                        "hasMore": (page + 1) * limit < len(items),
+                        "items": page_items,
+                        "__typename": "AssetsPage",
+                    }
+                }
+            }
+        ).encode("utf-8")
+        self.count("api", 200)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        if self.inject_faults("cdn"):
+            return
+        content, etag = file_payload(self.path.split("?")[0])
+        last_modified = formatdate(global_data["started_at"], usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_empty("cdn", 304, {"ETag": etag, "Last-Modified": last_modified})
+            return
+        status = 200
+        start = 0
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range in (None, etag, last_modified):
+            range_match = re.match(r"bytes=(\d+)-", range_header)
+            if range_match:
+                start = int(range_match.group(1))
+                if start >= len(content):
+                    self.send_empty(
+                        "cdn", 416, {"Content-Range": f"bytes */{len(content)}"}
+                    )
+                    return
+                status = 206
+        body = content[start:]
+        self.count("cdn", status)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        self.end_headers()
+        if chance(global_data["drop_rate"]):
+            # connection breaks in the middle of the body
+            self.count("cdn", "dropped")
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def print_stats() -> None:
+    console.print()
+    for (kind, status), count in sorted(stats.items(), key=lambda s: str(s[0])):
+        console.print(f"{kind:<4} {str(status):<8} {count}")
+
+
+def main() -> None:
+    """
+    Serves Assets query on POST and CDN files on GET, until interrupted
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8765,
+        help="Port to listen on. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "-f",
+        "--fixture",
+        help="Saved online data to serve. Generated catalog is served if not given.",
+    )
+    parser.add_argument(
+        "-a",
+        "--assets",
+        type=int,
+        default=1000,
+        help="Number of generated assets, when there is no fixture. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed of the catalog generator and of the injected faults. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=global_data["latency"],
+        help="Seconds to wait before every answer. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=global_data["jitter"],
+        help="Up to this many seconds are randomly added to the latency. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=global_data["error_rate"],
+        help="Fraction of requests answered with 503. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--drop-rate",
+        type=float,
+        default=global_data["drop_rate"],
+        help="Fraction of file downloads cut in the middle of the body. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=global_data["rate_limit"],
+        help="Requests per second, more are answered with 429, 0 for no limit. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        default=global_data["file_size"],
+        help="Size in bytes of served files which are not images. (Default is %(default)s",
+    )
+    parser.add_argument(
+        "--content-version",
+        type=int,
+        default=global_data["content_version"],
+        help="Change to serve different content and ETags for the same urls. (Default is %(default)s",
+    )
+    args = parser.parse_args()
+    for option in ("latency", "jitter", "error_rate", "drop_rate", "rate_limit"):
+        global_data[option] = max(0.0, getattr(args, option))
+    global_data["file_size"] = max(1, args.file_size)
+    global_data["content_version"] = args.content_version
+    rnd.seed(args.seed)
+    if args.fixture:
+        global_data["items"] = load_fixture(args.fixture)
+    else:
+        global_data["items"] = generate_items(max(0, args.assets), args.seed)
+    StubHandler.bucket = TokenBucket(global_data["rate_limit"])
+
+    console.print("version " + global_data["version"])
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    url = f"http://{args.host}:{args.port}"
+    console.print(f"Serving {len(global_data['items'])} assets")
+    console.print(f"API - {url}/beta/graphql  (scraper --api-url)")
+    console.print(f"CDN - {url}  (asset processor --cdn-url)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import f_icon
+except ImportError:
+    # folder icons are Windows only, tests do not create them
+    f_icon = types.ModuleType("f_icon")
+    f_icon.create_icon = lambda preview_path: None
+    sys.modules["f_icon"] = f_icon
@@ -0,0 +1,83 @@
+import json
+import os
+
+import substance_material_list_asset_processor as processor
+from common_download_engine import DownloadResult
+
+
+class FakeEngine:
+    """Completes downloads right away, failing the urls in failing"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.submitted = []
+
+    def submit(self, url, file_path, on_done=None, validators=None, backup_path=None):
+        self.submitted.append((url, os.path.basename(file_path)))
+        if url in self.failing:
+            result = DownloadResult(url, file_path, False, error="503")
+        else:
+            with open(file_path, "wb") as f:
+                f.write(url.encode())
+            result = DownloadResult(url, file_path, True, size=len(url))
+        if on_done is not None:
+            on_done(result)
+
+
+def make_asset(asset_path):
+    asset = {"asset_path": str(asset_path)}
+    for key in (
+        "author",
+        "physical_size",
+        "type",
+        "style",
+        "quality",
+        "meshes",
+        "counters_quads",
+        "substance_resolution",
+        "preview_disp",
+    ):
+        asset["extra_data_" + key] = None
+    return asset
+
+
+def test_failed_detail_keeps_its_file_name(tmp_path, monkeypatch):
+    monkeypatch.setitem(processor.global_data, "refresh_images", False)
+    monkeypatch.setitem(processor.global_data, "cdn_url", None)
+    asset = make_asset(tmp_path)
+    previews = [
+        {
+            "original_id": f"detail-{index}",
+            "url": f"http://cdn/detail-{index}.png",
+            "is_thumbnail": False,
+            "is_far": True,
+        }
+        for index in range(3)
+    ]
+
+    engine = FakeEngine(failing=["http://cdn/detail-1.png"])
+    processor.queue_asset_images(
+        processor.DownloadRecorder(), engine, {}, asset, previews, False
+    )
+    assert sorted(os.listdir(tmp_path)) == [
+        "Details.png",
+        "Details2.png",
+        "extra-data.txt",
+    ]
+
+    engine = FakeEngine()
+    processor.queue_asset_images(
+        processor.DownloadRecorder(), engine, {}, asset, previews, True
+    )
+    assert engine.submitted == [("http://cdn/detail-1.png", "Details1.png")]
+    for file_name, index in (
+        ("Details.png", 0),
+        ("Details1.png", 1),
+        ("Details2.png", 2),
+    ):
+        with open(tmp_path / file_name, "rb") as f:
+            assert f.read() == f"http://cdn/detail-{index}.png".encode()
+    with open(tmp_path / "extra-data.txt") as f:
+        extra_data = json.load(f)
+    assert extra_data["preview_details"] == ["detail-0", "detail-1", "detail-2"]
+    assert extra_data["preview_pending"] == []
@@ -0,0 +1,134 @@
+import errno
+import hashlib
+import json
+import os
+import types
+
+import common_file_transfer
+from common_file_transfer import PART_SUFFIX, FileTransferEngine
+
+
+def write_file(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_journal(journal_path, chains, done, cut_line=None):
+    with open(journal_path, "w", encoding="utf-8") as journal:
+        journal.write(json.dumps({"plan": chains}) + "\n")
+        for chain_index, step in done:
+            journal.write(json.dumps({"chain": chain_index, "step": step}) + "\n")
+        if cut_line is not None:
+            journal.write(cut_line)
+
+
+def raise_exdev(source, destination):
+    raise OSError(errno.EXDEV, "Invalid cross-device link", destination)
+
+
+def test_journal_cut_in_chain(tmp_path):
+    old = write_file(tmp_path / "a.sbsar", b"old")
+    new = write_file(tmp_path / "b.sbsar", b"new")
+    backup = str(tmp_path / "a_rev1.sbsar")
+    chains = [[[old, backup], [new, old]]]
+    journal_path = str(tmp_path / "transfer.journal")
+    # backup rename is done and journaled, last line was cut by the interruption
+    os.rename(old, backup)
+    write_journal(journal_path, chains, [(0, 0)], cut_line='{"chain": 0, "st')
+
+    engine = FileTransferEngine(journal_path)
+    chains = engine.unfinished()
+    assert chains == [[(new, old)]]
+    results = engine.run(chains)
+    assert [result.ok for result in results] == [True]
+    assert read_file(old) == b"new"
+    assert read_file(backup) == b"old"
+    assert not os.path.exists(new)
+    assert not os.path.exists(journal_path)
+
+
+def test_move_done_before_journal(tmp_path):
+    old = write_file(tmp_path / "a.sbsar", b"old")
+    new = write_file(tmp_path / "b.sbsar", b"new")
+    backup = str(tmp_path / "a_rev1.sbsar")
+    source = write_file(tmp_path / "c.sbsar", b"other")
+    destination = str(tmp_path / "moved_c.sbsar")
+    chains = [[[old, backup], [new, old]], [[source, destination]]]
+    journal_path = str(tmp_path / "transfer.journal")
+    # all moves are done, only the first one was written to the journal
+    os.rename(old, backup)
+    os.rename(new, old)
+    os.rename(source, destination)
+    write_journal(journal_path, chains, [(0, 0)])
+
+    engine = FileTransferEngine(journal_path)
+    assert engine.unfinished() == []
+    assert not os.path.exists(journal_path)
+    assert read_file(old) == b"new"
+    assert read_file(backup) == b"old"
+    assert read_file(destination) == b"other"
+
+
+def test_leftover_part_files(tmp_path):
+    source = write_file(tmp_path / "a.sbsar", b"content")
+    destination = str(tmp_path / "moved_a.sbsar")
+    write_file(destination + PART_SUFFIX, b"cont")
+    journal_path = str(tmp_path / "transfer.journal")
+    write_journal(journal_path, [[[source, destination]]], [])
+
+    engine = FileTransferEngine(journal_path)
+    chains = engine.unfinished()
+    assert chains == [[(source, destination)]]
+    assert not os.path.exists(destination + PART_SUFFIX)
+    results = engine.run(chains)
+    assert [result.ok for result in results] == [True]
+    assert read_file(destination) == b"content"
+
+
+def test_exdev_copy(tmp_path, monkeypatch):
+    source = write_file(tmp_path / "a.sbsar", b"content" * 1000)
+    destination = str(tmp_path / "moved_a.sbsar")
+    monkeypatch.setattr(common_file_transfer.os, "rename", raise_exdev)
+    monkeypatch.setattr(common_file_transfer, "COPY_CHUNK_SIZE", 1000)
+
+    result = FileTransferEngine(str(tmp_path / "transfer.journal")).move(
+        source, destination
+    )
+    assert result.ok and result.copied
+    assert read_file(destination) == b"content" * 1000
+    assert not os.path.exists(source)
+    assert not os.path.exists(destination + PART_SUFFIX)
+
+
+def test_exdev_copy_hash_mismatch(tmp_path, monkeypatch):
+    source = write_file(tmp_path / "a.sbsar", b"content")
+    destination = str(tmp_path / "moved_a.sbsar")
+    digests = []
+
+    def sha256():
+        # second digest is the one of the copy, it gets different content
+        digest = hashlib.sha256()
+        digests.append(digest)
+        if len(digests) == 2:
+            digest.update(b"corrupted")
+        return digest
+
+    monkeypatch.setattr(common_file_transfer.os, "rename", raise_exdev)
+    monkeypatch.setattr(
+        common_file_transfer, "hashlib", types.SimpleNamespace(sha256=sha256)
+    )
+
+    result = FileTransferEngine(str(tmp_path / "transfer.journal")).move(
+        source, destination
+    )
+    assert not result.ok and not result.copied
+    assert "Copy do not match the source" in result.error
+    assert read_file(source) == b"content"
+    assert not os.path.exists(destination)
+    assert not os.path.exists(destination + PART_SUFFIX)
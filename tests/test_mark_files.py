@@ -0,0 +1,71 @@
+import os
+
+import substance_material_list_asset_processor as processor
+import substance_material_list_scraper as scraper
+from common_catalog_generator import generate_online_data
+from common_database_access import CommonDatabaseAccess
+
+
+def have_file_by_type(database):
+    _c = database.conn.cursor()
+    _c.execute(
+        """SELECT asset_revision.type_id, COUNT(DISTINCT revision.revision_id) AS present
+           FROM latest_asset_revision AS asset_revision
+           JOIN asset_download ON asset_download.asset_id = asset_revision.asset_id
+           JOIN revision ON revision.download_id = asset_download.download_id
+           WHERE revision.have_file GROUP BY asset_revision.type_id"""
+    )
+    return {row["type_id"]: row["present"] for row in _c.fetchall()}
+
+
+def make_library(library_path, monkeypatch):
+    data_path = str(library_path / "all_assets_raw.txt")
+    monkeypatch.setitem(scraper.global_data, "local_path", str(library_path))
+    monkeypatch.setitem(scraper.global_data, "data_path", data_path)
+    monkeypatch.setitem(processor.global_data, "local_path", str(library_path))
+    monkeypatch.setitem(processor.global_data, "source_path", "_source")
+    processor.global_data.pop("filesystem_index", None)
+    generate_online_data(data_path, 40, 1, 2, 1, 1)
+    database = CommonDatabaseAccess(db_path=str(library_path / "test.db"), force=True)
+    scraper.process_online_data(database)
+    processor.create_folder_for_type(database, database.get_all_types())
+    destinations = database.get_revision_destinations()
+    for filename, destination in destinations.items():
+        asset_path = os.sep.join(
+            [
+                str(library_path),
+                processor.correct_type_name(destination["type_name"]),
+                destination["category_name"],
+                destination["asset_name"],
+            ]
+        )
+        with open(asset_path + os.sep + filename, "wb") as f:
+            f.truncate(destination["revisions"][0]["size"])
+    return database
+
+
+def test_mark_keeps_have_file_of_skipped_type(tmp_path, monkeypatch):
+    database = make_library(tmp_path, monkeypatch)
+    processor.mark_database_with_my_files(database)
+    before = have_file_by_type(database)
+    assert len(before) > 1 and all(count > 0 for count in before.values())
+
+    skipped_type = database.get_all_types()[0]
+    type_path = str(tmp_path / processor.correct_type_name(skipped_type["name"]))
+    os.rename(type_path, type_path + "_renamed")
+    processor.mark_database_with_my_files(database)
+    assert have_file_by_type(database) == before
+
+    # files removed from scanned folder are still found missing
+    os.rename(type_path + "_renamed", type_path)
+    for root, dirs, files in os.walk(type_path):
+        for name in files:
+            if name.endswith(".sbsar"):
+                os.remove(os.path.join(root, name))
+    processor.mark_database_with_my_files(database)
+    after = have_file_by_type(database)
+    assert skipped_type["type_id"] not in after
+    for type_id, count in before.items():
+        if type_id != skipped_type["type_id"]:
+            assert after[type_id] == count
+    database.close()